@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试，在项目根目录下执行: python -m benchmarks.<模块名>
+
+bench_events、bench_http 支持 --save 将结果保存到 benchmarks/baselines/ 作为基线，--compare 与基线对比。
+"""
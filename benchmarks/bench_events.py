@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+事件下行热点路径的基准
+
+覆盖 websocket 消息的入队、解码与分发（BotWebSocket._on_frame / _consume）、各类事件模型的构造（ConnectionState.parse_*）、
+Client 的事件调度（ws_dispatch/_schedule_event）以及 Route.url 的拼接。
+
+执行: python -m benchmarks.bench_events [--save] [--compare] [-k 用例名]
+"""
+import asyncio
+
+import botpy
+from botpy import codec
+from botpy.api import BotAPI
+from botpy.connection import ConnectionSession, ConnectionState
+from botpy.gateway import BotWebSocket
+from botpy.http import Route
+from botpy.message import Message
+
+from .harness import Case, main
+
+MESSAGE = {
+    "author": {"avatar": "http://thirdqq.qlogo.cn/0", "bot": False, "id": "1234567890", "username": "user"},
+    "channel_id": "123456",
+    "content": "<@!1234> /ping " + "x" * 64,
+    "guild_id": "654321",
+    "id": "08e092eeb983afef9e0110f1b5ba8a023800489c0b",
+    "member": {"joined_at": "2023-11-06T13:37:18+08:00", "roles": ["1", "4"]},
+    "mentions": [{"avatar": "", "bot": True, "id": "1234", "username": "robot"}],
+    "seq": 1024,
+    "seq_in_channel": "1024",
+    "timestamp": "2023-11-06T13:37:18+08:00",
+}
+
+GROUP_MESSAGE = {
+    "author": {"member_openid": "E4F4AEA33253A2797FB897C50B81D7ED"},
+    "content": " /ping",
+    "group_openid": "C9F778FE6ADF9D1D1DBE395BF744A33A",
+    "id": "ROBOT1.0_veoihkv.8.ikU2Vn5jcyyfGb5nMEGeMX9r9tlnYLvcvK2fNv1v8HUwv.I2NWJ9y9mgXw9g!!",
+    "timestamp": "2023-11-06T13:37:18+08:00",
+}
+
+MEMBER = {
+    "guild_id": "654321",
+    "joined_at": "2023-11-06T13:37:18+08:00",
+    "nick": "nick",
+    "op_user_id": "1234",
+    "roles": ["1"],
+    "user": {"avatar": "http://thirdqq.qlogo.cn/0", "bot": False, "id": "1234567890", "username": "user"},
+}
+
+
+def _rich_text(*texts: str) -> str:
+    elems = [{"type": 1, "text": {"text": text}} for text in texts]
+    elems.append({"type": 2, "image": {"plat_image": {"url": "http://example.com/a.png", "width": 64, "height": 64}}})
+    elems.append({"type": 4, "url": {"url": "https://bot.q.qq.com", "desc": "QQ机器人"}})
+    return codec.dumps({"paragraphs": [{"elems": elems, "props": {}}]})
+
+
+THREAD = {
+    "author_id": "1234567890",
+    "channel_id": "123456",
+    "guild_id": "654321",
+    "thread_info": {
+        "content": _rich_text("第一段内容" * 8, "第二段内容" * 8),
+        "date_time": "2023-11-06T13:37:18+08:00",
+        "thread_id": "B_0bdbb46424ec1f0001",
+        "title": codec.dumps({"paragraphs": [{"elems": [{"type": 1, "text": {"text": "标题"}}], "props": {}}]}),
+    },
+}
+
+
+def _payload(event: str, data: dict, seq: int = 42) -> dict:
+    return {"op": 0, "s": seq, "t": event, "id": event + ":0a1b2c3d", "d": data}
+
+
+def _frame(event: str, data: dict) -> str:
+    return codec.dumps(_payload(event, data))
+
+
+class _Dispatch:
+    """记录最近一次分发的事件，供解析用例返回结果"""
+
+    def __init__(self):
+        self.last = None
+
+    def __call__(self, event, *args):
+        self.last = args
+
+
+def _parse_case(method: str, event: str, data: dict):
+    async def setup():
+        dispatch = _Dispatch()
+        parser = getattr(ConnectionState(dispatch, BotAPI(None)), method)
+        payload = _payload(event, data)
+
+        def step():
+            parser(payload)
+            return dispatch.last
+
+        return step, None
+
+    return setup
+
+
+def _receive_case(event: str, data: dict):
+    async def setup():
+        dispatch = _Dispatch()
+        connection = ConnectionSession(1, None, dispatch, loop=asyncio.get_event_loop(), api=BotAPI(None))
+        ws = BotWebSocket({"session_id": "", "last_seq": 0, "shards": {"shard_id": 0, "shard_count": 1}}, connection)
+        ws._queue = asyncio.Queue(connection.event_queue_size)
+        consumer = asyncio.ensure_future(ws._consume(None, ws._queue))
+        frame = _frame(event, data)
+
+        async def step():
+            # 与 _receive 相同：接收循环入队，_consume 解码并分发
+            await ws._on_frame(None, frame)
+            # 让出一次事件循环，消费者在此期间处理完这条消息
+            await asyncio.sleep(0)
+            return dispatch.last
+
+        async def teardown():
+            await ws._queue.put(None)
+            await consumer
+
+        return step, teardown
+
+    return setup
+
+
+async def _client_dispatch():
+    class BenchClient(botpy.Client):
+        async def on_at_message_create(self, message: Message):
+            pass
+
+    client = BenchClient(intents=botpy.Intents(public_guild_messages=True), bot_log=None, ext_handlers=False)
+    message = Message(client.api, "AT_MESSAGE_CREATE:0a1b2c3d", MESSAGE)
+
+    async def step():
+        client.ws_dispatch("at_message_create", message)
+        # 让出一次事件循环，新建的 task 在此期间执行完成
+        await asyncio.sleep(0)
+
+    return step, client.close
+
+
+async def _route_url():
+    def step():
+        return Route("POST", "/channels/{channel_id}/messages", channel_id="123456").url
+
+    return step, None
+
+
+CASES = [
+    Case("gateway.receive.message", _receive_case("AT_MESSAGE_CREATE", MESSAGE)),
+    Case("gateway.receive.group", _receive_case("GROUP_AT_MESSAGE_CREATE", GROUP_MESSAGE)),
+    Case("parse.message", _parse_case("parse_at_message_create", "AT_MESSAGE_CREATE", MESSAGE)),
+    Case("parse.group_message", _parse_case("parse_group_at_message_create", "GROUP_AT_MESSAGE_CREATE", GROUP_MESSAGE)),
+    Case("parse.thread", _parse_case("parse_forum_thread_create", "FORUM_THREAD_CREATE", THREAD)),
+    Case("parse.member", _parse_case("parse_guild_member_add", "GUILD_MEMBER_ADD", MEMBER)),
+    Case("client.ws_dispatch", _client_dispatch),
+    Case("route.url", _route_url, number=100000),
+]
+
+if __name__ == "__main__":
+    main("bench_events", CASES)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+BotHttp.request 自身开销的基准
+
+请求发往本地的 MockServer，同时用直接调用 aiohttp 的写法作为参照，两者之差即 BotHttp 在
+限频、调度、重试、指标统计、日志等方面引入的开销。
+
+执行: python -m benchmarks.bench_http [--save] [--compare] [-k 用例名]
+"""
+import aiohttp
+
+import botpy
+from botpy.ext.mock_server import MockServer
+from botpy.http import Route
+
+from .harness import Case, main
+
+APP_ID = "1000"
+SECRET = "secret"
+
+
+async def _start_server():
+    server = MockServer(app_id=APP_ID, secret=SECRET)
+    await server.start()
+    guild_id = server.add_guild(name="bench")["id"]
+    channel_id = server.add_channel(guild_id)["id"]
+    return server, guild_id, channel_id
+
+
+def _reset(server: MockServer):
+    # MockServer 会记录每个请求，清空以免计入内存统计
+    server.requests.clear()
+    server.messages.clear()
+
+
+async def _bot_http(method: str):
+    server, guild_id, channel_id = await _start_server()
+    http = botpy.BotHttp(timeout=5, app_id=APP_ID, secret=SECRET)
+    await http.login(http._token)
+
+    if method == "GET":
+        def make_request():
+            return http.request(Route("GET", "/guilds/{guild_id}", guild_id=guild_id))
+    else:
+        def make_request():
+            route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
+            return http.request(route, json={"content": "hello", "msg_id": "1"})
+
+    async def step():
+        _reset(server)
+        return await make_request()
+
+    async def teardown():
+        await http.close()
+        await server.stop()
+
+    return step, teardown
+
+
+async def _raw_aiohttp(method: str):
+    server, guild_id, channel_id = await _start_server()
+    session = aiohttp.ClientSession()
+    async with session.post(server.url + "/app/getAppAccessToken", json={"appId": APP_ID, "clientSecret": SECRET}) as r:
+        token = (await r.json(content_type=None))["access_token"]
+    headers = {"Authorization": "QQBot " + token, "X-Union-Appid": APP_ID}
+
+    if method == "GET":
+        def make_request():
+            return session.get(server.url + "/guilds/" + guild_id, headers=headers)
+    else:
+        def make_request():
+            url = server.url + "/channels/" + channel_id + "/messages"
+            return session.post(url, headers=headers, json={"content": "hello", "msg_id": "1"})
+
+    async def step():
+        _reset(server)
+        async with make_request() as response:
+            return await response.json(content_type=None)
+
+    async def teardown():
+        await session.close()
+        await server.stop()
+
+    return step, teardown
+
+
+CASES = [
+    Case("aiohttp.get", lambda: _raw_aiohttp("GET"), number=2000),
+    Case("bot_http.get", lambda: _bot_http("GET"), number=2000),
+    Case("aiohttp.post_message", lambda: _raw_aiohttp("POST"), number=2000),
+    Case("bot_http.post_message", lambda: _bot_http("POST"), number=2000),
+]
+
+if __name__ == "__main__":
+    main("bench_http", CASES)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+热点路径日志开销的微基准
+
+对比改造前的写法（无论日志级别都先格式化字符串）与当前的惰性格式化、级别判断写法，
+在默认的 INFO 级别下每次请求/每个事件的耗时。
+
+执行: python -m benchmarks.bench_logging
+"""
+import timeit
+
+from botpy import logging
+
+_log = logging.get_logger()
+
+URL = "https://api.sgroup.qq.com/channels/123456/messages"
+TRACE_ID = "0a1b2c3d4e5f"
+HEADERS = {"Authorization": "QQBot xxxxxxxxxxxxxxxxxxxxxxxx", "X-Union-Appid": "123456"}
+DATA = {
+    "id": "08e092eeb983afef9e0110f1b5ba8a023800489c0b",
+    "channel_id": "123456",
+    "guild_id": "654321",
+    "content": "收到了消息" * 20,
+    "timestamp": "2023-11-06T13:37:18+08:00",
+    "author": {"id": "1234567890", "username": "robot", "bot": True},
+}
+FRAME = (
+    '{"op":0,"s":42,"t":"AT_MESSAGE_CREATE","id":"AT_MESSAGE_CREATE:xxxx",'
+    '"d":{"author":{"id":"1234","username":"user"},"channel_id":"123456","content":"' + "x" * 400 + '"}}'
+)
+
+
+def eager_response():
+    _log.debug(f"[botpy] 请求成功, 请求连接: {URL}, 返回内容: {DATA}, trace_id:{TRACE_ID}")
+
+
+def lazy_response():
+    if logging.is_trace_enabled(_log):
+        _log.debug("[botpy] 请求成功, 请求连接: %s, 返回内容: %s, trace_id:%s", URL, DATA, TRACE_ID)
+    elif _log.isEnabledFor(logging.DEBUG):
+        _log.debug("[botpy] 请求成功, 请求连接: %s, trace_id:%s", URL, TRACE_ID)
+
+
+def eager_request():
+    _log.debug(f"[botpy] 请求头部: {HEADERS}, 请求方式: POST, 请求url: {URL}")
+
+
+def lazy_request():
+    if _log.isEnabledFor(logging.DEBUG):
+        _log.debug("[botpy] 请求方式: %s, 请求url: %s", "POST", URL)
+
+
+def eager_frame():
+    _log.debug("[botpy] 接收消息: %s" % FRAME)
+
+
+def lazy_frame():
+    if logging.is_trace_enabled(_log):
+        _log.debug("[botpy] 接收消息: %s", FRAME)
+
+
+CASES = [
+    ("http.response", eager_response, lazy_response),
+    ("http.request", eager_request, lazy_request),
+    ("gateway.frame", eager_frame, lazy_frame),
+]
+
+
+def run(number: int = 200000) -> dict:
+    results = {}
+    for name, eager, lazy in CASES:
+        before = min(timeit.repeat(eager, number=number, repeat=3)) / number * 1e9
+        after = min(timeit.repeat(lazy, number=number, repeat=3)) / number * 1e9
+        results[name] = {"before_ns": before, "after_ns": after}
+    return results
+
+
+def main():
+    print("logger level: %s, trace_payloads: %s" % (logging.logging.getLevelName(_log.level), logging.TRACE_PAYLOADS))
+    print("%-16s%14s%14s%10s" % ("case", "before(ns)", "after(ns)", "speedup"))
+    for name, result in run().items():
+        before, after = result["before_ns"], result["after_ns"]
+        print("%-16s%14.1f%14.1f%9.1fx" % (name, before, after, before / after))
+
+
+if __name__ == "__main__":
+    main()
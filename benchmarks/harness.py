@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试的公共逻辑
+
+每个用例提供一个 setup 协程，返回处理单个事件的函数（普通函数或协程函数）以及可选的清理协程。
+对每个用例统计:
+- events/s: 多轮执行中最快一轮的每秒事件数
+- allocs/event、bytes/event: 每个事件新分配且在事件处理完后仍被结果引用的内存块数和字节数（tracemalloc）
+- peak/event: 处理单个事件时的内存峰值增量（字节），反映临时对象的开销
+
+结果可以保存为基线（JSON），之后通过 --compare 对比，基线与机器和 Python 版本相关，仅用于同一环境内对比。
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# setup 返回 (处理单个事件的函数, 清理协程函数)
+Setup = Callable[[], Awaitable[Tuple[Callable[[], Any], Optional[Callable[[], Awaitable[None]]]]]]
+
+
+class Case:
+    def __init__(self, name: str, setup: Setup, number: int = 20000):
+        """
+        Args:
+          name (str): 用例名称
+          setup: 准备用例的协程函数
+          number (int): 每轮执行的事件数。. Defaults to 20000
+        """
+        self.name = name
+        self.setup = setup
+        self.number = number
+
+
+async def _run_batch(step: Callable[[], Any], number: int) -> float:
+    if asyncio.iscoroutinefunction(step):
+        started = time.perf_counter()
+        for _ in range(number):
+            await step()
+        return time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(number):
+        step()
+    return time.perf_counter() - started
+
+
+async def _measure_memory(step: Callable[[], Any], number: int) -> Dict[str, float]:
+    is_async = asyncio.iscoroutinefunction(step)
+    results: List[Any] = [None] * number
+    peak = 0
+    reset_peak = getattr(tracemalloc, "reset_peak", None)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i in range(number):
+            if reset_peak is not None:
+                reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            results[i] = await step() if is_async else step()
+            peak += tracemalloc.get_traced_memory()[1] - current
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del results
+    return {
+        "allocs_per_event": blocks / number,
+        "bytes_per_event": size / number,
+        "peak_bytes_per_event": peak / number if reset_peak is not None else None,
+    }
+
+
+async def run_case(case: Case, repeat: int = 5, memory_events: int = 1000) -> Dict[str, Any]:
+    step, teardown = await case.setup()
+    try:
+        # 预热
+        await _run_batch(step, min(case.number, 1000))
+        best = min([await _run_batch(step, case.number) for _ in range(repeat)])
+        memory = await _measure_memory(step, min(case.number, memory_events))
+    finally:
+        if teardown is not None:
+            await teardown()
+    result = {"events_per_sec": case.number / best, "us_per_event": best / case.number * 1e6}
+    result.update(memory)
+    return result
+
+
+def environment() -> Dict[str, str]:
+    from botpy import codec
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "json_backend": codec.backend,
+    }
+
+
+def _format_change(current: float, baseline: Optional[Dict[str, Any]]) -> str:
+    if not baseline:
+        return ""
+    before = baseline.get("events_per_sec")
+    if not before:
+        return ""
+    return "%+.1f%%" % ((current / before - 1) * 100)
+
+
+def main(suite: str, cases: List[Case], argv: List[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    执行一组用例并输出结果
+
+    Args:
+      suite (str): 用例集名称，也是默认基线文件名
+      cases: 用例列表
+      argv: 命令行参数，默认为 sys.argv
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks." + suite)
+    parser.add_argument("-k", "--filter", default="", help="只执行名称包含该字符串的用例")
+    parser.add_argument("-n", "--number", type=int, default=0, help="每轮执行的事件数，默认使用用例的配置")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="执行轮数，取最快的一轮")
+    parser.add_argument("--save", nargs="?", const="", default=None, help="将结果保存为基线")
+    parser.add_argument("--compare", nargs="?", const="", default=None, help="与基线对比")
+    args = parser.parse_args(argv if argv is not None else sys.argv[1:])
+    default_path = os.path.join(BASELINE_DIR, suite + ".json")
+
+    baseline = {}
+    if args.compare is not None:
+        with open(args.compare or default_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {}
+    print("%-32s%14s%12s%14s%14s%14s%10s" % ("case", "events/s", "us/event", "allocs/event", "bytes/event",
+                                             "peak/event", "change"))
+    try:
+        for case in cases:
+            if args.filter not in case.name:
+                continue
+            if args.number:
+                case.number = args.number
+            result = loop.run_until_complete(run_case(case, repeat=args.repeat))
+            results[case.name] = result
+            peak = result["peak_bytes_per_event"]
+            print(
+                "%-32s%14.0f%12.2f%14.1f%14.0f%14s%10s"
+                % (
+                    case.name,
+                    result["events_per_sec"],
+                    result["us_per_event"],
+                    result["allocs_per_event"],
+                    result["bytes_per_event"],
+                    "-" if peak is None else "%.0f" % peak,
+                    _format_change(result["events_per_sec"], baseline.get(case.name)),
+                )
+            )
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    if args.save is not None:
+        path = args.save or default_path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("基线已保存: %s" % path)
+    return results
@@ -2,11 +2,14 @@
 
 # 异步api
 
-from io import BufferedReader
+import mmap
+import os
 from typing import Any, List, Union, BinaryIO, Dict
 
+from .cache import MediaCache, MsgSeqAllocator, ResponseCache
 from .flags import Permission
 from .http import BotHttp, Route
+from .pagination import Paginator
 from .types import (
     guild,
     user,
@@ -29,16 +32,53 @@ class BotAPI:
 
     使用注意:
         - 如果要直接使用api，可以通过client的内部成员变量，通过`self.api.xx`来使用
-        - 设置超时时间: Client(timeout=5)
+        - 设置超时时间: Client(timeout=5)，发消息、拉取成员列表等接口可以通过`timeout`参数单独设置
+        - 设置截止时间: `with botpy.deadline.use_deadline(timeout=10):` 代码块内的请求（包括排队和重试）超过截止时间后
+          抛出 DeadlineExceededError；处理事件时被动回复的截止时间为消息发出后 5 分钟
         - API当前返回的所有自定义类型数据为字典数据，通过TypedDict进行类型提示
+        - 频道、子频道、身份组和成员的查询结果会被缓存，并在收到对应事件时失效，
+          可以通过`self.api.cache = ResponseCache(ttls=...)`调整缓存时间，`ResponseCache(maxsize=0)`关闭缓存
+        - 群聊和单聊的被动回复未指定 msg_seq 时，由`msg_seq_allocator`按 msg_id 分配，同一条消息可以并发回复多次
+        - post_group_file / post_c2c_file 上传的 file_info 由`media_cache`在有效期内复用，`media_cache.to_dict()`查看命中率
     """
 
-    def __init__(self, http: BotHttp):
+    def __init__(
+        self,
+        http: BotHttp,
+        cache: ResponseCache = None,
+        msg_seq_allocator: MsgSeqAllocator = None,
+        media_cache: MediaCache = None,
+    ):
         """
         Args:
           http (BotHttp): 用于发送请求的 http 客户端。
+          cache (ResponseCache): 读接口的返回数据缓存。
+          msg_seq_allocator (MsgSeqAllocator): 群聊和单聊被动回复的 msg_seq 分配器。
+          media_cache (MediaCache): 富媒体上传结果的缓存，`MediaCache(maxsize=0)`关闭缓存。
         """
         self._http = http
+        self.cache = cache if cache is not None else ResponseCache()
+        self.msg_seq_allocator = msg_seq_allocator if msg_seq_allocator is not None else MsgSeqAllocator()
+        self.media_cache = media_cache if media_cache is not None else MediaCache()
+
+    def _assign_msg_seq(self, payload: Dict[str, Any]) -> None:
+        """为被动回复分配或记录 msg_seq，主动消息未指定时沿用默认值 1"""
+        reply_to = payload.get("msg_id") or payload.get("event_id")
+        if reply_to is None:
+            if payload.get("msg_seq") is None:
+                payload["msg_seq"] = 1
+        elif payload.get("msg_seq") is None:
+            payload["msg_seq"] = self.msg_seq_allocator.allocate(reply_to)
+        else:
+            self.msg_seq_allocator.reserve(reply_to, payload["msg_seq"])
+
+    async def _cached_request(self, endpoint: str, ids: tuple, route: Route) -> Any:
+        data = self.cache.get(endpoint, *ids)
+        if data is None:
+            generation = self.cache.generation
+            data = await self._http.request(route)
+            self.cache.set(endpoint, data, *ids, generation=generation)
+        return data
 
     # 频道相关接口
     async def get_guild(self, guild_id: str) -> guild.GuildPayload:
@@ -52,7 +92,7 @@ class BotAPI:
           GuildPayload (字典数据)
         """
         route = Route("GET", "/guilds/{guild_id}", guild_id=guild_id)
-        return await self._http.request(route)
+        return await self._cached_request("guild", (guild_id,), route)
 
     # 频道身份组相关接口
     async def get_guild_roles(self, guild_id: str) -> guild.GuildRoles:
@@ -66,7 +106,7 @@ class BotAPI:
           GuildRolesPayload
         """
         route = Route("GET", "/guilds/{guild_id}/roles", guild_id=guild_id)
-        return await self._http.request(route)
+        return await self._cached_request("guild_roles", (guild_id,), route)
 
     async def create_guild_role(self, guild_id: str, **fields: Any) -> guild.GuildRole:
         """
@@ -84,7 +124,9 @@ class BotAPI:
           class:GuildRole
         """
         route = Route("POST", "/guilds/{guild_id}/roles", guild_id=guild_id)
-        return await self._http.request(route, json=fields)
+        data = await self._http.request(route, json=fields)
+        self.cache.invalidate_roles(guild_id)
+        return data
 
     async def update_guild_role(self, guild_id: str, role_id: str, **fields: Any) -> guild.GuildRole:
         """
@@ -103,7 +145,9 @@ class BotAPI:
           class:GuildRole
         """
         route = Route("PATCH", "/guilds/{guild_id}/roles/{role_id}", guild_id=guild_id, role_id=role_id)
-        return await self._http.request(route, json=fields)
+        data = await self._http.request(route, json=fields)
+        self.cache.invalidate_roles(guild_id)
+        return data
 
     async def delete_guild_role(self, guild_id: str, role_id: str) -> str:
         """
@@ -117,7 +161,9 @@ class BotAPI:
           成功执行返回`None`。
         """
         route = Route("DELETE", "/guilds/{guild_id}/roles/{role_id}", guild_id=guild_id, role_id=role_id)
-        return await self._http.request(route)
+        data = await self._http.request(route)
+        self.cache.invalidate_roles(guild_id)
+        return data
 
     async def create_guild_role_member(
         self,
@@ -147,7 +193,9 @@ class BotAPI:
             user_id=user_id,
             role_id=role_id,
         )
-        return await self._http.request(route, json=payload)
+        data = await self._http.request(route, json=payload)
+        self.cache.invalidate_member(guild_id, user_id)
+        return data
 
     async def delete_guild_role_member(self, guild_id: str, role_id: str, user_id: str, channel_id: str = None) -> str:
         """
@@ -172,7 +220,9 @@ class BotAPI:
             user_id=user_id,
             role_id=role_id,
         )
-        return await self._http.request(route, json=payload)
+        data = await self._http.request(route, json=payload)
+        self.cache.invalidate_member(guild_id, user_id)
+        return data
 
     # 成员相关接口，添加成员到用户组等
     async def get_guild_member(self, guild_id: str, user_id: str) -> user.Member:
@@ -192,7 +242,7 @@ class BotAPI:
             guild_id=guild_id,
             user_id=user_id,
         )
-        return await self._http.request(route)
+        return await self._cached_request("guild_member", (guild_id, user_id), route)
 
     async def get_delete_member(
         self,
@@ -223,9 +273,13 @@ class BotAPI:
             guild_id=guild_id,
             user_id=user_id,
         )
-        return await self._http.request(route, json=payload)
+        data = await self._http.request(route, json=payload)
+        self.cache.invalidate_member(guild_id, user_id)
+        return data
 
-    async def get_guild_members(self, guild_id: str, after: str = "0", limit: int = 1) -> List[user.Member]:
+    async def get_guild_members(
+        self, guild_id: str, after: str = "0", limit: int = 1, timeout: float = None
+    ) -> List[user.Member]:
         """
         获取成员列表。
 
@@ -235,6 +289,7 @@ class BotAPI:
           guild_id (str): 频道 ID。
           after (str): 上一批用户中最后一个用户的ID。如果这是第一个请求，请使用 0。. Defaults to 0
           limit (int): 分页大小，1-400。成员较多的频道尽量使用较大的limit值，以减少请求数。. Defaults to 1
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           user.Member 对象的列表。
@@ -246,10 +301,42 @@ class BotAPI:
             "/guilds/{guild_id}/members",
             guild_id=guild_id,
         )
-        return await self._http.request(route, params=params)
+        return await self._http.request(route, timeout=timeout, params=params)
+
+    def iter_guild_members(
+        self, guild_id: str, after: str = "0", limit: int = 400, prefetch: bool = True, timeout: float = None
+    ) -> Paginator:
+        """
+        分页遍历频道成员列表，返回异步迭代器，`async for member in api.iter_guild_members(guild_id)`
+
+        注意:该接口为私域机器人权限, 需要在管理端申请权限
+
+        Args:
+          guild_id (str): 频道 ID。
+          after (str): 从该用户 ID 之后开始遍历，中断后可以传入迭代器的`cursor`继续遍历。. Defaults to 0
+          limit (int): 分页大小，1-400。. Defaults to 400
+          prefetch (bool): 是否预取下一页。. Defaults to True
+          timeout (float): 每一页请求的超时时间（秒），默认使用 Client 的 timeout
+
+        Returns:
+          Paginator，逐个返回 user.Member
+        """
+        # 翻页时可能返回上一页已经返回过的成员，只与上一页去重以保持内存占用有界
+        last_ids = {after}
+
+        async def fetch(cursor):
+            nonlocal last_ids
+            members = await self.get_guild_members(guild_id, after=cursor, limit=limit, timeout=timeout) or []
+            page = [m for m in members if m["user"]["id"] not in last_ids]
+            last_ids = {m["user"]["id"] for m in members}
+            # 回包为空时拉取结束
+            next_after = members[-1]["user"]["id"] if members else None
+            return page, next_after if next_after != cursor else None
+
+        return Paginator(fetch, after, item_cursor=lambda m: m["user"]["id"], prefetch=prefetch)
 
     async def get_guild_role_members(
-        self, guild_id: str, role_id: str, start_index: str = "0", limit: int = 1
+        self, guild_id: str, role_id: str, start_index: str = "0", limit: int = 1, timeout: float = None
     ) -> Dict[str, Union[List[user.Member], str]]:
         """
         获取频道身份组成员列表。
@@ -261,6 +348,7 @@ class BotAPI:
           role_id (str): 身份组 ID。
           start_index (str): 将上一次回包中next填入， 如果是第一次请求填 0，默认为 0。. Defaults to 0
           limit (int): 分页大小，1-400。成员较多的频道尽量使用较大的limit值，以减少请求数。. Defaults to 1
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           Dict[str, Union[List[user.Member], str]]
@@ -273,7 +361,41 @@ class BotAPI:
             guild_id=guild_id,
             role_id=role_id,
         )
-        return await self._http.request(route, params=params)
+        return await self._http.request(route, timeout=timeout, params=params)
+
+    def iter_guild_role_members(
+        self,
+        guild_id: str,
+        role_id: str,
+        start_index: str = "0",
+        limit: int = 400,
+        prefetch: bool = True,
+        timeout: float = None,
+    ) -> Paginator:
+        """
+        分页遍历频道身份组成员列表，返回异步迭代器
+
+        注意:该接口为私域机器人权限, 需要在管理端申请权限
+
+        Args:
+          guild_id (str): 频道 ID。
+          role_id (str): 身份组 ID。
+          start_index (str): 起始分页标识，中断后可以传入迭代器的`cursor`从该页继续遍历。. Defaults to 0
+          limit (int): 分页大小，1-400。. Defaults to 400
+          prefetch (bool): 是否预取下一页。. Defaults to True
+          timeout (float): 每一页请求的超时时间（秒），默认使用 Client 的 timeout
+
+        Returns:
+          Paginator，逐个返回 user.Member
+        """
+
+        async def fetch(cursor):
+            data = await self.get_guild_role_members(guild_id, role_id, cursor, limit, timeout) or {}
+            members = data.get("data") or []
+            next_index = data.get("next")
+            return members, next_index if members and next_index and next_index != cursor else None
+
+        return Paginator(fetch, start_index, prefetch=prefetch)
 
     async def get_voice_members(self, channel_id: str) -> List[user.Member]:
         """
@@ -308,7 +430,7 @@ class BotAPI:
             "/channels/{channel_id}",
             channel_id=channel_id,
         )
-        return await self._http.request(route)
+        return await self._cached_request("channel", (channel_id,), route)
 
     async def get_channels(self, guild_id: str) -> List[channel.ChannelPayload]:
         """
@@ -325,7 +447,7 @@ class BotAPI:
             "/guilds/{guild_id}/channels",
             guild_id=guild_id,
         )
-        return await self._http.request(route)
+        return await self._cached_request("channels", (guild_id,), route)
 
     async def create_channel(
         self, guild_id: str, name: str, type: channel.ChannelType, sub_type: channel.ChannelSubType, **fields
@@ -365,7 +487,9 @@ class BotAPI:
         )
         payload.update({k: v for k, v in fields.items() if k in valid_keys and v})
         route = Route("POST", "/guilds/{guild_id}/channels", guild_id=guild_id)
-        return await self._http.request(route, json=payload)
+        data = await self._http.request(route, json=payload)
+        self.cache.invalidate_channels(guild_id)
+        return data
 
     async def update_channel(self, channel_id: str, **fields) -> channel.ChannelPayload:
         """
@@ -385,7 +509,9 @@ class BotAPI:
           channel.Channel
         """
         route = Route("PATCH", "/channels/{channel_id}", channel_id=channel_id)
-        return await self._http.request(route, json=fields)
+        data = await self._http.request(route, json=fields)
+        self.cache.invalidate_channel(channel_id, data.get("guild_id") if isinstance(data, dict) else None)
+        return data
 
     async def delete_channel(self, channel_id: str) -> channel.ChannelPayload:
         """
@@ -398,7 +524,9 @@ class BotAPI:
           删除后的channel.Channel
         """
         route = Route("DELETE", "/channels/{channel_id}", channel_id=channel_id)
-        return await self._http.request(route)
+        data = await self._http.request(route)
+        self.cache.invalidate_channel(channel_id, data.get("guild_id") if isinstance(data, dict) else None)
+        return data
 
     # 子频道权限相关接口
     async def get_channel_user_permissions(self, channel_id: str, user_id: str) -> channel.ChannelPermissions:
@@ -502,11 +630,12 @@ class BotAPI:
         ark: message.Ark = None,
         message_reference: message.Reference = None,
         image: str = None,
-        file_image: Union[bytes, BinaryIO, str] = None,
+        file_image: Union[bytes, BinaryIO, str, os.PathLike, mmap.mmap] = None,
         msg_id: str = None,
         event_id: str = None,
         markdown: message.MarkdownPayload = None,
         keyboard: message.Keyboard = None,
+        timeout: float = None,
     ) -> message.Message:
         """
         发送消息。
@@ -525,27 +654,25 @@ class BotAPI:
           ark (message.Ark): ark 模版消息
           message_reference (message.Reference): 对消息的引用。
           image (str): 要发送的图像的 URL。
-          file_image (bytes): 要发送的本地图像的本地路径或数据。
+          file_image (bytes): 要发送的本地图像的本地路径或数据，也可以是文件对象或 mmap，发送时以流的方式读取。
           msg_id (str): 您要回复的消息的 ID。您可以从 AT_CREATE_MESSAGE 事件中获取此 ID。
           event_id (str): 您要回复的消息的事件 ID。
           markdown (message.MarkdownPayload): markdown 消息
           keyboard (message.Keyboard): keyboard 消息
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           message.Message: 一个消息字典对象。
         """
-        if isinstance(file_image, BufferedReader):
-            file_image = file_image.read()
-        elif isinstance(file_image, str):
-            with open(file_image, "rb") as img:
-                file_image = img.read()
         payload = locals()
         payload.pop("self", None)
-        payload.pop("img", None)
+        payload.pop("timeout", None)
         route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
-        return await self._http.request(route, json=payload)
+        return await self._http.request(route, timeout=timeout, json=payload)
 
-    async def recall_message(self, channel_id: str, message_id: str, hidetip: bool = False) -> str:
+    async def recall_message(
+        self, channel_id: str, message_id: str, hidetip: bool = False, timeout: float = None
+    ) -> str:
         """
         撤回消息。
 
@@ -557,6 +684,7 @@ class BotAPI:
           channel_id (str): 您要将消息发送到的频道的 ID。
           message_id (str): 要撤回的消息的 ID。
           hidetip (bool): 是否隐藏撤回提示小灰条。. Defaults to False
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           成功执行返回`None`。
@@ -569,13 +697,14 @@ class BotAPI:
             channel_id=channel_id,
             message_id=message_id,
         )
-        return await self._http.request(route, params=params)
+        return await self._http.request(route, timeout=timeout, params=params)
 
     async def post_keyboard_message(
         self,
         channel_id: str,
         keyboard: message.KeyboardPayload = None,
         markdown: message.MarkdownPayload = None,
+        timeout: float = None,
     ) -> message.Message:
         """
         `post_keyboard_message` 使用内联键盘发送消息
@@ -584,6 +713,7 @@ class BotAPI:
           channel_id (str): 您要将消息发送到的频道的 ID。
           keyboard (message.KeyboardPayload): keyboard 消息的构建参数
           markdown (message.MarkdownPayload): markdown 消息的构建参数。
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           一个消息的字典数据对象。
@@ -594,7 +724,7 @@ class BotAPI:
             "/channels/{channel_id}/messages",
             channel_id=channel_id,
         )
-        return await self._http.request(route, json=payload)
+        return await self._http.request(route, timeout=timeout, json=payload)
 
     async def on_interaction_result(self, interaction_id: str, code: int):
         """
@@ -623,6 +753,7 @@ class BotAPI:
         event_id: str = None,
         markdown: message.MarkdownPayload = None,
         keyboard: message.KeyboardPayload = message.KeyboardPayload(content={}),
+        timeout: float = None,
     ) -> message.Message:
         """
         修改频道markdown消息，需要先申请权限。
@@ -634,19 +765,21 @@ class BotAPI:
           event_id (str): 您要回复的消息的事件 ID。
           markdown (message.MarkdownPayload): markdown 消息的构建参数。
           keyboard (message.KeyboardPayload): keyboard 消息的构建参数
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           message.Message: 一个消息字典对象。
         """
         payload = locals()
         payload.pop("self", None)
+        payload.pop("timeout", None)
         route = Route(
             "PATCH",
             "/channels/{channel_id}/messages/{patch_msg_id}",
             channel_id=channel_id,
             patch_msg_id=patch_msg_id,
         )
-        return await self._http.request(route, json=payload)
+        return await self._http.request(route, timeout=timeout, json=payload)
 
     # 私信消息
     async def create_dms(self, guild_id: str, user_id: str) -> message.DmsPayload:
@@ -674,11 +807,12 @@ class BotAPI:
         ark: message.Ark = None,
         message_reference: message.Reference = None,
         image: str = None,
-        file_image: Union[bytes, BinaryIO, str] = None,
+        file_image: Union[bytes, BinaryIO, str, os.PathLike, mmap.mmap] = None,
         msg_id: str = None,
         event_id: str = None,
         markdown: message.MarkdownPayload = None,
         keyboard: message.Keyboard = None,
+        timeout: float = None,
     ) -> message.Message:
         """
         发送私信。
@@ -697,25 +831,21 @@ class BotAPI:
           ark (message.Ark): ark 模版消息
           message_reference (message.Reference): 对消息的引用。
           image (str): 要发送的图像的 URL。
-          file_image (bytes): 本地图片
+          file_image (bytes): 本地图片的路径或数据，也可以是文件对象或 mmap，发送时以流的方式读取。
           msg_id (str): 您要回复的消息的 ID。您可以从 AT_CREATE_MESSAGE 事件中获取此 ID。
           event_id (str): 您要回复的消息的事件 ID。
           markdown (message.MarkdownPayload): markdown 消息
           keyboard (message.Keyboard): keyboard 消息
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           message.Message: 一个消息字典对象。
         """
-        if isinstance(file_image, BufferedReader):
-            file_image = file_image.read()
-        elif isinstance(file_image, str):
-            with open(file_image, "rb") as img:
-                file_image = img.read()
         payload = locals()
         payload.pop("self", None)
-        payload.pop("img", None)
+        payload.pop("timeout", None)
         route = Route("POST", "/dms/{guild_id}/messages", guild_id=guild_id)
-        return await self._http.request(route, json=payload)
+        return await self._http.request(route, timeout=timeout, json=payload)
 
     # 音频接口
     async def update_audio(self, channel_id: str, audio_control: audio.AudioControl) -> str:
@@ -801,6 +931,28 @@ class BotAPI:
         route = Route("GET", "/users/@me/guilds")
         return await self._http.request(route, params=params)
 
+    def iter_me_guilds(
+        self, guild_id: str = None, limit: int = 100, desc: bool = False, prefetch: bool = True
+    ) -> Paginator:
+        """
+        分页遍历当前用户已加入的频道，返回异步迭代器
+
+        Args:
+          guild_id (str): 起始频道 ID，中断后可以传入迭代器的`cursor`继续遍历。
+          limit (int): 分页大小（1-100）。. Defaults to 100
+          desc (bool): 如果为 True，则按频道 ID 往前遍历。. Defaults to False
+          prefetch (bool): 是否预取下一页。. Defaults to True
+
+        Returns:
+          Paginator，逐个返回 guild.GuildPayload
+        """
+
+        async def fetch(cursor):
+            guilds = await self.me_guilds(cursor, limit=limit, desc=desc) or []
+            return guilds, guilds[-1]["id"] if len(guilds) >= limit else None
+
+        return Paginator(fetch, guild_id, item_cursor=lambda g: g["id"], prefetch=prefetch)
+
     # WebsocketAPI
     async def get_ws_url(self):
         """
@@ -1211,6 +1363,7 @@ class BotAPI:
         emoji_id: str,
         cookie: str = None,
         limit: int = 20,
+        timeout: float = None,
     ) -> reaction.ReactionUsers:
         """
         获取表情表态用户列表
@@ -1222,6 +1375,7 @@ class BotAPI:
           emoji_id (str): 表情符号的 ID。
           cookie (str): cookie 上次请求返回的cookie，第一次请求无需填写。
           limit (int): 返回的最大用户数 (1-100)。. Defaults to 20
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           对带有特定表情符号的消息做出反应的用户列表。
@@ -1235,7 +1389,43 @@ class BotAPI:
             id=emoji_id,
         )
         params = {"limit": limit, "cookie": cookie} if cookie else {"limit": limit}
-        return await self._http.request(route, params=params)
+        return await self._http.request(route, timeout=timeout, params=params)
+
+    def iter_reaction_users(
+        self,
+        channel_id: str,
+        message_id: str,
+        emoji_type: emoji.EmojiType,
+        emoji_id: str,
+        cookie: str = None,
+        limit: int = 100,
+        prefetch: bool = True,
+        timeout: float = None,
+    ) -> Paginator:
+        """
+        分页遍历表情表态用户列表，返回异步迭代器
+
+        Args:
+          channel_id (str): 消息所在子频道的 ID。
+          message_id (str): 要从中获取表情表态的消息的 ID。
+          emoji_type (emoji.EmojiType): 表情符号的类型。1: 系统表情, 2: emoji表情
+          emoji_id (str): 表情符号的 ID。
+          cookie (str): 起始分页标识，中断后可以传入迭代器的`cursor`从该页继续遍历。
+          limit (int): 分页大小 (1-100)。. Defaults to 100
+          prefetch (bool): 是否预取下一页。. Defaults to True
+          timeout (float): 每一页请求的超时时间（秒），默认使用 Client 的 timeout
+
+        Returns:
+          Paginator，逐个返回 user.User
+        """
+
+        async def fetch(cursor):
+            data = await self.get_reaction_users(channel_id, message_id, emoji_type, emoji_id, cursor, limit, timeout)
+            data = data or {}
+            users = data.get("users") or []
+            return users, None if data.get("is_end", True) or not users else data.get("cookie")
+
+        return Paginator(fetch, cookie, prefetch=prefetch)
 
     # 精华消息API
     async def put_pin(self, channel_id: str, message_id: str) -> pins_message.PinsMessage:
@@ -1339,7 +1529,9 @@ class BotAPI:
         )
         return await self._http.request(route)
 
-    async def post_thread(self, channel_id: str, title: str, content: str, format: forum.Format) -> forum.PostThreadRsp:
+    async def post_thread(
+        self, channel_id: str, title: str, content: str, format: forum.Format, timeout: float = None
+    ) -> forum.PostThreadRsp:
         """
         该接口用于发表帖子。
 
@@ -1348,6 +1540,7 @@ class BotAPI:
           title (str): 线程的标题。
           content (str): 帖子的内容。
           format (forum.Format): 内容的格式。
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           返回PostThreadRsp 对象。
@@ -1359,7 +1552,7 @@ class BotAPI:
         )
 
         payload = {"title": title, "content": content, "format": format}
-        return await self._http.request(route, json=payload)
+        return await self._http.request(route, timeout=timeout, json=payload)
 
     async def delete_thread(self, channel_id: str, thread_id: str) -> str:
         """
@@ -1387,10 +1580,11 @@ class BotAPI:
         message_reference: message.Reference = None,
         media: message.Media = None,
         msg_id: str = None,
-        msg_seq: int = 1,
+        msg_seq: int = None,
         event_id: str = None,
         markdown: message.MarkdownPayload = None,
         keyboard: message.KeyboardPayload = None,
+        timeout: float = None,
     ) -> message.Message:
         """
         发送消息。
@@ -1410,18 +1604,22 @@ class BotAPI:
           message_reference (message.Reference): 对消息的引用。
           media (message.Media): 富媒体消息
           msg_id (str): 您要回复的消息的 ID。
-          msg_seq (int): 回复消息的序号，与 msg_id 联合使用，默认是1。相同的 msg_id + msg_seq 重复发送会失败。
+          msg_seq (int): 回复消息的序号，与 msg_id 联合使用，相同的 msg_id + msg_seq 重复发送会失败。
+            默认按 msg_id 自动分配（1, 2, 3...），主动消息默认是1。
           event_id (str): 您要回复的消息的事件 ID。
           markdown (message.MarkdownPayload): markdown 消息
           keyboard (message.KeyboardPayload): keyboard 消息
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           message.Message: 一个消息字典对象。
         """
         payload = locals()
         payload.pop("self", None)
+        payload.pop("timeout", None)
+        self._assign_msg_seq(payload)
         route = Route("POST", "/v2/groups/{group_openid}/messages", group_openid=group_openid)
-        return await self._http.request(route, json=payload)
+        return await self._http.request(route, timeout=timeout, json=payload)
 
     async def post_c2c_message(
         self,
@@ -1433,10 +1631,11 @@ class BotAPI:
         message_reference: message.Reference = None,
         media: message.Media = None,
         msg_id: str = None,
-        msg_seq: int = 1,
+        msg_seq: int = None,
         event_id: str = None,
         markdown: message.MarkdownPayload = None,
         keyboard: message.KeyboardPayload = None,
+        timeout: float = None,
     ) -> message.Message:
         """
         发送消息。
@@ -1456,18 +1655,22 @@ class BotAPI:
           message_reference (message.Reference): 对消息的引用。
           media (message.Media): 富媒体消息
           msg_id (str): 您要回复的消息的 ID。
-          msg_seq (int): 回复消息的序号，与 msg_id 联合使用，默认是1。相同的 msg_id + msg_seq 重复发送会失败。
+          msg_seq (int): 回复消息的序号，与 msg_id 联合使用，相同的 msg_id + msg_seq 重复发送会失败。
+            默认按 msg_id 自动分配（1, 2, 3...），主动消息默认是1。
           event_id (str): 您要回复的消息的事件 ID。
           markdown (message.MarkdownPayload): markdown 消息
           keyboard (message.KeyboardPayload): keyboard 消息
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
 
         Returns:
           message.Message: 一个消息字典对象。
         """
         payload = locals()
         payload.pop("self", None)
+        payload.pop("timeout", None)
+        self._assign_msg_seq(payload)
         route = Route("POST", "/v2/users/{openid}/messages", openid=openid)
-        return await self._http.request(route, json=payload)
+        return await self._http.request(route, timeout=timeout, json=payload)
 
     async def post_group_file(
         self,
@@ -1475,6 +1678,7 @@ class BotAPI:
         file_type: int,
         url: str,
         srv_send_msg: bool = False,
+        timeout: float = None,
     ) -> message.Media:
         """
         上传/发送群聊图片
@@ -1484,11 +1688,16 @@ class BotAPI:
           file_type (int): 媒体类型：1 图片png/jpg，2 视频mp4，3 语音silk，4 文件（暂不开放）
           url (str): 需要发送媒体资源的url
           srv_send_msg (bool): 设置 true 会直接发送消息到目标端，且会占用主动消息频次
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
+
+        Returns:
+          message.Media: 未设置 srv_send_msg 时，有效期内相同 url 的结果会从`media_cache`返回，不再重复上传
         """
         payload = locals()
         payload.pop("self", None)
+        payload.pop("timeout", None)
         route = Route("POST", "/v2/groups/{group_openid}/files", group_openid=group_openid)
-        return await self._http.request(route, json=payload)
+        return await self._upload_media("group", group_openid, route, payload, timeout)
 
     async def post_c2c_file(
         self,
@@ -1496,6 +1705,7 @@ class BotAPI:
         file_type: int,
         url: str,
         srv_send_msg: bool = False,
+        timeout: float = None,
     ) -> message.Media:
         """
         上传/发送c2c图片
@@ -1505,8 +1715,23 @@ class BotAPI:
           file_type (int): 媒体类型：1 图片png/jpg，2 视频mp4，3 语音silk，4 文件（暂不开放）
           url (str): 需要发送媒体资源的url
           srv_send_msg (bool): 设置 true 会直接发送消息到目标端，且会占用主动消息频次
+          timeout (float): 本次请求的超时时间（秒），默认使用 Client 的 timeout
+
+        Returns:
+          message.Media: 未设置 srv_send_msg 时，有效期内相同 url 的结果会从`media_cache`返回，不再重复上传
         """
         payload = locals()
         payload.pop("self", None)
+        payload.pop("timeout", None)
         route = Route("POST", "/v2/users/{openid}/files", openid=openid)
-        return await self._http.request(route, json=payload)
+        return await self._upload_media("c2c", openid, route, payload, timeout)
+
+    async def _upload_media(
+        self, scope: str, target: str, route: Route, payload: Dict[str, Any], timeout: float = None
+    ) -> message.Media:
+        if payload["srv_send_msg"]:
+            return await self._http.request(route, timeout=timeout, json=payload)
+        key = self.media_cache.key(scope, target, payload["file_type"], payload["url"])
+        return await self.media_cache.get_or_upload(
+            key, lambda: self._http.request(route, timeout=timeout, json=payload)
+        )
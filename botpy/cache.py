@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .deadline import PASSIVE_REPLY_WINDOW
+
+# 各个接口的默认缓存时间（秒）
+DEFAULT_TTLS = {
+    "guild": 30,
+    "guild_roles": 30,
+    "guild_member": 30,
+    "channel": 30,
+    "channels": 30,
+}
+
+# file_info 提前失效的时间（秒），避免发送消息时 file_info 恰好过期
+MEDIA_EXPIRY_MARGIN = 60
+
+
+class TTLCache:
+    """带过期时间的 LRU 缓存，超出容量时淘汰最久未使用的数据"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    """BotAPI 读接口的返回数据缓存
+
+    缓存会在收到对应的 websocket 事件（如 guild_update、channel_delete）或通过 BotAPI 修改数据时失效。
+    注意: 缓存的返回数据会被多个调用方共享，调用方不应直接修改。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttls: Dict[str, float] = None):
+        """
+        Args:
+          maxsize (int): 最多缓存的条目数，0 表示不缓存。. Defaults to 10000
+          ttls (dict): 各个接口的缓存时间（秒），key 参考 DEFAULT_TTLS，0 表示该接口不缓存
+        """
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.hits = 0
+        self.misses = 0
+        # 每次失效时递增；_invalidated 记录各个 key 最近一次失效时的 generation，
+        # 只丢弃请求期间自己的 key 失效了的结果，其他 key 的失效不影响
+        self.generation = 0
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._invalidated_maxsize = max(maxsize, 1)
+        # 早于该 generation 发出的请求结果都丢弃（clear 之后，或失效记录被淘汰时）
+        self._floor = 0
+        self._cache = TTLCache(maxsize)
+
+    def get(self, endpoint: str, *ids: str) -> Optional[Any]:
+        value = self._cache.get((endpoint,) + ids)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, endpoint: str, value: Any, *ids: str, generation: int = None) -> None:
+        """
+        Args:
+          generation (int): 发出请求前的`generation`，请求期间该 key 失效过时不缓存结果
+        """
+        key = (endpoint,) + ids
+        if value is None:
+            return
+        if generation is not None and (generation < self._floor or self._invalidated.get(key, 0) > generation):
+            return
+        self._cache.set(key, value, self.ttls.get(endpoint, 0))
+
+    def _pop(self, endpoint: str, *ids: str) -> None:
+        key = (endpoint,) + ids
+        self.generation += 1
+        self._invalidated[key] = self.generation
+        self._invalidated.move_to_end(key)
+        if len(self._invalidated) > self._invalidated_maxsize:
+            _, self._floor = self._invalidated.popitem(last=False)
+        self._cache.pop(key)
+
+    def invalidate_guild(self, guild_id: str) -> None:
+        self._pop("guild", guild_id)
+        self._pop("guild_roles", guild_id)
+
+    def invalidate_roles(self, guild_id: str) -> None:
+        self._pop("guild_roles", guild_id)
+
+    def invalidate_channel(self, channel_id: str, guild_id: str = None) -> None:
+        self._pop("channel", channel_id)
+        if guild_id:
+            self.invalidate_channels(guild_id)
+
+    def invalidate_channels(self, guild_id: str) -> None:
+        self._pop("channels", guild_id)
+
+    def invalidate_member(self, guild_id: str, user_id: str) -> None:
+        self._pop("guild_member", guild_id, user_id)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._floor = self.generation
+        self._invalidated.clear()
+        self._cache.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class MsgSeqAllocator:
+    """按 msg_id 分配被动回复的 msg_seq
+
+    同一条消息的多次回复需要使用不同的 msg_seq，序号在事件循环内同步分配，并发的回复不会拿到相同的序号。
+    记录在被动回复有效期过后过期，超出容量时淘汰最久未使用的记录。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = PASSIVE_REPLY_WINDOW):
+        """
+        Args:
+          maxsize (int): 最多记录的 msg_id 数量。. Defaults to 10000
+          ttl (float): 最后一次回复后记录保留的时间（秒）。. Defaults to PASSIVE_REPLY_WINDOW
+        """
+        self.ttl = ttl
+        self.allocated = 0
+        self._seqs = TTLCache(maxsize)
+
+    def allocate(self, msg_id: str) -> int:
+        """为 msg_id 的下一次回复分配序号，从 1 开始"""
+        seq = (self._seqs.get(msg_id) or 0) + 1
+        self._seqs.set(msg_id, seq, self.ttl)
+        self.allocated += 1
+        return seq
+
+    def reserve(self, msg_id: str, msg_seq: int) -> None:
+        """记录调用方指定的序号，之后分配的序号从更大的值开始"""
+        if msg_seq > (self._seqs.get(msg_id) or 0):
+            self._seqs.set(msg_id, msg_seq, self.ttl)
+
+    def __len__(self) -> int:
+        return len(self._seqs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"size": len(self._seqs), "allocated": self.allocated}
+
+
+class MediaCache:
+    """post_group_file / post_c2c_file 上传结果（file_info）的缓存
+
+    同一个资源 URL 发送到同一个目标时复用有效期内的 file_info，不再重复上传；
+    并发上传同一个资源时只会发出一次请求，其余调用方共享结果。
+    设置了 srv_send_msg 的上传会直接发送消息，不使用缓存。
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        per_target: bool = True,
+        default_ttl: float = 86400,
+        margin: float = MEDIA_EXPIRY_MARGIN,
+    ):
+        """
+        Args:
+          maxsize (int): 最多缓存的 file_info 数量，0 表示不缓存。. Defaults to 10000
+          per_target (bool): file_info 是否只在上传的群/用户内复用，False 时同类目标之间共享。. Defaults to True
+          default_ttl (float): 返回的 ttl 为 0（长期有效）时的缓存时间（秒）。. Defaults to 86400
+          margin (float): 在 file_info 到期前多少秒失效。. Defaults to MEDIA_EXPIRY_MARGIN
+        """
+        self.per_target = per_target
+        self.default_ttl = default_ttl
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self._cache = TTLCache(maxsize)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def key(self, scope: str, target: str, file_type: int, url: str) -> Hashable:
+        """
+        Args:
+          scope (str): 目标类型，group 或 c2c
+          target (str): group_openid 或 openid
+          file_type (int): 媒体类型
+          url (str): 资源的 URL
+        """
+        return (scope, target if self.per_target else None, file_type, url)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        item = self._cache.get(key)
+        if item is None:
+            return None
+        media, expires_at = item
+        if not media.get("ttl"):
+            return media
+        # 返回剩余的有效期
+        return dict(media, ttl=max(0, int(expires_at - time.monotonic())))
+
+    def set(self, key: Hashable, media: Any) -> None:
+        if not isinstance(media, dict) or not media.get("file_info"):
+            return
+        ttl = media.get("ttl") or self.default_ttl
+        self._cache.set(key, (media, time.monotonic() + ttl), ttl - self.margin)
+
+    def pop(self, key: Hashable) -> None:
+        """file_info 失效时移除，下次发送重新上传"""
+        self._cache.pop(key)
+
+    async def get_or_upload(self, key: Hashable, upload: Callable[[], Awaitable[Any]]) -> Any:
+        media = self.get(key)
+        if media is not None:
+            self.hits += 1
+            return media
+        future = self._inflight.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._upload(key, upload))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.collapsed += 1
+        # shield 避免某个调用方被取消时影响其他等待相同上传的调用方
+        return await asyncio.shield(future)
+
+    async def _upload(self, key: Hashable, upload: Callable[[], Awaitable[Any]]) -> Any:
+        media = await upload()
+        self.set(key, media)
+        return media
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.hits + self.misses + self.collapsed
+        return {
+            "size": len(self._cache),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+            "hit_ratio": (self.hits + self.collapsed) / total if total else 0.0,
+        }
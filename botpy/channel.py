@@ -23,6 +23,7 @@ class Channel:
         self._api = api
 
         self.id = data.get("id", None)
+        self.guild_id = data.get("guild_id", None)
         self.name = data.get("name", None)
         self.type = data.get("type", None)
         self.sub_type = data.get("sub_type", None)
@@ -1,15 +1,17 @@
 import asyncio
 import traceback
 from types import TracebackType
-from typing import Any, Callable, Coroutine, Dict, List, Tuple, Optional, Union, Type
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Tuple, Optional, Union, Type
 
-from . import logging
+from . import deadline, logging
 from .api import BotAPI
-from .connection import ConnectionSession
+from .connection import BACKPRESSURE_PAUSE, ConnectionSession
 from .flags import Intents
 from .gateway import BotWebSocket
-from .http import BotHttp
+from .http import BotHttp, ConnectorConfig, SessionRegistry
+from .metrics import GatewayMetrics
 from .robot import Robot, Token
+from .session_store import FileSessionStore, SessionStore
 
 _log = logging.get_logger()
 
@@ -37,6 +39,13 @@ class Client:
         log_level: int = None,
         bot_log: Union[bool, None] = True,
         ext_handlers: Union[dict, List[dict], bool] = True,
+        connector_config: ConnectorConfig = None,
+        trace_payloads: bool = None,
+        log_queue_size: int = None,
+        reply_window: Optional[float] = deadline.PASSIVE_REPLY_WINDOW,
+        event_queue_size: int = 1000,
+        backpressure: str = BACKPRESSURE_PAUSE,
+        session_store: Union[SessionStore, str, None] = None,
     ):
         """
         Args:
@@ -49,13 +58,41 @@ class Client:
           log_level: 控制台输出level。Default to None(不做更改),
           bot_log: bot_log: bot_log: 是否启用bot日志 True/启用 None/禁用拓展 False/禁用拓展+控制台输出
           ext_handlers: ext_handlers: 额外的handler，格式参考 logging.DEFAULT_FILE_HANDLER。Default to True(使用默认追加handler)
+          connector_config (ConnectorConfig): 连接池配置，API 请求、websocket 连接和获取 token 共用。Default to None（复用连接的默认配置）
+          trace_payloads: 是否在debug日志中输出完整的请求和消息内容。Default to None（不做更改）
+          log_queue_size: 大于0时额外的handler通过有界队列在后台线程写入，避免阻塞事件循环。Default to None（不做更改）
+          reply_window: 被动回复的有效时间（秒），从事件的时间戳开始计算，超过后不再排队或重试被动回复。
+            Default to 300，None 表示不限制
+          event_queue_size: 每个分片待解析事件队列的长度。Default to 1000
+          backpressure: 事件队列满时的处理方式，"pause" 暂停读取 websocket（包括心跳 ACK 等控制消息），"shed" 丢弃最早的事件。Default to "pause"
+          session_store: 保存各分片会话状态的 SessionStore 或 JSON 文件路径（如 "botpy_sessions.json"），
+            重启后先尝试 resume。Default to None（不保存）
         """
         self.intents: int = intents.value
         self.ret_coro: bool = False
+        self.reply_window = reply_window
+        self.event_queue_size = event_queue_size
+        self.backpressure = backpressure
+        if isinstance(session_store, str):
+            session_store = FileSessionStore(session_store)
+        self.session_store: Optional[SessionStore] = session_store
+        # 多个进程共用的鉴权限频，由 ShardManager 设置
+        self.identify_limiter = None
+        self.shard_ids: Optional[List[int]] = None
+        self.shard_count: Optional[int] = None
         # TODO loop的整体梳理 @veehou
         self.loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
-        self.http: BotHttp = BotHttp(timeout=timeout, is_sandbox=is_sandbox)
+        # API 请求、websocket 连接和获取 token 共用的连接器，在 close 时关闭
+        self.session_registry = SessionRegistry(connector_config)
+        self.http: BotHttp = BotHttp(
+            timeout=timeout,
+            is_sandbox=is_sandbox,
+            connector_config=connector_config,
+            session_registry=self.session_registry,
+        )
         self.api: BotAPI = BotAPI(http=self.http)
+        # websocket 各分片的心跳指标
+        self.gateway_metrics = GatewayMetrics()
 
         self._connection: Optional[ConnectionSession] = None
         self._closed: bool = False
@@ -68,6 +105,8 @@ class Client:
             level=log_level,
             bot_log=bot_log,
             ext_handlers=ext_handlers,
+            trace_payloads=trace_payloads,
+            queue_size=log_queue_size,
         )
 
     async def __aenter__(self):
@@ -90,6 +129,11 @@ class Client:
     def robot(self):
         return self._connection.state.robot
 
+    @property
+    def latency(self) -> Optional[float]:
+        """websocket 心跳的往返耗时（秒），多个分片时取平均值，还没有收到心跳 ACK 时为 None"""
+        return self.gateway_metrics.latency
+
     async def close(self) -> None:
         """关闭client相关的连接"""
 
@@ -98,7 +142,10 @@ class Client:
 
         self._closed = True
 
+        if self.session_store is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.session_store.flush)
         await self.http.close()
+        await self.session_registry.close()
 
     def is_closed(self) -> bool:
         return self._closed
@@ -136,7 +183,15 @@ class Client:
         except KeyboardInterrupt:
             return
 
-    async def start(self, appid: str, secret: str, ret_coro: bool = False) -> Optional[Coroutine]:
+    async def start(
+        self,
+        appid: str,
+        secret: str,
+        ret_coro: bool = False,
+        shard_ids: Optional[Iterable[int]] = None,
+        shard_count: Optional[int] = None,
+        token: Optional[Token] = None,
+    ) -> Optional[Coroutine]:
         """机器人开始执行
 
         参数
@@ -147,10 +202,18 @@ class Client:
             机器人 secret
         ret_coro: :class:`bool`
             是否需要返回协程对象
+        shard_ids: :class:`Iterable[int]`
+            只启动其中的分片，默认启动 /gateway/bot 返回的所有分片
+        shard_count: :class:`int`
+            分片总数，默认使用 /gateway/bot 返回的分片数
+        token: :class:`Token`
+            已经获取 access_token 的 Token，多进程运行时由 ShardManager 传入
         """
         # login后再进行后面的操作
-        token = Token(appid, secret)
+        token = token or Token(appid, secret)
         self.ret_coro = ret_coro
+        self.shard_ids = None if shard_ids is None else list(shard_ids)
+        self.shard_count = shard_count
 
         if self.loop is _loop:
             await self._async_setup_hook()
@@ -173,14 +236,24 @@ class Client:
             dispatch=self.ws_dispatch,
             loop=self.loop,
             api=self.api,
+            metrics=self.gateway_metrics,
+            event_queue_size=self.event_queue_size,
+            backpressure=self.backpressure,
+            session_store=self.session_store,
+            identify_limiter=self.identify_limiter,
+            session_registry=self.session_registry,
         )
 
         self._connection.state.robot = Robot(user)
 
     async def _bot_init(self, token):
         _log.info("[botpy] 程序启动...")
+        if self.shard_count is None:
+            self.shard_count = self._ws_ap["shards"]
+        if self.shard_ids is None:
+            self.shard_ids = list(range(self.shard_count))
         # 每个机器人创建的连接数不能超过remaining剩余连接数
-        if self._ws_ap["shards"] > self._ws_ap["session_start_limit"]["remaining"]:
+        if len(self.shard_ids) > self._ws_ap["session_start_limit"]["remaining"]:
             raise Exception("[botpy] 超出会话限制...")
 
         # 根据session限制建立链接
@@ -188,7 +261,7 @@ class Client:
         session_interval = round(5 / concurrency)
 
         # 根据限制建立分片的并发链接数
-        _log.debug(f'[botpy] 会话间隔: {session_interval}, 分片: {self._ws_ap["shards"]}, 事件代码: {self.intents}')
+        _log.debug("[botpy] 会话间隔: %s, 分片: %s, 事件代码: %s", session_interval, self.shard_ids, self.intents)
         return await self._pool_init(token.bot_token(), session_interval)
 
     async def _pool_init(self, token, session_interval):
@@ -200,14 +273,14 @@ class Client:
             if isinstance(exception, ZeroDivisionError):
                 _loop.stop()
 
-        for i in range(self._ws_ap["shards"]):
+        for i in self.shard_ids:
             session = {
                 "session_id": "",
                 "last_seq": 0,
                 "intent": self.intents,
                 "token": token,
                 "url": self._ws_ap["url"],
-                "shards": {"shard_id": i, "shard_count": self._ws_ap["shards"]},
+                "shards": {"shard_id": i, "shard_count": self.shard_count},
             }
             self._connection.add(session)
 
@@ -252,13 +325,15 @@ class Client:
 
         解析client类的on_event事件，进行对应的事件回调
         """
-        _log.debug("[botpy] 调度事件: %s", event)
+        debug = _log.isEnabledFor(logging.DEBUG)
+        if debug:
+            _log.debug("[botpy] 调度事件: %s", event)
         method = "on_" + event
 
-        if hasattr(self, method):
-            coro = getattr(self, method)
+        coro = getattr(self, method, None)
+        if coro is not None:
             self._schedule_event(coro, method, *args, **kwargs)
-        else:
+        elif debug:
             _log.debug("[botpy] 事件: %s 未注册", event)
 
 
@@ -280,9 +355,12 @@ class Client:
         *args: Any,
         **kwargs: Any,
     ) -> None:
+        reply_deadline = None
+        if args and self.reply_window is not None:
+            reply_deadline = deadline.from_timestamp(getattr(args[0], "timestamp", None), self.reply_window)
         try:
-            _log.debug("[botpy] _run_event")
-            await coro(*args, **kwargs)
+            with deadline.use_reply_deadline(reply_deadline):
+                await coro(*args, **kwargs)
         except asyncio.CancelledError:
             pass
         except Exception:
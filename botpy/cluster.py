@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+多台机器运行同一个机器人时的分片分配
+
+每个节点（`ClusterNode`）定期在共享的`ShardRegistry`中续约自己和持有的分片租约（lease），
+按存活节点的加入顺序将分片平均分配，节点加入或离开时：
+
+- 分到其他节点的分片先断开连接、保存会话状态，再释放租约；
+- 分给自己的分片在租约空闲或过期后取得，连接时使用注册表中保存的 session_id 和 seq 发起 resume，
+  从而接管故障节点的分片并补收期间的事件。
+
+租约过期前其他节点不能取得该分片，同一分片不会同时被两个节点连接。
+默认的`SQLiteShardRegistry`使用 SQLite 文件，适用于同一台机器上的多个进程或共享文件系统，
+继承`ShardRegistry`实现对应方法即可接入其他存储（如 Redis、etcd）。
+
+使用方式:
+
+    registry = SQLiteShardRegistry("/shared/botpy_cluster.db")
+    node = ClusterNode(MyClient(intents=intents), registry)
+    await node.start(appid="...", secret="...")
+"""
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from . import logging
+from .client import Client
+from .robot import Token
+from .session_store import SessionStore
+from .shard_manager import IdentifyLimiter, split_shards
+
+_log = logging.get_logger()
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, joined_at REAL NOT NULL, expires_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS leases (shard_id INTEGER PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        key TEXT PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        last_seq INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+)
+
+# 不使用 UPSERT（需要 SQLite 3.24+），先插入，已有租约时只在属于该节点或已过期时更新
+_CLAIM_INSERT = "INSERT OR IGNORE INTO leases (shard_id, owner, expires_at) VALUES (?, ?, ?)"
+_CLAIM_UPDATE = "UPDATE leases SET owner = ?, expires_at = ? WHERE shard_id = ? AND (owner = ? OR expires_at < ?)"
+
+_SAVE_SESSION = "INSERT OR REPLACE INTO sessions (key, session_id, last_seq, updated_at) VALUES (?, ?, ?, ?)"
+
+
+class ShardRegistry(SessionStore):
+    """
+    节点和分片租约的注册表，同时作为 SessionStore 保存各分片的会话状态，供接管分片的节点 resume
+
+    时间均为`time.time()`，各节点的时钟偏差需要远小于租约时间。
+    """
+
+    def heartbeat(self, node_id: str, ttl: float) -> List[str]:
+        """续约节点，返回按加入顺序排列的存活节点"""
+        raise NotImplementedError
+
+    def leave(self, node_id: str) -> None:
+        """节点退出，删除节点记录"""
+        raise NotImplementedError
+
+    def claim(self, node_id: str, shard_id: int, ttl: float) -> bool:
+        """租约空闲、已过期或已经属于该节点时取得租约，返回是否成功"""
+        raise NotImplementedError
+
+    def renew(self, node_id: str, shard_ids: Iterable[int], ttl: float) -> List[int]:
+        """续约节点持有的分片，返回仍然持有的分片"""
+        raise NotImplementedError
+
+    def release(self, node_id: str, shard_id: int) -> None:
+        """释放节点持有的分片租约"""
+        raise NotImplementedError
+
+    def leases(self) -> Dict[int, Dict[str, Any]]:
+        """所有分片租约，key 为分片 id"""
+        raise NotImplementedError
+
+
+class SQLiteShardRegistry(ShardRegistry):
+    """使用 SQLite 文件的注册表，多个进程可以同时使用同一个文件"""
+
+    def __init__(self, path: str = "botpy_cluster.db", flush_interval: float = 1.0):
+        """
+        Args:
+          path (str): SQLite 数据库文件路径。. Defaults to "botpy_cluster.db"
+          flush_interval (float): seq 变化时写入会话状态的最小间隔（秒）。. Defaults to 1.0
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        # _lock 保护数据库连接，只在线程池中持有；_pending_lock 只保护内存中待写入的会话状态，
+        # gateway 在事件循环中调用 save / clear 时不会等待数据库操作
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[str, Optional[tuple]] = {}
+
+    def _execute(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            if self._conn is None:
+                conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                with conn:
+                    for statement in _SCHEMA:
+                        conn.execute(statement)
+                self._conn = conn
+            with self._conn:
+                return func(self._conn)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def heartbeat(self, node_id: str, ttl: float) -> List[str]:
+        def run(conn):
+            now = time.time()
+            conn.execute("DELETE FROM nodes WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT OR IGNORE INTO nodes (node_id, joined_at, expires_at) VALUES (?, ?, ?)",
+                (node_id, now, now + ttl),
+            )
+            conn.execute("UPDATE nodes SET expires_at = ? WHERE node_id = ?", (now + ttl, node_id))
+            return [row[0] for row in conn.execute("SELECT node_id FROM nodes ORDER BY joined_at, node_id")]
+
+        return self._execute(run)
+
+    def leave(self, node_id: str) -> None:
+        self._execute(lambda conn: conn.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,)))
+
+    def claim(self, node_id: str, shard_id: int, ttl: float) -> bool:
+        def run(conn):
+            now = time.time()
+            if conn.execute(_CLAIM_INSERT, (shard_id, node_id, now + ttl)).rowcount:
+                return True
+            return conn.execute(_CLAIM_UPDATE, (node_id, now + ttl, shard_id, node_id, now)).rowcount > 0
+
+        return self._execute(run)
+
+    def renew(self, node_id: str, shard_ids: Iterable[int], ttl: float) -> List[int]:
+        shard_ids = list(shard_ids)
+
+        def run(conn):
+            now = time.time()
+            renewed = []
+            for shard_id in shard_ids:
+                cursor = conn.execute(
+                    "UPDATE leases SET expires_at = ? WHERE shard_id = ? AND owner = ?",
+                    (now + ttl, shard_id, node_id),
+                )
+                if cursor.rowcount:
+                    renewed.append(shard_id)
+            return renewed
+
+        return self._execute(run) if shard_ids else []
+
+    def release(self, node_id: str, shard_id: int) -> None:
+        self._execute(
+            lambda conn: conn.execute("DELETE FROM leases WHERE shard_id = ? AND owner = ?", (shard_id, node_id))
+        )
+
+    def leases(self) -> Dict[int, Dict[str, Any]]:
+        rows = self._execute(lambda conn: conn.execute("SELECT shard_id, owner, expires_at FROM leases").fetchall())
+        return {shard_id: {"owner": owner, "expires_at": expires_at} for shard_id, owner, expires_at in rows}
+
+    # SessionStore
+    @staticmethod
+    def _key(app_id: str, shard_id: int, shard_count: int) -> str:
+        return "{}:{}/{}".format(app_id, shard_id, shard_count)
+
+    def load(self, app_id: str, shard_id: int, shard_count: int) -> Optional[Dict[str, Any]]:
+        key = self._key(app_id, shard_id, shard_count)
+        with self._pending_lock:
+            if key in self._pending:
+                state = self._pending[key]
+                return None if state is None else {"session_id": state[0], "last_seq": state[1]}
+        row = self._execute(
+            lambda conn: conn.execute("SELECT session_id, last_seq FROM sessions WHERE key = ?", (key,)).fetchone()
+        )
+        return None if row is None else {"session_id": row[0], "last_seq": row[1]}
+
+    def save(self, app_id: str, shard_id: int, shard_count: int, session_id: str, last_seq: int) -> None:
+        with self._pending_lock:
+            self._pending[self._key(app_id, shard_id, shard_count)] = (session_id, last_seq)
+
+    def clear(self, app_id: str, shard_id: int, shard_count: int) -> None:
+        with self._pending_lock:
+            self._pending[self._key(app_id, shard_id, shard_count)] = None
+
+    def flush(self) -> None:
+        # 持有 _lock 保证多次 flush 按顺序写入
+        with self._lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            def run(conn):
+                now = time.time()
+                for key, state in pending.items():
+                    if state is None:
+                        conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+                    else:
+                        conn.execute(_SAVE_SESSION, (key, state[0], state[1], now))
+
+            try:
+                self._execute(run)
+            except Exception:
+                # 写入失败时放回，之后保存的状态更新，不覆盖
+                with self._pending_lock:
+                    for key, state in pending.items():
+                        self._pending.setdefault(key, state)
+                raise
+
+
+class ClusterNode:
+    """在注册表中取得分片租约并运行这些分片，参考模块说明"""
+
+    def __init__(
+        self,
+        client: Client,
+        registry: ShardRegistry,
+        node_id: str = None,
+        lease_ttl: float = 30.0,
+        renew_interval: float = 10.0,
+        reconnect_delay: float = 1.0,
+    ):
+        """
+        Args:
+          client (Client): 运行分片的 Client，会话状态改为保存在 registry 中
+          registry (ShardRegistry): 所有节点共用的注册表
+          node_id (str): 节点 id。. Defaults to None（主机名-进程号-随机串）
+          lease_ttl (float): 节点和租约的有效时间（秒），节点故障后其他节点最晚在该时间后接管。. Defaults to 30.0
+          renew_interval (float): 续约和重新分配的间隔（秒），需要小于 lease_ttl。. Defaults to 10.0
+          reconnect_delay (float): 分片断开后重新连接前的等待时间（秒）。. Defaults to 1.0
+        """
+        if renew_interval >= lease_ttl:
+            raise ValueError("renew_interval must be less than lease_ttl")
+        self.client = client
+        self.registry = registry
+        self.node_id = node_id or "{}-{}-{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:6])
+        self.lease_ttl = lease_ttl
+        self.renew_interval = renew_interval
+        self.reconnect_delay = reconnect_delay
+        self.shard_count: Optional[int] = None
+        self.nodes: List[str] = []
+
+        client.session_store = registry
+        self._token: Optional[Token] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closing = False
+
+    @property
+    def shards(self) -> Set[int]:
+        """当前运行的分片"""
+        return set(self._tasks)
+
+    # 注册表操作在后台线程中执行，避免阻塞事件循环
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="botpy-cluster")
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    async def start(self, appid: str, secret: str) -> None:
+        """登录并持续续约、分配分片，直到调用`close`"""
+        client = self.client
+        await client._async_setup_hook()
+        token = Token(appid, secret)
+        await client._bot_login(token)
+        self._token = token.bot_token()
+        if self.shard_count is None:
+            self.shard_count = client._ws_ap["shards"]
+        if client.identify_limiter is None:
+            client.identify_limiter = IdentifyLimiter(client._ws_ap["session_start_limit"]["max_concurrency"])
+            client._connection.identify_limiter = client.identify_limiter
+        self._wakeup = asyncio.Event()
+        _log.info("[botpy] 集群节点 %s 启动, 分片数: %s", self.node_id, self.shard_count)
+        try:
+            while not self._closing:
+                try:
+                    await self.rebalance()
+                except Exception as e:
+                    _log.warning("[botpy] 集群节点续约失败: %s", e)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.renew_interval)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            # 被取消时不释放租约，由其他节点在租约过期后接管
+            for task in self._tasks.values():
+                task.cancel()
+            self._tasks.clear()
+            raise
+
+    async def rebalance(self) -> None:
+        """续约节点和分片租约，释放不再分给自己的分片并取得新分给自己的分片"""
+        self.nodes = await self._run(self.registry.heartbeat, self.node_id, self.lease_ttl)
+        groups = split_shards(list(range(self.shard_count)), len(self.nodes))
+        index = self.nodes.index(self.node_id)
+        desired = set(groups[index]) if index < len(groups) else set()
+
+        held = set(await self._run(self.registry.renew, self.node_id, list(self._tasks), self.lease_ttl))
+        for shard_id in set(self._tasks) - held:
+            _log.warning("[botpy] 分片 %s 的租约已失效, 停止运行", shard_id)
+            await self._stop_shard(shard_id, release=False)
+        for shard_id in held - desired:
+            _log.info("[botpy] 分片 %s 分配给其他节点, 释放租约", shard_id)
+            await self._stop_shard(shard_id, release=True)
+        for shard_id in sorted(desired - held):
+            if await self._run(self.registry.claim, self.node_id, shard_id, self.lease_ttl):
+                self._start_shard(shard_id)
+
+    def _start_shard(self, shard_id: int) -> None:
+        _log.info("[botpy] 节点 %s 取得分片 %s", self.node_id, shard_id)
+        session = {
+            "session_id": "",
+            "last_seq": 0,
+            "intent": self.client.intents,
+            "token": self._token,
+            "url": self.client._ws_ap["url"],
+            "shards": {"shard_id": shard_id, "shard_count": self.shard_count},
+        }
+        self._tasks[shard_id] = asyncio.ensure_future(self._run_shard(session))
+
+    async def _run_shard(self, session) -> None:
+        connection = self.client._connection
+        while True:
+            await self.client.bot_connect(session)
+            # 断开后 BotWebSocket 会将会话放回 ConnectionSession，分片的重连由节点负责
+            connection.remove(session)
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _stop_shard(self, shard_id: int, release: bool) -> None:
+        task = self._tasks.pop(shard_id)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # 先保存最后处理的 seq 再释放，接管的节点从这里 resume
+        await self._run(self.registry.flush)
+        if release:
+            await self._run(self.registry.release, self.node_id, shard_id)
+
+    async def close(self) -> None:
+        """释放所有分片并退出集群"""
+        self._closing = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        for shard_id in list(self._tasks):
+            await self._stop_shard(shard_id, release=True)
+        await self._run(self.registry.leave, self.node_id)
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        await self.client.close()
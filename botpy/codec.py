@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码
+
+默认按 orjson、ujson、json 的顺序选择已安装的实现，可以通过`set_backend`指定。
+gateway 的消息帧、http 的请求和返回数据都通过这里编解码。
+"""
+import json
+from typing import Any, Callable, Dict, Union
+
+# 优先使用的实现顺序
+BACKENDS = ("orjson", "ujson", "json")
+
+
+def _json_backend() -> Dict[str, Callable]:
+    return {"loads": json.loads, "dumps": lambda obj: json.dumps(obj, ensure_ascii=False)}
+
+
+def _orjson_backend() -> Dict[str, Callable]:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # orjson 不支持的类型交给标准库处理
+            return json.dumps(obj, ensure_ascii=False)
+
+    return {"loads": orjson.loads, "dumps": dumps}
+
+
+def _ujson_backend() -> Dict[str, Callable]:
+    import ujson
+
+    def loads(data: Union[str, bytes]) -> Any:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode("utf-8")
+        return ujson.loads(data)
+
+    def dumps(obj: Any) -> str:
+        try:
+            return ujson.dumps(obj, ensure_ascii=False)
+        except (TypeError, OverflowError):
+            return json.dumps(obj, ensure_ascii=False)
+
+    return {"loads": loads, "dumps": dumps}
+
+
+_FACTORIES = {"orjson": _orjson_backend, "ujson": _ujson_backend, "json": _json_backend}
+
+backend: str = "json"
+_loads: Callable[[Union[str, bytes]], Any] = json.loads
+_dumps: Callable[[Any], str] = _json_backend()["dumps"]
+
+
+def set_backend(name: str = None) -> str:
+    """
+    设置 JSON 实现
+
+    Args:
+      name (str): orjson / ujson / json，None 表示自动选择已安装的实现
+
+    Returns:
+      实际使用的实现名称
+    """
+    global backend, _loads, _dumps
+    for candidate in BACKENDS if name is None else (name,):
+        try:
+            funcs = _FACTORIES[candidate]()
+        except ImportError:
+            if name is not None:
+                raise
+            continue
+        backend, _loads, _dumps = candidate, funcs["loads"], funcs["dumps"]
+        return backend
+    return backend
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """解码 JSON，支持直接传入 bytes"""
+    return _loads(data)
+
+
+def dumps(obj: Any) -> str:
+    return _dumps(obj)
+
+
+set_backend()
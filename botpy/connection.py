@@ -1,5 +1,6 @@
 import asyncio
 import inspect
+import time
 from typing import List, Callable, Dict, Any, Optional
 
 from .channel import Channel
@@ -14,11 +15,18 @@ from .forum import Thread, OpenThread
 
 from . import logging
 from .api import BotAPI
+from .metrics import GatewayMetrics
 from .robot import Robot
+from .session_store import SessionStore
 from .types import session
 
 _log = logging.get_logger()
 
+# 事件队列满时暂停读取 websocket，直到队列有空位
+BACKPRESSURE_PAUSE = "pause"
+# 事件队列满时丢弃最早的事件
+BACKPRESSURE_SHED = "shed"
+
 
 class ConnectionSession:
     """Client的Websocket连接会话
@@ -34,8 +42,29 @@ class ConnectionSession:
         dispatch: Callable,
         loop=None,
         api: BotAPI = None,
+        metrics: GatewayMetrics = None,
+        event_queue_size: int = 1000,
+        backpressure: str = BACKPRESSURE_PAUSE,
+        session_store: SessionStore = None,
+        identify_limiter=None,
+        session_registry=None,
     ):
+        if backpressure not in (BACKPRESSURE_PAUSE, BACKPRESSURE_SHED):
+            raise ValueError("backpressure must be %r or %r" % (BACKPRESSURE_PAUSE, BACKPRESSURE_SHED))
         self.dispatch = dispatch
+        self.metrics = GatewayMetrics() if metrics is None else metrics
+        # 每个分片接收到的事件先进入有界队列，再由单独的 task 解析和分发
+        self.event_queue_size = event_queue_size
+        self.backpressure = backpressure
+        # 按分片保存 session_id 和 last_seq，重启后用于 resume
+        self.session_store = session_store
+        self._flushing: Optional[asyncio.Future] = None
+        self._flush_again = False
+        self._flushed_at = 0.0
+        # 多进程运行分片时所有进程共用的鉴权限频（ShardManager 的 IdentifyLimiter），None 时只在进程内限频
+        self.identify_limiter = identify_limiter
+        # websocket 连接使用的 SessionRegistry（botpy.http.SessionRegistry），None 时每次连接单独创建 ClientSession
+        self.session_registry = session_registry
         self.state = ConnectionState(dispatch, api)
         self.parser: Dict[str, Callable[[dict], None]] = self.state.parsers
 
@@ -57,7 +86,7 @@ class ConnectionSession:
         while len(session_list) > 0:
             _log.debug("[botpy] 会话列表循环运行")
             time_interval = session_interval * (index + 1)
-            _log.info("[botpy] 最大并发连接数: %s, 启动会话数: %s" % (self._max_async, len(session_list)))
+            _log.info("[botpy] 最大并发连接数: %s, 启动会话数: %s", self._max_async, len(session_list))
             for i in range(self._max_async):
                 if len(session_list) == 0:
                     break
@@ -71,9 +100,39 @@ class ConnectionSession:
         # 后台有频率限制，根据间隔时间发起链接请求
         await asyncio.sleep(time_interval)
 
+    def flush_session_store(self, force: bool = False) -> None:
+        """
+        在线程池中调用 session_store.flush，同一时刻只有一次写入
+
+        Args:
+          force (bool): 是否忽略 flush_interval 立即写入，正在写入时在完成后再写一次。. Defaults to False
+        """
+        store = self.session_store
+        if store is None:
+            return
+        if self._flushing is not None:
+            self._flush_again = self._flush_again or force
+            return
+        if not force and time.monotonic() - self._flushed_at < store.flush_interval:
+            return
+        self._flushing = self.loop.run_in_executor(None, store.flush)
+        self._flushing.add_done_callback(self._on_flushed)
+
+    def _on_flushed(self, future: asyncio.Future) -> None:
+        self._flushing = None
+        self._flushed_at = time.monotonic()
+        if not future.cancelled() and future.exception() is not None:
+            _log.warning("[botpy] 保存会话状态失败: %s", future.exception())
+        if self._flush_again:
+            self._flush_again = False
+            self.flush_session_store(force=True)
+
     def add(self, _session: session.Session):
         self._session_list.append(_session)
 
+    def remove(self, _session: session.Session):
+        self._session_list = [s for s in self._session_list if s is not _session]
+
 
 class ConnectionState:
     """Client的Websocket状态处理"""
@@ -103,22 +162,33 @@ class ConnectionState:
 
     def parse_guild_update(self, payload):
         _guild = Guild(self.api, payload.get('id', None), payload.get('d', {}))
+        if self.api is not None:
+            self.api.cache.invalidate_guild(_guild.id)
         self._dispatch("guild_update", _guild)
 
     def parse_guild_delete(self, payload):
         _guild = Guild(self.api, payload.get('id', None), payload.get('d', {}))
+        if self.api is not None:
+            self.api.cache.invalidate_guild(_guild.id)
+            self.api.cache.invalidate_channels(_guild.id)
         self._dispatch("guild_delete", _guild)
 
     def parse_channel_create(self, payload):
         _channel = Channel(self.api, payload.get('id', None), payload.get('d', {}))
+        if self.api is not None:
+            self.api.cache.invalidate_channels(_channel.guild_id)
         self._dispatch("channel_create", _channel)
 
     def parse_channel_update(self, payload):
         _channel = Channel(self.api, payload.get('id', None), payload.get('d', {}))
+        if self.api is not None:
+            self.api.cache.invalidate_channel(_channel.id, _channel.guild_id)
         self._dispatch("channel_update", _channel)
 
     def parse_channel_delete(self, payload):
         _channel = Channel(self.api, payload.get('id', None), payload.get('d', {}))
+        if self.api is not None:
+            self.api.cache.invalidate_channel(_channel.id, _channel.guild_id)
         self._dispatch("channel_delete", _channel)
 
     # botpy.flags.Intents.guild_members
@@ -128,10 +198,14 @@ class ConnectionState:
 
     def parse_guild_member_update(self, payload):
         _member = Member(self.api, payload.get('id', None), payload.get('d', {}))
+        if self.api is not None:
+            self.api.cache.invalidate_member(_member.guild_id, _member.user.id)
         self._dispatch("guild_member_update", _member)
 
     def parse_guild_member_remove(self, payload):
         _member = Member(self.api, payload.get('id', None), payload.get('d', {}))
+        if self.api is not None:
+            self.api.cache.invalidate_member(_member.guild_id, _member.user.id)
         self._dispatch("guild_member_remove", _member)
 
     # botpy.flags.Intents.guild_messages
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+请求的截止时间
+
+通过`use_deadline`在上下文中设置截止时间后，代码块内（包括其中创建的 task）通过 BotAPI 发出的请求，
+排队、重试都不会超过截止时间，无法在截止时间前完成时抛出`DeadlineExceededError`。
+
+Client 处理事件时会根据事件的时间戳设置被动回复的截止时间（消息发出后`PASSIVE_REPLY_WINDOW`秒），
+只作用于携带 msg_id / event_id 的被动回复，超过后回复已经无效，不再排队或重试。
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional
+
+from . import logging
+
+_log = logging.get_logger()
+
+# 被动回复的有效时间（秒）
+PASSIVE_REPLY_WINDOW = 300
+
+_deadline: ContextVar[Optional[float]] = ContextVar("botpy_deadline", default=None)
+_reply_deadline: ContextVar[Optional[float]] = ContextVar("botpy_reply_deadline", default=None)
+
+
+def earliest(*deadlines: Optional[float]) -> Optional[float]:
+    """返回最早的截止时间，均为 None 时返回 None"""
+    result = None
+    for deadline in deadlines:
+        if deadline is not None and (result is None or deadline < result):
+            result = deadline
+    return result
+
+
+@contextmanager
+def use_deadline(timeout: float = None, deadline: float = None) -> Iterator[Optional[float]]:
+    """
+    `with use_deadline(timeout=10):` 代码块内发出的请求需要在截止时间前完成
+
+    外层已经设置了更早的截止时间时以外层为准。
+
+    Args:
+      timeout (float): 从现在开始的时间预算（秒）
+      deadline (float): 截止时间，以`time.monotonic()`计
+    """
+    if timeout is not None:
+        deadline = earliest(deadline, time.monotonic() + timeout)
+    value = earliest(deadline, _deadline.get())
+    token = _deadline.set(value)
+    try:
+        yield value
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def use_reply_deadline(deadline: Optional[float]) -> Iterator[None]:
+    """设置被动回复的截止时间，只作用于携带 msg_id / event_id 的请求"""
+    token = _reply_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _reply_deadline.reset(token)
+
+
+def current(passive: bool = False) -> Optional[float]:
+    """当前上下文的截止时间，passive 为 True 时同时考虑被动回复的截止时间"""
+    if passive:
+        return earliest(_deadline.get(), _reply_deadline.get())
+    return _deadline.get()
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """距离截止时间的剩余秒数，没有截止时间时返回 None"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def from_timestamp(timestamp: Any, window: float = PASSIVE_REPLY_WINDOW) -> Optional[float]:
+    """
+    根据事件的时间戳计算被动回复的截止时间
+
+    Args:
+      timestamp: ISO 8601 格式的时间（如 2023-11-06T13:37:18+08:00）或 unix 时间戳（秒）
+      window (float): 被动回复的有效时间（秒）。. Defaults to PASSIVE_REPLY_WINDOW
+
+    Returns:
+      以`time.monotonic()`计的截止时间，无法解析或事件已超过有效时间（通常是本地时钟偏快）时返回 None
+    """
+    if timestamp is None or timestamp == "" or window is None:
+        return None
+    try:
+        if isinstance(timestamp, (int, float)) or timestamp.isdigit():
+            sent = float(timestamp)
+        else:
+            value = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            sent = value.timestamp()
+    except (AttributeError, TypeError, ValueError):
+        return None
+    # 本地时钟比服务端慢时按刚收到处理
+    age = max(0.0, time.time() - sent)
+    if age >= window:
+        # 无法区分过期事件和本地时钟偏快，不设置截止时间，由服务端判断回复是否有效
+        _log.warning("[botpy] 事件时间戳 %s 距今 %.0f 秒，超过被动回复有效时间，请检查本地时钟", timestamp, age)
+        return None
+    return time.monotonic() + window - age
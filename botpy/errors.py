@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import asyncio
 
 
 class AuthenticationFailedError(RuntimeError):
@@ -49,6 +50,16 @@ class ForbiddenError(RuntimeError):
         return self.msgs
 
 
+class DeadlineExceededError(asyncio.TimeoutError):
+    """请求无法在截止时间前完成，不再排队或重试"""
+
+    def __init__(self, msg):
+        self.msgs = msg
+
+    def __str__(self):
+        return self.msgs
+
+
 HttpErrorDict = {
     401: AuthenticationFailedError,
     404: NotFoundError,
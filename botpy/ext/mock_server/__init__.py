@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟的 QQ 机器人 OpenAPI 和 websocket gateway
+
+用于在没有网络和测试账号的情况下运行测试和基准测试，数据保存在内存中。
+启动后默认会将`Route`和`Token`的请求地址指向本地服务，退出时恢复。
+
+使用示例:
+```
+async with MockServer(app_id="1000", secret="secret") as server:
+    client = MyClient(intents=botpy.Intents.default())
+    asyncio.ensure_future(client.start(appid="1000", secret="secret"))
+    await server.wait_ready()
+    await server.dispatch("AT_MESSAGE_CREATE", server.message_data("1", "hello"))
+```
+"""
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+from botpy.http import Route
+from botpy.robot import Token
+
+# 与 BotWebSocket 一致的 opcode
+OP_DISPATCH = 0
+OP_HEARTBEAT = 1
+OP_IDENTIFY = 2
+OP_RESUME = 6
+OP_RECONNECT = 7
+OP_INVALID_SESSION = 9
+OP_HELLO = 10
+OP_HEARTBEAT_ACK = 11
+
+TOKEN_PATH = "/app/getAppAccessToken"
+GATEWAY_PATH = "/websocket"
+
+# 断线后可以 resume 的事件数量
+REPLAY_BUFFER_SIZE = 1000
+
+# 开放平台的时间戳为北京时间
+_CST = timezone(timedelta(hours=8))
+
+
+def _timestamp() -> str:
+    return datetime.now(_CST).isoformat(timespec="seconds")
+
+
+async def _read_body(request: web.Request) -> Optional[Dict[str, Any]]:
+    """解析请求数据，aiohttp 会缓存请求内容，可以重复调用"""
+    if request.content_type == "multipart/form-data":
+        form = await request.post()
+        body = {}
+        for k, v in form.items():
+            if hasattr(v, "file"):
+                v.file.seek(0)
+                v = v.file.read()
+            body[k] = v
+        return body
+    if request.content_type == "application/json" and request.body_exists:
+        return await request.json()
+    return None
+
+
+async def _fields(request: web.Request) -> Dict[str, Any]:
+    """请求数据中不为 None 的字段"""
+    return {k: v for k, v in (await _read_body(request) or {}).items() if v is not None}
+
+
+def _error(status: int, code: int, message: str) -> web.Response:
+    return web.json_response({"code": code, "message": message}, status=status)
+
+
+class GatewaySession:
+    """gateway 上的一个会话，断线后可以通过 resume 继续接收事件"""
+
+    def __init__(self, session_id: str, shard: Tuple[int, int], intents: int):
+        self.session_id = session_id
+        self.shard = shard
+        self.intents = intents
+        self.seq = 0
+        self.identified_at = time.time()
+        self.resumed = 0
+        self.heartbeats = 0
+        self.ws: Optional[web.WebSocketResponse] = None
+        self.buffer: Deque[Dict[str, Any]] = deque(maxlen=REPLAY_BUFFER_SIZE)
+
+    @property
+    def connected(self) -> bool:
+        return self.ws is not None and not self.ws.closed
+
+    async def send(self, event: str, data: Any) -> Dict[str, Any]:
+        self.seq += 1
+        frame = {"op": OP_DISPATCH, "s": self.seq, "t": event, "id": "{}:{}".format(event, uuid.uuid4()), "d": data}
+        self.buffer.append(frame)
+        if self.connected:
+            await self.ws.send_str(json.dumps(frame, ensure_ascii=False))
+        return frame
+
+
+class MockServer:
+    """本地模拟服务
+
+    HTTP 接口覆盖鉴权、gateway、用户、频道、子频道、成员、身份组和消息相关的接口，未实现的接口返回 404。
+    收到的请求记录在`requests`，websocket 收到的鉴权和 resume 消息记录在`gateway_requests`，
+    发送的消息记录在`messages`，可以用于断言。
+    """
+
+    def __init__(
+        self,
+        app_id: str = "1000",
+        secret: str = "secret",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        shards: int = 1,
+        max_concurrency: int = 1,
+        heartbeat_interval: int = 41250,
+        token_expires_in: int = 7200,
+        patch: bool = True,
+    ):
+        """
+        Args:
+          app_id (str): 机器人 appid
+          secret (str): 机器人密钥
+          host (str): 监听地址。. Defaults to "127.0.0.1"
+          port (int): 监听端口，0 表示随机端口。. Defaults to 0
+          shards (int): /gateway/bot 返回的分片数。. Defaults to 1
+          max_concurrency (int): /gateway/bot 返回的最大并发连接数。. Defaults to 1
+          heartbeat_interval (int): Hello 消息中的心跳间隔（毫秒）。. Defaults to 41250
+          token_expires_in (int): access_token 有效期（秒）。. Defaults to 7200
+          patch (bool): 启动时是否将 Route 和 Token 的请求地址指向本地服务。. Defaults to True
+        """
+        self.app_id = app_id
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.shards = shards
+        self.max_concurrency = max_concurrency
+        self.heartbeat_interval = heartbeat_interval
+        self.token_expires_in = token_expires_in
+        self.patch = patch
+        # 每个 HTTP 请求的额外延迟（秒）
+        self.latency = 0.0
+        # 为 False 时不回复心跳 ACK，用于模拟失效的连接
+        self.ack_heartbeats = True
+
+        self.bot = {"id": "10000", "username": "mock-bot", "avatar": "", "union_openid": "", "bot": True}
+        self.tokens: Dict[str, float] = {}
+        self.requests: List[Dict[str, Any]] = []
+        self.gateway_requests: List[Dict[str, Any]] = []
+        self.messages: List[Dict[str, Any]] = []
+        self.sessions: Dict[str, GatewaySession] = {}
+        self.guilds: Dict[str, Dict[str, Any]] = {}
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        self.members: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.roles: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+        self._ids = itertools.count(100000)
+        self._errors: List[Dict[str, Any]] = []
+        self._patched: Optional[Dict[str, Any]] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.app = self._create_app()
+
+    # 数据
+    def next_id(self) -> str:
+        return str(next(self._ids))
+
+    def add_guild(self, guild_id: str = None, name: str = "mock guild", **fields: Any) -> Dict[str, Any]:
+        guild_id = guild_id or self.next_id()
+        guild = {
+            "id": guild_id,
+            "name": name,
+            "icon": "",
+            "owner_id": self.bot["id"],
+            "owner": False,
+            "member_count": 0,
+            "max_members": 1000,
+            "description": "",
+            "joined_at": _timestamp(),
+        }
+        guild.update(fields)
+        self.guilds[guild_id] = guild
+        self.members.setdefault(guild_id, {})
+        self.roles.setdefault(guild_id, {})
+        return guild
+
+    def add_channel(self, guild_id: str, channel_id: str = None, name: str = "mock channel", **fields: Any):
+        channel_id = channel_id or self.next_id()
+        channel = {
+            "id": channel_id,
+            "guild_id": guild_id,
+            "name": name,
+            "type": 0,
+            "sub_type": 0,
+            "position": len(self.channels),
+            "owner_id": self.bot["id"],
+            "private_type": 0,
+            "speak_permission": 1,
+            "application_id": None,
+            "permissions": "0",
+        }
+        channel.update(fields)
+        self.channels[channel_id] = channel
+        return channel
+
+    def add_member(self, guild_id: str, user_id: str = None, username: str = None, **fields: Any):
+        user_id = user_id or self.next_id()
+        member = {
+            "user": {"id": user_id, "username": username or "user-" + user_id, "avatar": "", "bot": False},
+            "nick": "",
+            "roles": ["1"],
+            "joined_at": _timestamp(),
+        }
+        member.update(fields)
+        self.members.setdefault(guild_id, {})[user_id] = member
+        if guild_id in self.guilds:
+            self.guilds[guild_id]["member_count"] = len(self.members[guild_id])
+        return member
+
+    def message_data(self, channel_id: str, content: str, guild_id: str = None, author_id: str = None) -> dict:
+        """构造 AT_MESSAGE_CREATE / MESSAGE_CREATE 事件的数据"""
+        author_id = author_id or "20000"
+        return {
+            "id": self.next_id(),
+            "channel_id": channel_id,
+            "guild_id": guild_id or self.channels.get(channel_id, {}).get("guild_id", ""),
+            "content": content,
+            "timestamp": _timestamp(),
+            "author": {"id": author_id, "username": "user-" + author_id, "avatar": "", "bot": False},
+            "member": {"nick": "", "roles": ["1"], "joined_at": _timestamp()},
+            "mentions": [{"id": self.bot["id"], "username": self.bot["username"], "bot": True}],
+            "seq": 1,
+            "seq_in_channel": "1",
+        }
+
+    def group_message_data(self, group_openid: str, content: str, member_openid: str = None) -> dict:
+        """构造 GROUP_AT_MESSAGE_CREATE 事件的数据"""
+        return {
+            "id": self.next_id(),
+            "group_openid": group_openid,
+            "content": content,
+            "timestamp": _timestamp(),
+            "author": {"member_openid": member_openid or "member-openid"},
+        }
+
+    def inject_error(self, method: str, path: str, status: int = 500, code: int = None, times: int = 1) -> None:
+        """
+        让接下来匹配的请求返回错误
+
+        Args:
+          method (str): 请求方式
+          path (str): Route 的 path 模板，如 "/channels/{channel_id}/messages"
+          status (int): 返回的 HTTP 状态码。. Defaults to 500
+          code (int): 返回的错误码，默认与 status 相同
+          times (int): 返回错误的次数。. Defaults to 1
+        """
+        self._errors.append(
+            {"method": method, "path": path, "status": status, "code": status if code is None else code, "times": times}
+        )
+
+    # 生命周期
+    @property
+    def address(self) -> str:
+        return "{}:{}".format(self.host, self.port)
+
+    @property
+    def url(self) -> str:
+        return "http://" + self.address
+
+    @property
+    def gateway_url(self) -> str:
+        return "ws://{}{}".format(self.address, GATEWAY_PATH)
+
+    async def start(self) -> "MockServer":
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        if self.patch:
+            self._patched = {
+                "scheme": Route.SCHEME,
+                "domain": Route.DOMAIN,
+                "sandbox_domain": Route.SANDBOX_DOMAIN,
+                "token_url": Token.TOKEN_URL,
+            }
+            Route.SCHEME = "http"
+            Route.DOMAIN = Route.SANDBOX_DOMAIN = self.address
+            Token.TOKEN_URL = self.url + TOKEN_PATH
+        return self
+
+    async def stop(self) -> None:
+        if self._patched is not None:
+            Route.SCHEME = self._patched["scheme"]
+            Route.DOMAIN = self._patched["domain"]
+            Route.SANDBOX_DOMAIN = self._patched["sandbox_domain"]
+            Token.TOKEN_URL = self._patched["token_url"]
+            self._patched = None
+        for session in self.sessions.values():
+            if session.connected:
+                await session.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    # gateway
+    @property
+    def connected_sessions(self) -> List[GatewaySession]:
+        return [session for session in self.sessions.values() if session.connected]
+
+    async def wait_ready(self, count: int = 1, timeout: float = 5) -> List[GatewaySession]:
+        """等待至少 count 个会话完成鉴权并保持连接"""
+        deadline = time.monotonic() + timeout
+        while len(self.connected_sessions) < count:
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError("wait_ready timeout")
+            await asyncio.sleep(0.01)
+        return self.connected_sessions
+
+    async def wait_messages(self, count: int = 1, timeout: float = 5) -> List[Dict[str, Any]]:
+        """等待机器人至少发送 count 条消息"""
+        deadline = time.monotonic() + timeout
+        while len(self.messages) < count:
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError("wait_messages timeout")
+            await asyncio.sleep(0.01)
+        return self.messages
+
+    async def dispatch(self, event: str, data: Any, shard_id: int = None) -> List[Dict[str, Any]]:
+        """
+        向已连接的会话推送事件
+
+        Args:
+          event (str): 事件类型，如 "AT_MESSAGE_CREATE"
+          data: 事件数据
+          shard_id (int): 只推送给指定分片，默认推送给所有会话
+
+        Returns:
+          发送的消息帧列表
+        """
+        frames = []
+        for session in self.connected_sessions:
+            if shard_id is None or session.shard[0] == shard_id:
+                frames.append(await session.send(event, data))
+        return frames
+
+    async def disconnect(self, shard_id: int = None, reconnect: bool = True, code: int = 4009) -> None:
+        """
+        断开会话的连接
+
+        Args:
+          shard_id (int): 只断开指定分片，默认断开所有会话
+          reconnect (bool): 是否先下发 Reconnect，客户端收到后可以 resume。. Defaults to True
+          code (int): websocket 关闭码。. Defaults to 4009
+        """
+        for session in self.connected_sessions:
+            if shard_id is None or session.shard[0] == shard_id:
+                ws = session.ws
+                await ws.send_str(json.dumps({"op": OP_RECONNECT if reconnect else OP_INVALID_SESSION, "d": False}))
+                await ws.close(code=code)
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_str(json.dumps({"op": OP_HELLO, "d": {"heartbeat_interval": self.heartbeat_interval}}))
+        session: Optional[GatewaySession] = None
+        try:
+            async for msg in ws:
+                if msg.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                    continue
+                payload = json.loads(msg.data)
+                op, data = payload.get("op"), payload.get("d")
+                if op in (OP_IDENTIFY, OP_RESUME):
+                    self.gateway_requests.append(payload)
+                if op == OP_HEARTBEAT:
+                    if session is not None:
+                        session.heartbeats += 1
+                    if self.ack_heartbeats:
+                        await ws.send_str(json.dumps({"op": OP_HEARTBEAT_ACK}))
+                elif op == OP_IDENTIFY:
+                    if not self._check_token(data.get("token")):
+                        await ws.close(code=4004, message=b"invalid token")
+                        break
+                    shard = tuple(data.get("shard") or (0, 1))
+                    session = GatewaySession(uuid.uuid4().hex, shard, data.get("intents", 0))
+                    session.ws = ws
+                    self.sessions[session.session_id] = session
+                    ready = {"version": 1, "session_id": session.session_id, "user": self.bot, "shard": list(shard)}
+                    await session.send("READY", ready)
+                elif op == OP_RESUME:
+                    session = self.sessions.get(data.get("session_id"))
+                    if session is None or not self._check_token(data.get("token")):
+                        await ws.send_str(json.dumps({"op": OP_INVALID_SESSION, "d": False}))
+                        await ws.close(code=4009)
+                        break
+                    session.ws = ws
+                    session.resumed += 1
+                    for frame in list(session.buffer):
+                        if frame["s"] > (data.get("seq") or 0):
+                            await ws.send_str(json.dumps(frame, ensure_ascii=False))
+                    await ws.send_str(json.dumps({"op": OP_DISPATCH, "s": session.seq, "t": "RESUMED", "d": ""}))
+        finally:
+            if session is not None and session.ws is ws:
+                session.ws = None
+        return ws
+
+    # http
+    def _check_token(self, authorization: Optional[str]) -> bool:
+        if not authorization:
+            return False
+        token = authorization.split(" ", 1)[-1]
+        expires_at = self.tokens.get(token)
+        return expires_at is not None and expires_at > time.time()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        if request.path == GATEWAY_PATH:
+            return await handler(request)
+        body = await _read_body(request)
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else request.path
+        self.requests.append({"method": request.method, "path": route, "url": request.path_qs, "json": body})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.path != TOKEN_PATH and not self._check_token(request.headers.get("Authorization")):
+            return _error(401, 11244, "token not exist or expire")
+        for error in self._errors:
+            if error["method"] == request.method and error["path"] == route and error["times"] > 0:
+                error["times"] -= 1
+                return _error(error["status"], error["code"], "injected error")
+        try:
+            return await handler(request)
+        except (KeyError, web.HTTPNotFound):
+            return _error(404, 404, "not found")
+
+    def _create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware], client_max_size=1024**3)
+        routes = [
+            ("POST", TOKEN_PATH, self._token),
+            ("GET", GATEWAY_PATH, self._gateway),
+            ("GET", "/gateway", self._get_gateway),
+            ("GET", "/gateway/bot", self._get_gateway_bot),
+            ("GET", "/users/@me", self._get_me),
+            ("GET", "/users/@me/guilds", self._get_me_guilds),
+            ("GET", "/guilds/{guild_id}", self._get_guild),
+            ("GET", "/guilds/{guild_id}/channels", self._get_channels),
+            ("POST", "/guilds/{guild_id}/channels", self._create_channel),
+            ("GET", "/channels/{channel_id}", self._get_channel),
+            ("PATCH", "/channels/{channel_id}", self._update_channel),
+            ("DELETE", "/channels/{channel_id}", self._delete_channel),
+            ("GET", "/guilds/{guild_id}/members", self._get_members),
+            ("GET", "/guilds/{guild_id}/members/{user_id}", self._get_member),
+            ("DELETE", "/guilds/{guild_id}/members/{user_id}", self._delete_member),
+            ("GET", "/guilds/{guild_id}/roles", self._get_roles),
+            ("POST", "/guilds/{guild_id}/roles", self._create_role),
+            ("PATCH", "/guilds/{guild_id}/roles/{role_id}", self._update_role),
+            ("DELETE", "/guilds/{guild_id}/roles/{role_id}", self._delete_role),
+            ("GET", "/guilds/{guild_id}/roles/{role_id}/members", self._get_role_members),
+            ("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self._add_member_role),
+            ("DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self._remove_member_role),
+            ("POST", "/channels/{channel_id}/messages", self._post_message),
+            ("GET", "/channels/{channel_id}/messages/{message_id}", self._get_message),
+            ("DELETE", "/channels/{channel_id}/messages/{message_id}", self._no_content),
+            ("PATCH", "/channels/{channel_id}/messages/{patch_msg_id}", self._post_message),
+            ("POST", "/users/@me/dms", self._create_dms),
+            ("POST", "/dms/{guild_id}/messages", self._post_message),
+            ("POST", "/v2/groups/{group_openid}/messages", self._post_message),
+            ("POST", "/v2/users/{openid}/messages", self._post_message),
+            ("POST", "/v2/groups/{group_openid}/files", self._post_file),
+            ("POST", "/v2/users/{openid}/files", self._post_file),
+            ("PUT", "/interactions/{id}", self._no_content),
+        ]
+        for method, path, handler in routes:
+            app.router.add_route(method, path, handler)
+        return app
+
+    async def _token(self, request: web.Request) -> web.Response:
+        body = await _read_body(request) or {}
+        if body.get("appId") != self.app_id or body.get("clientSecret") != self.secret:
+            return _error(200, 100016, "invalid appid or secret")
+        token = uuid.uuid4().hex
+        self.tokens[token] = time.time() + self.token_expires_in
+        return web.json_response({"access_token": token, "expires_in": str(self.token_expires_in)})
+
+    async def _get_gateway(self, request: web.Request) -> web.Response:
+        return web.json_response({"url": self.gateway_url})
+
+    async def _get_gateway_bot(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "url": self.gateway_url,
+                "shards": self.shards,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 86400000,
+                    "max_concurrency": self.max_concurrency,
+                },
+            }
+        )
+
+    async def _get_me(self, request: web.Request) -> web.Response:
+        return web.json_response(self.bot)
+
+    async def _get_me_guilds(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get("limit", 100))
+        guilds = sorted(self.guilds.values(), key=lambda g: int(g["id"]))
+        if "before" in request.query:
+            guilds = [g for g in guilds if int(g["id"]) < int(request.query["before"])][-limit:][::-1]
+        else:
+            guilds = [g for g in guilds if int(g["id"]) > int(request.query.get("after", 0))][:limit]
+        return web.json_response(guilds)
+
+    async def _get_guild(self, request: web.Request) -> web.Response:
+        return web.json_response(self.guilds[request.match_info["guild_id"]])
+
+    async def _get_channels(self, request: web.Request) -> web.Response:
+        guild_id = request.match_info["guild_id"]
+        if guild_id not in self.guilds:
+            raise KeyError(guild_id)
+        return web.json_response([c for c in self.channels.values() if c["guild_id"] == guild_id])
+
+    async def _create_channel(self, request: web.Request) -> web.Response:
+        guild_id = request.match_info["guild_id"]
+        if guild_id not in self.guilds:
+            raise KeyError(guild_id)
+        fields = await _fields(request)
+        return web.json_response(self.add_channel(guild_id, **fields))
+
+    async def _get_channel(self, request: web.Request) -> web.Response:
+        return web.json_response(self.channels[request.match_info["channel_id"]])
+
+    async def _update_channel(self, request: web.Request) -> web.Response:
+        channel = self.channels[request.match_info["channel_id"]]
+        channel.update(await _fields(request))
+        return web.json_response(channel)
+
+    async def _delete_channel(self, request: web.Request) -> web.Response:
+        return web.json_response(self.channels.pop(request.match_info["channel_id"]))
+
+    async def _get_members(self, request: web.Request) -> web.Response:
+        members = self.members[request.match_info["guild_id"]]
+        after, limit = int(request.query.get("after", 0)), int(request.query.get("limit", 1))
+        ids = sorted(int(user_id) for user_id in members if int(user_id) > after)[:limit]
+        return web.json_response([members[str(user_id)] for user_id in ids])
+
+    async def _get_member(self, request: web.Request) -> web.Response:
+        return web.json_response(self.members[request.match_info["guild_id"]][request.match_info["user_id"]])
+
+    async def _delete_member(self, request: web.Request) -> web.Response:
+        self.members[request.match_info["guild_id"]].pop(request.match_info["user_id"])
+        return web.Response(status=204)
+
+    async def _get_roles(self, request: web.Request) -> web.Response:
+        guild_id = request.match_info["guild_id"]
+        roles = list(self.roles[guild_id].values())
+        return web.json_response({"guild_id": guild_id, "roles": roles, "role_num_limit": "32"})
+
+    async def _create_role(self, request: web.Request) -> web.Response:
+        guild_id = request.match_info["guild_id"]
+        role_id = self.next_id()
+        role = {"id": role_id, "name": "", "color": 0, "hoist": 0, "number": 0, "member_limit": 1000}
+        role.update(await _fields(request))
+        self.roles[guild_id][role_id] = role
+        return web.json_response({"role_id": role_id, "role": role})
+
+    async def _update_role(self, request: web.Request) -> web.Response:
+        guild_id, role_id = request.match_info["guild_id"], request.match_info["role_id"]
+        role = self.roles[guild_id][role_id]
+        role.update(await _fields(request))
+        return web.json_response({"guild_id": guild_id, "role_id": role_id, "role": role})
+
+    async def _delete_role(self, request: web.Request) -> web.Response:
+        self.roles[request.match_info["guild_id"]].pop(request.match_info["role_id"])
+        return web.Response(status=204)
+
+    async def _get_role_members(self, request: web.Request) -> web.Response:
+        guild_id, role_id = request.match_info["guild_id"], request.match_info["role_id"]
+        start, limit = int(request.query.get("start_index", 0)), int(request.query.get("limit", 1))
+        members = [m for _, m in sorted(self.members[guild_id].items()) if role_id in m["roles"]]
+        page = members[start : start + limit]
+        return web.json_response({"data": page, "next": str(start + len(page))})
+
+    async def _add_member_role(self, request: web.Request) -> web.Response:
+        member = self.members[request.match_info["guild_id"]][request.match_info["user_id"]]
+        if request.match_info["role_id"] not in member["roles"]:
+            member["roles"].append(request.match_info["role_id"])
+        return web.Response(status=204)
+
+    async def _remove_member_role(self, request: web.Request) -> web.Response:
+        member = self.members[request.match_info["guild_id"]][request.match_info["user_id"]]
+        if request.match_info["role_id"] in member["roles"]:
+            member["roles"].remove(request.match_info["role_id"])
+        return web.Response(status=204)
+
+    async def _post_message(self, request: web.Request) -> web.Response:
+        body = await _fields(request)
+        message = dict(request.match_info)
+        message.update(body)
+        message.update({"id": self.next_id(), "timestamp": _timestamp(), "author": self.bot})
+        if isinstance(message.get("file_image"), bytes):
+            message["file_image"] = len(message["file_image"])
+        self.messages.append(message)
+        return web.json_response(message)
+
+    async def _get_message(self, request: web.Request) -> web.Response:
+        message_id = request.match_info["message_id"]
+        for message in self.messages:
+            if message["id"] == message_id:
+                return web.json_response({"message": message})
+        raise KeyError(message_id)
+
+    async def _create_dms(self, request: web.Request) -> web.Response:
+        body = await _read_body(request) or {}
+        return web.json_response(
+            {"guild_id": self.next_id(), "channel_id": self.next_id(), "create_time": str(int(time.time()))}
+            if body.get("recipient_id")
+            else {}
+        )
+
+    async def _post_file(self, request: web.Request) -> web.Response:
+        return web.json_response({"file_uuid": uuid.uuid4().hex, "file_info": uuid.uuid4().hex, "ttl": 3600})
+
+    async def _no_content(self, request: web.Request) -> web.Response:
+        return web.Response(status=204)
@@ -1,14 +1,14 @@
 # -*- coding: utf-8 -*-
 import asyncio
-import json
+import time
 import traceback
 from typing import Optional
 
 from aiohttp import WSMessage, ClientWebSocketResponse, TCPConnector, ClientSession, WSMsgType
-from ssl import SSLContext
 
-from . import logging
-from .connection import ConnectionSession
+from . import codec, logging
+from .connection import BACKPRESSURE_SHED, ConnectionSession
+from .http import get_ssl_context
 from .types import gateway
 from .types.session import Session
 
@@ -38,6 +38,16 @@ class BotWebSocket:
     WS_HELLO = 10
     WS_HEARTBEAT_ACK = 11
 
+    # Hello 中没有下发心跳间隔时使用的间隔（秒）
+    DEFAULT_HEARTBEAT_INTERVAL = 30
+    # 连续多少次心跳未收到 ACK 时认为连接已失效，主动断开并 resume
+    MAX_MISSED_HEARTBEAT_ACKS = 2
+    # 主动断开失效连接时使用的关闭码，不在 _INVALID_RECONNECT_CODE 中，接收循环收到 CLOSED 后由 on_closed 放回会话
+    ZOMBIE_CLOSE_CODE = 4900
+    # 不超过该长度的消息在接收循环中直接解析，Hello、ACK、Reconnect、Invalid Session 不经过事件队列。
+    # 事件队列已满（backpressure="pause"）时接收循环暂停读取，这些控制消息也要等队列有空位后才会被读到
+    FAST_LANE_MAX_SIZE = 256
+
     def __init__(self, session: Session, _connection: ConnectionSession):
         self._conn: Optional[ClientWebSocketResponse] = None
         self._session = session
@@ -46,14 +56,27 @@ class BotWebSocket:
         self._can_reconnect = True
         self._INVALID_RECONNECT_CODE = [9001, 9005]
         self._AUTH_FAIL_CODE = [4004]
+        self._metrics = _connection.metrics.get(session["shards"]["shard_id"])
+        self._heartbeat_interval: float = self.DEFAULT_HEARTBEAT_INTERVAL
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # 最近一次心跳的发出时间，收到 ACK 后置为 None
+        self._heartbeat_sent_at: Optional[float] = None
+        self._queue: Optional[asyncio.Queue] = None
+        # 事件队列已满、接收循环正在等待队列空位
+        self._receive_paused = False
+
+    @property
+    def latency(self) -> Optional[float]:
+        """最近一次心跳的往返耗时（秒），还没有收到 ACK 时为 None"""
+        return self._metrics.last_latency
 
     async def on_error(self, exception: BaseException):
-        _log.error("[botpy] websocket连接: %s, 异常信息 : %s" % (self._conn, exception))
+        _log.error("[botpy] websocket连接: %s, 异常信息 : %s", self._conn, exception)
         traceback.print_exc()
         self._connection.add(self._session)
 
     async def on_closed(self, close_status_code, close_msg):
-        _log.info("[botpy] 关闭, 返回码: %s" % close_status_code + ", 返回信息: %s" % close_msg)
+        _log.info("[botpy] 关闭, 返回码: %s, 返回信息: %s", close_status_code, close_msg)
         if close_status_code in self._AUTH_FAIL_CODE:
             _log.info("[botpy] 鉴权失败，重置token...")
             self._session["token"].access_token = None
@@ -62,13 +85,16 @@ class BotWebSocket:
             _log.info("[botpy] 无法重连，创建新连接!")
             self._session["session_id"] = ""
             self._session["last_seq"] = 0
+            self._checkpoint(force=True)
         # 断连后启动一个新的链接并透传当前的session，不使用内部重连的方式，避免死循环
         self._connection.add(self._session)
 
     async def on_message(self, ws, message):
-        _log.debug("[botpy] 接收消息: %s" % message)
-        msg = json.loads(message)
+        if logging.is_trace_enabled(_log):
+            _log.debug("[botpy] 接收消息: %s", message)
+        await self._handle_message(ws, codec.loads(message))
 
+    async def _handle_message(self, ws, msg):
         if await self._is_system_event(msg, ws):
             return
 
@@ -77,16 +103,17 @@ class BotWebSocket:
         event_seq = msg["s"]
         if event_seq > 0:
             self._session["last_seq"] = event_seq
+            self._checkpoint()
 
         if event == "READY":
             # 心跳检查
-            self._connection.loop.create_task(self._send_heart(interval=30))
+            self._start_heartbeat()
             ready = await self._ready_handler(msg)
-            _log.info(f"[botpy] 机器人「{ready['user']['username']}」启动成功！")
+            _log.info("[botpy] 机器人「%s」启动成功！", ready["user"]["username"])
 
         if event == "RESUMED":
             # 心跳检查
-            self._connection.loop.create_task(self._send_heart(interval=30))
+            self._start_heartbeat()
             _log.info("[botpy] 机器人重连成功! ")
 
         if event and opcode == self.WS_DISPATCH_EVENT:
@@ -102,6 +129,8 @@ class BotWebSocket:
         self._conn = ws
         if self._conn is None:
             raise Exception("[botpy] websocket连接失败")
+        if not self._session["session_id"]:
+            await self._restore_session()
         if self._session["session_id"]:
             await self.ws_resume()
         else:
@@ -117,28 +146,97 @@ class BotWebSocket:
         if not ws_url:
             raise Exception("[botpy] 会话url为空")
 
-        # adding SSLContext-containing connector to prevent SSL certificate verify failed error
-        async with ClientSession(connector=TCPConnector(limit=10, ssl=SSLContext())) as session:
-            async with session.ws_connect(self._session["url"]) as ws_conn:
+        registry = self._connection.session_registry
+        if registry is None:
+            # adding SSLContext-containing connector to prevent SSL certificate verify failed error
+            async with ClientSession(connector=TCPConnector(limit=10, ssl=get_ssl_context())) as session:
+                await self._receive(session)
+        else:
+            # 所有分片和重连共用 Client 的连接器
+            await self._receive(registry.get("gateway"))
+
+    async def _receive(self, session: ClientSession):
+        async with session.ws_connect(self._session["url"]) as ws_conn:
+            # 接收循环只负责读取，事件的解析和分发在 _consume 中进行，避免阻塞读取和心跳
+            self._queue = asyncio.Queue(self._connection.event_queue_size)
+            consumer = self._connection.loop.create_task(self._consume(ws_conn, self._queue))
+            closed = None
+            try:
                 while True:
                     msg: WSMessage
                     msg = await ws_conn.receive()
-                    if msg.type == WSMsgType.TEXT:
-                        await self.on_message(ws_conn, msg.data)
+                    if msg.type == WSMsgType.TEXT or msg.type == WSMsgType.BINARY:
+                        await self._on_frame(ws_conn, msg.data)
                     elif msg.type == WSMsgType.ERROR:
                         await self.on_error(ws_conn.exception())
                         await ws_conn.close()
                     elif msg.type == WSMsgType.CLOSED or msg.type == WSMsgType.CLOSE:
-                        await self.on_closed(ws_conn.close_code, msg.extra)
+                        closed = (ws_conn.close_code, msg.extra)
                     if ws_conn.closed:
                         _log.info("[botpy] ws关闭, 停止接收消息!")
                         break
+            except BaseException:
+                consumer.cancel()
+                raise
+            else:
+                # 处理完已经收到的事件后再放回会话，保证 resume 时的 seq 是最后处理的事件
+                await self._queue.put(None)
+                await consumer
+            finally:
+                self._stop_heartbeat()
+            if closed is not None:
+                await self.on_closed(*closed)
+
+    async def _on_frame(self, ws, data):
+        if logging.is_trace_enabled(_log):
+            _log.debug("[botpy] 接收消息: %s", data)
+        if len(data) > self.FAST_LANE_MAX_SIZE:
+            await self._enqueue(data)
+            return
+        msg = codec.loads(data)
+        if msg.get("op") == self.WS_DISPATCH_EVENT:
+            await self._enqueue(msg)
+        else:
+            await self._is_system_event(msg, ws)
+
+    async def _enqueue(self, item):
+        queue, metrics = self._queue, self._metrics
+        if queue.full():
+            if self._connection.backpressure == BACKPRESSURE_SHED:
+                queue.get_nowait()
+                metrics.shed_events += 1
+                _log.warning("[botpy] 事件队列已满(%s), 丢弃最早的事件", queue.maxsize)
+            else:
+                metrics.backpressure_pauses += 1
+                self._receive_paused = True
+                try:
+                    await queue.put(item)
+                finally:
+                    self._receive_paused = False
+                metrics.observe_queue(queue.qsize())
+                return
+        queue.put_nowait(item)
+        metrics.observe_queue(queue.qsize())
+
+    async def _consume(self, ws, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            self._metrics.queue_depth = queue.qsize()
+            if item is None:
+                return
+            try:
+                await self._handle_message(ws, codec.loads(item) if isinstance(item, (str, bytes)) else item)
+            except Exception as e:
+                _log.error("[botpy] 事件处理异常: %s", e)
+                traceback.print_exc()
 
     async def ws_identify(self):
         """websocket鉴权"""
         if not self._session["intent"]:
             self._session["intent"] = 1
 
+        if self._connection.identify_limiter is not None:
+            await self._connection.identify_limiter.acquire()
         _log.info("[botpy] 鉴权中...")
         await self._session["token"].check_token()
         payload = {
@@ -153,7 +251,7 @@ class BotWebSocket:
             },
         }
 
-        await self.send_msg(json.dumps(payload))
+        await self.send_msg(codec.dumps(payload))
 
     async def send_msg(self, event_json):
         """
@@ -161,10 +259,11 @@ class BotWebSocket:
         :param event_json:
         """
         send_msg = event_json
-        _log.debug("[botpy] 发送消息: %s" % send_msg)
+        if logging.is_trace_enabled(_log):
+            _log.debug("[botpy] 发送消息: %s", send_msg)
         if isinstance(self._conn, ClientWebSocketResponse):
             if self._conn.closed:
-                _log.debug("[botpy] ws连接已关闭! ws对象: %s" % self._conn)
+                _log.debug("[botpy] ws连接已关闭! ws对象: %s", self._conn)
             else:
                 await self._conn.send_str(data=send_msg)
 
@@ -183,7 +282,7 @@ class BotWebSocket:
             },
         }
 
-        await self.send_msg(json.dumps(payload))
+        await self.send_msg(codec.dumps(payload))
 
     async def _ready_handler(self, message_event) -> gateway.ReadyEvent:
         data = message_event["d"]
@@ -192,8 +291,42 @@ class BotWebSocket:
         self._session["shards"]["shard_id"] = data["shard"][0]
         self._session["shards"]["shard_count"] = data["shard"][1]
         self.user = data["user"]
+        self._checkpoint(force=True)
         return data
 
+    def _store_key(self):
+        return (
+            self._session["token"].app_id,
+            self._session["shards"]["shard_id"],
+            self._session["shards"]["shard_count"],
+        )
+
+    async def _restore_session(self):
+        store = self._connection.session_store
+        if store is None:
+            return
+        state = await self._connection.loop.run_in_executor(None, store.load, *self._store_key())
+        if state:
+            _log.info("[botpy] 使用保存的会话状态重连, session_id: %s, seq: %s", state["session_id"], state["last_seq"])
+            self._session["session_id"] = state["session_id"]
+            self._session["last_seq"] = state["last_seq"]
+
+    def _checkpoint(self, force: bool = False):
+        """
+        在内存中更新会话状态，由 ConnectionSession 在线程池中写入存储
+
+        Args:
+          force (bool): session_id 变化时立即写入，seq 变化时按 flush_interval 写入。. Defaults to False
+        """
+        store = self._connection.session_store
+        if store is None:
+            return
+        if self._session["session_id"]:
+            store.save(*self._store_key(), self._session["session_id"], self._session["last_seq"])
+        else:
+            store.clear(*self._store_key())
+        self._connection.flush_session_store(force)
+
     async def _is_system_event(self, message_event, ws):
         """
         系统事件
@@ -203,9 +336,11 @@ class BotWebSocket:
         """
         event_op = message_event["op"]
         if event_op == self.WS_HELLO:
+            self._hello_handler(message_event)
             await self.on_connected(ws)
             return True
         if event_op == self.WS_HEARTBEAT_ACK:
+            self._heartbeat_ack_handler()
             return True
         if event_op == self.WS_RECONNECT:
             self._can_reconnect = True
@@ -215,12 +350,37 @@ class BotWebSocket:
             return True
         return False
 
+    def _hello_handler(self, message_event):
+        data = message_event.get("d") or {}
+        interval = data.get("heartbeat_interval")
+        # Hello 中的心跳间隔以毫秒为单位
+        self._heartbeat_interval = interval / 1000 if interval else self.DEFAULT_HEARTBEAT_INTERVAL
+        self._metrics.heartbeat_interval = self._heartbeat_interval
+
+    def _heartbeat_ack_handler(self):
+        if self._heartbeat_sent_at is None:
+            return
+        self._metrics.observe_ack(time.monotonic() - self._heartbeat_sent_at)
+        self._heartbeat_sent_at = None
+
+    def _start_heartbeat(self):
+        # READY 和 RESUMED 都会启动心跳，同一个连接上只保留一个心跳任务
+        self._stop_heartbeat()
+        self._heartbeat_sent_at = None
+        self._heartbeat_task = self._connection.loop.create_task(self._send_heart(interval=self._heartbeat_interval))
+
+    def _stop_heartbeat(self):
+        if self._heartbeat_task is not None and not self._heartbeat_task.done():
+            self._heartbeat_task.cancel()
+        self._heartbeat_task = None
+
     async def _send_heart(self, interval):
         """
-        心跳包
-        :param interval: 间隔时间
+        心跳包，连续 MAX_MISSED_HEARTBEAT_ACKS 次心跳未收到 ACK 时主动断开连接，由 on_closed 放回会话后 resume
+        :param interval: 间隔时间（秒），取自 Hello 中的 heartbeat_interval
         """
-        _log.info("[botpy] 心跳维持启动...")
+        _log.info("[botpy] 心跳维持启动, 间隔: %ss", interval)
+        missed = 0
         while True:
             payload = {
                 "op": self.WS_HEARTBEAT,
@@ -231,8 +391,23 @@ class BotWebSocket:
                 _log.debug("[botpy] 连接已关闭!")
                 return
             if self._conn.closed:
-                _log.debug("[botpy] ws连接已关闭, 心跳检测停止，ws对象: %s" % self._conn)
+                _log.debug("[botpy] ws连接已关闭, 心跳检测停止，ws对象: %s", self._conn)
                 return
 
-            await self.send_msg(json.dumps(payload))
+            # 接收循环因事件队列已满暂停读取时，ACK 还没有被读到，不计为未收到
+            if self._heartbeat_sent_at is None or self._receive_paused:
+                missed = 0
+            else:
+                missed += 1
+                self._metrics.missed_acks += 1
+                if missed >= self.MAX_MISSED_HEARTBEAT_ACKS:
+                    _log.warning("[botpy] 连续 %s 次心跳未收到回包, 断开连接后重连", missed)
+                    self._metrics.zombie_reconnects += 1
+                    await self._conn.close(code=self.ZOMBIE_CLOSE_CODE)
+                    return
+
+            self._heartbeat_sent_at = time.monotonic()
+            self._metrics.heartbeats += 1
+            await self.send_msg(codec.dumps(payload))
+            self._connection.flush_session_store(force=True)
             await asyncio.sleep(interval)
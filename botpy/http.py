@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 import asyncio
-from json.decoder import JSONDecodeError
-from ssl import SSLContext
-from typing import Any, Optional, ClassVar, Union, Dict
+import mmap
+import os
+import time
+from ssl import CERT_NONE, PROTOCOL_TLS_CLIENT, SSLContext
+from typing import Any, Awaitable, Callable, ClassVar, Dict, Optional, Union
 
 import aiohttp
 from aiohttp import ClientResponse, FormData, TCPConnector, multipart, hdrs, payload
 
-from . import logging
-from .errors import HttpErrorDict, ServerError
+from . import codec, logging
+from . import deadline as _deadline
+from .errors import DeadlineExceededError, HttpErrorDict, ServerError
+from .metrics import HttpMetrics
+from .ratelimit import RATE_LIMIT_CODES, RATE_LIMIT_STATUS, RateLimiter
+from .retry import RetryPolicy
+from .scheduler import OutboundScheduler, Priority
 from .robot import Token
 from .types import robot
 
@@ -20,10 +27,72 @@ _log = logging.get_logger()
 HTTP_OK_STATUS = [200, 202, 204]
 
 
+# 上传文件时每次读取的大小
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class _FilePayload(payload.Payload):
+    """以流的方式上传文件对象
+
+    在线程池中分块读取文件，每次发送前回到起始位置以支持重试，发送后不关闭文件。
+    """
+
+    _autoclose = True
+
+    def __init__(self, value: Any, *args: Any, **kwargs: Any):
+        super().__init__(value, *args, **kwargs)
+        try:
+            self._start = value.tell()
+        except (OSError, AttributeError):
+            self._start = None
+
+    @property
+    def size(self) -> Optional[int]:
+        try:
+            return os.fstat(self._value.fileno()).st_size - (self._start or 0)
+        except (OSError, AttributeError, ValueError):
+            return None
+
+    async def write(self, writer: Any) -> None:
+        loop = asyncio.get_event_loop()
+        if self._start is not None:
+            await loop.run_in_executor(None, self._value.seek, self._start)
+        chunk = await loop.run_in_executor(None, self._value.read, UPLOAD_CHUNK_SIZE)
+        while chunk:
+            await writer.write(chunk)
+            chunk = await loop.run_in_executor(None, self._value.read, UPLOAD_CHUNK_SIZE)
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        raise TypeError("Unable to decode.")
+
+
 class _FormData(FormData):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # sdk 打开的文件或创建的 memoryview，请求结束后关闭
+        self._opened = []
+
+    def add_stream(self, name: str, value: Any, opened: bool = False) -> None:
+        """添加文件字段，文件对象不会一次性读入内存"""
+        if opened:
+            self._opened.append(value)
+        if not hasattr(value, "read"):
+            self.add_field(name, value, filename=name)
+            return
+        filename = os.path.basename(str(getattr(value, "name", ""))) or name
+        self.add_field(name, _FilePayload(value, filename=filename), filename=filename)
+
+    def close(self) -> None:
+        for value in self._opened:
+            if isinstance(value, memoryview):
+                value.release()
+            else:
+                value.close()
+        self._opened.clear()
+
     def _gen_form_data(self) -> multipart.MultipartWriter:
         """Encode a list of fields using the multipart/form-data MIME format"""
-        if self._is_processed:
+        if getattr(self, "_is_processed", False):
             return self._writer  # rewrite this part of FormData object to enable retry of request
         for dispparams, headers, value in self._fields:
             try:
@@ -61,35 +130,84 @@ class _FormData(FormData):
         return self._writer
 
 
+def _redact_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    """隐藏请求头中的token，避免写入日志"""
+    return {k: "***" if k == "Authorization" else v for k, v in headers.items()}
+
+
 async def _handle_response(response: ClientResponse) -> Union[Dict[str, Any], str]:
     url = response.request_info.url
     try:
-        condition = response.headers["content-type"] == "application/json"
-        # note that when content-type is application/json, aiohttp will directly auto-sub encoding to be utf-8
-        data = await response.json() if condition else await response.text()
-    except (KeyError, JSONDecodeError):
+        condition = response.content_type == "application/json"
+        # decode the raw bytes directly, json bodies are always utf-8
+        data = codec.loads(await response.read()) if condition else await response.text()
+    except (KeyError, ValueError):
         data = None
     if response.status in HTTP_OK_STATUS:
-        _log.debug(f"[botpy] 请求成功, 请求连接: {url}, 返回内容: {data}, trace_id:{response.headers.get(X_TPS_TRACE_ID)}")
+        if logging.is_trace_enabled(_log):
+            _log.debug(
+                "[botpy] 请求成功, 请求连接: %s, 返回内容: %s, trace_id:%s",
+                url,
+                data,
+                response.headers.get(X_TPS_TRACE_ID),
+            )
+        elif _log.isEnabledFor(logging.DEBUG):
+            _log.debug("[botpy] 请求成功, 请求连接: %s, trace_id:%s", url, response.headers.get(X_TPS_TRACE_ID))
         return data
     else:
         _log.error(
-            f"[botpy] 接口请求异常，请求连接: {url}, "
-            f"错误代码: {response.status}, 返回内容: {data}, trace_id:{response.headers.get(X_TPS_TRACE_ID)}"
+            "[botpy] 接口请求异常，请求连接: %s, 错误代码: %s, 返回内容: %s, trace_id:%s",
+            url,
+            response.status,
+            data,
             # trace_id 用于定位接口问题
+            response.headers.get(X_TPS_TRACE_ID),
         )
-        error_dict_get = HttpErrorDict.get(response.status)
+        error_dict_get = HttpErrorDict.get(response.status) or ServerError
         # type of data should be dict or str or None, so there should be a condition to check and prevent bug
         message = data["message"] if isinstance(data, dict) else str(data)
-        if not error_dict_get:
-            raise ServerError(message) from None  # adding from None to prevent chain exception being raised
-        raise error_dict_get(msg=message) from None
+        error = error_dict_get(msg=message)
+        # 保留状态码和业务错误码，用于限频和重试判断
+        error.status = response.status
+        error.code = data.get("code") if isinstance(data, dict) else None
+        raise error from None  # adding from None to prevent chain exception being raised
+
+
+def _is_file(value: Any) -> bool:
+    """file_image 是否为需要以 multipart 上传的文件数据"""
+    return isinstance(value, (bytes, bytearray, memoryview, mmap.mmap, str, os.PathLike)) or hasattr(value, "read")
+
+
+async def _add_file(form: _FormData, name: str, value: Any) -> None:
+    if isinstance(value, (str, os.PathLike)):
+        # 在线程池中打开文件，避免慢速文件系统阻塞事件循环
+        value = await asyncio.get_event_loop().run_in_executor(None, open, value, "rb")
+        form.add_stream(name, value, opened=True)
+    elif isinstance(value, mmap.mmap):
+        # 直接引用映射的内存，不复制文件内容
+        form.add_stream(name, memoryview(value), opened=True)
+    else:
+        form.add_stream(name, value)
+
+
+async def _wait_until(aw: Awaitable, deadline: Optional[float], route: "Route") -> Any:
+    """等待 aw 完成，超过截止时间时抛出 DeadlineExceededError"""
+    if deadline is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, deadline - time.monotonic())
+    except asyncio.TimeoutError:
+        if time.monotonic() < deadline:
+            raise
+        raise DeadlineExceededError("[botpy] 请求超过截止时间, 请求连接: %s" % route.url) from None
 
 
 class Route:
     DOMAIN: ClassVar[str] = "api.sgroup.qq.com"
     SANDBOX_DOMAIN: ClassVar[str] = "sandbox.api.sgroup.qq.com"
     SCHEME: ClassVar[str] = "https"
+    # 划分限频桶的主要参数
+    MAJOR_PARAMETERS: ClassVar[tuple] = ("guild_id", "channel_id", "group_openid", "openid")
 
     def __init__(self, method: str, path: str, is_sandbox: str = False, **parameters: Any) -> None:
         self.method: str = method
@@ -110,11 +228,200 @@ class Route:
             _url = _url.format_map(self.parameters)
         return _url
 
+    @property
+    def bucket(self) -> str:
+        """限频桶的标识，由请求方式、path模板和主要参数组成"""
+        major = [str(self.parameters[k]) for k in self.MAJOR_PARAMETERS if k in self.parameters]
+        return "{} {}:{}".format(self.method, self.path, ":".join(major))
+
+
+_ssl_context: Optional[SSLContext] = None
+
+
+def get_ssl_context() -> SSLContext:
+    """进程内共享的 SSLContext，避免每次创建连接器都重新构造"""
+    global _ssl_context
+    if _ssl_context is None:
+        # 与原来的 SSLContext() 一致，不校验证书和域名
+        _ssl_context = SSLContext(PROTOCOL_TLS_CLIENT)
+        _ssl_context.check_hostname = False
+        _ssl_context.verify_mode = CERT_NONE
+    return _ssl_context
+
+
+class ConnectionStats:
+    """连接复用统计，通过 aiohttp 的 TraceConfig 收集"""
+
+    def __init__(self):
+        self.requests = 0
+        self.created = 0
+        self.reused = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        return trace_config
+
+    async def _on_request_start(self, session, ctx, params) -> None:
+        self.requests += 1
+
+    async def _on_connection_create_end(self, session, ctx, params) -> None:
+        self.created += 1
+
+    async def _on_connection_reuseconn(self, session, ctx, params) -> None:
+        self.reused += 1
+
+    @property
+    def reuse_ratio(self) -> float:
+        total = self.created + self.reused
+        return self.reused / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            # 每个新建的 https 连接都需要一次 TCP + TLS 握手；只统计 API 请求新建的连接，
+            # 共用 SessionRegistry 时获取 token 建立的连接被 API 请求复用，计入 reused
+            "handshakes": self.created,
+            "reused": self.reused,
+            "reuse_ratio": self.reuse_ratio,
+        }
+
+
+class ConnectorConfig:
+    """HTTP 连接池配置"""
+
+    def __init__(
+        self,
+        keep_alive: bool = True,
+        limit: int = 500,
+        limit_per_host: int = 100,
+        keepalive_timeout: float = 30,
+        ttl_dns_cache: Optional[int] = 300,
+    ):
+        """
+        Args:
+          keep_alive (bool): 是否复用连接（HTTP keep-alive），False 时每个请求都新建连接。. Defaults to True
+          limit (int): 连接池的最大连接数。. Defaults to 500
+          limit_per_host (int): 单个域名的最大连接数。. Defaults to 100
+          keepalive_timeout (float): 空闲连接保留的时间（秒），超时后回收。. Defaults to 30
+          ttl_dns_cache (int): DNS 解析结果的缓存时间（秒），None 表示一直缓存。. Defaults to 300
+        """
+        self.keep_alive = keep_alive
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+
+    def create_connector(self) -> TCPConnector:
+        if not self.keep_alive:
+            return TCPConnector(limit=self.limit, ssl=get_ssl_context(), force_close=True)
+        return TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ssl=get_ssl_context(),
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.ttl_dns_cache,
+        )
+
+
+class SessionRegistry:
+    """
+    共享的连接器和 ClientSession
+
+    API 请求、websocket 连接和获取 access_token 按名称使用各自的 ClientSession（如 "api"、"gateway"、"token"），
+    这些 ClientSession 共用同一个 TCPConnector 和 SSLContext，重连时不再重新创建连接器。
+    由创建者负责调用`close`，Client 关闭时关闭它持有的 SessionRegistry。
+    """
+
+    def __init__(self, connector_config: ConnectorConfig = None):
+        """
+        Args:
+          connector_config (ConnectorConfig): 连接池配置。. Defaults to None（ConnectorConfig 的默认配置）
+        """
+        self.connector_config = connector_config or ConnectorConfig()
+        self.connectors_created = 0
+        self._connector: Optional[TCPConnector] = None
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    @property
+    def connector(self) -> TCPConnector:
+        if self._connector is None or self._connector.closed:
+            self._connector = self.connector_config.create_connector()
+            self.connectors_created += 1
+        return self._connector
+
+    def get(self, name: str, **kwargs: Any) -> aiohttp.ClientSession:
+        """
+        返回名为 name 的 ClientSession，不存在或已关闭时创建
+
+        Args:
+          name (str): 名称，相同名称共用一个 ClientSession
+          kwargs: 创建 ClientSession 时的其他参数，如 trace_configs
+        """
+        session = self._sessions.get(name)
+        if session is None or session.closed or session.connector is not self._connector or self._connector.closed:
+            session = aiohttp.ClientSession(connector=self.connector, connector_owner=False, **kwargs)
+            self._sessions[name] = session
+        return session
+
+    @property
+    def closed(self) -> bool:
+        return self._connector is None or self._connector.closed
+
+    async def close(self) -> None:
+        """关闭所有 ClientSession 和连接器，之后调用`get`会重新创建"""
+        sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+        if self._connector is not None and not self._connector.closed:
+            await self._connector.close()
+        self._connector = None
+
+
+class RequestCoalescer:
+    """合并并发的相同请求，同一时刻相同的请求只发出一次，其余调用方共享结果
+
+    注意: 共享的返回数据是同一个对象，调用方不应直接修改。
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.collapsed = 0
+        self._inflight: Dict[Any, asyncio.Future] = {}
+
+    async def run(self, key: Any, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        self.requests += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.collapsed += 1
+        # shield 避免某个调用方被取消时影响其他等待相同请求的调用方
+        return await asyncio.shield(future)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "collapsed": self.collapsed, "inflight": self.inflight}
+
 
 class BotHttp:
     """
-    TODO 增加请求重试功能 @veehou
-    TODO 增加并发请求的锁控制 @veehou
+    请求在发出前会进入对应 Route 的限频桶排队，可以通过`ratelimiter.state()`查看各个桶的状态。
+    失败的请求按 RetryPolicy 重试，可以通过`retry_policies`按 Route 模板或请求方式单独配置。
+    连接默认复用，可以通过`connector_config`配置连接池，通过`connection_stats`查看连接复用情况。
+    传入`session_registry`时与 websocket 连接、获取 token 共用连接器，由传入方负责关闭。
+    并发的相同 GET 请求会被合并为一次请求，可以通过`coalescer.to_dict()`查看合并的数量。
+    各个 Route 的耗时、返回状态等指标可以通过`metrics.to_dict()`或`metrics.to_prometheus()`查看。
+    发送能力饱和时请求按优先级和频道公平排队，可以通过`scheduler.to_dict()`查看排队情况。
     """
 
     def __init__(
@@ -123,9 +430,30 @@ class BotHttp:
         is_sandbox: bool = False,
         app_id: str = None,
         secret: str = None,
+        ratelimiter: RateLimiter = None,
+        retry_policy: RetryPolicy = None,
+        retry_policies: Dict[str, RetryPolicy] = None,
+        connector_config: ConnectorConfig = None,
+        coalesce_get: bool = True,
+        metrics: HttpMetrics = None,
+        scheduler: OutboundScheduler = None,
+        session_registry: SessionRegistry = None,
     ):
         self.timeout = timeout
         self.is_sandbox = is_sandbox
+        self.ratelimiter = ratelimiter or RateLimiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        # key 为 "METHOD path模板" 或 "METHOD"
+        self.retry_policies = retry_policies or {}
+        self.connector_config = connector_config or ConnectorConfig()
+        self.connection_stats = ConnectionStats()
+        self.coalesce_get = coalesce_get
+        self.coalescer = RequestCoalescer()
+        self.metrics = metrics or HttpMetrics()
+        self.scheduler = scheduler or OutboundScheduler()
+        # 没有传入时使用自己的 SessionRegistry，在 close 时一起关闭
+        self._owns_registry = session_registry is None
+        self.session_registry = session_registry or SessionRegistry(self.connector_config)
 
         self._token: Optional[Token] = None if not app_id else Token(app_id=app_id, secret=secret)
         self._session: Optional[aiohttp.ClientSession] = None
@@ -138,67 +466,218 @@ class BotHttp:
             _loop.create_task(self._session.close())
 
     async def close(self) -> None:
-        if self._session and not self._session.closed:
+        if self._token:
+            self._token.stop_refresher()
+        if self._owns_registry:
+            await self.session_registry.close()
+        elif self._session and not self._session.closed:
             await self._session.close()
 
     async def check_session(self):
+        if self._token.session_registry is None:
+            self._token.session_registry = self.session_registry
         await self._token.check_token()
-        self._headers = {
-            "Authorization": self._token.get_string(),
-            "X-Union-Appid": self._token.app_id,
-        }
+        self._headers = self._token.get_headers()
 
-        if not self._session or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                connector=TCPConnector(limit=500, ssl=SSLContext(), force_close=True),
+        if not self._session or self._session.closed or self.session_registry.closed:
+            self._session = self.session_registry.get(
+                "api",
+                json_serialize=codec.dumps,
+                trace_configs=[self.connection_stats.trace_config(), self.metrics.trace_config()],
             )
 
-    async def request(self, route: Route, retry_time: int = 0, **kwargs: Any):
-        if retry_time > 2:
-            return
+    def get_retry_policy(self, route: Route) -> RetryPolicy:
+        """按 "METHOD path模板"、请求方式的顺序查找重试策略，未配置时使用默认策略"""
+        return (
+            self.retry_policies.get("{} {}".format(route.method, route.path))
+            or self.retry_policies.get(route.method)
+            or self.retry_policy
+        )
+
+    async def request(
+        self,
+        route: Route,
+        retry_policy: RetryPolicy = None,
+        priority: Priority = None,
+        timeout: float = None,
+        deadline: float = None,
+        **kwargs: Any,
+    ):
+        """
+        发送请求
+
+        Args:
+          route (Route): 请求的 Route
+          retry_policy (RetryPolicy): 本次请求使用的重试策略，默认按`get_retry_policy`查找
+          priority (Priority): 本次请求的优先级，默认按`scheduler.classify`推断
+          timeout (float): 本次请求每次发送的超时时间（秒），默认使用`timeout`
+          deadline (float): 本次请求（包括排队和重试）的截止时间（time.monotonic()），
+            与`use_deadline`设置的截止时间取较早的一个，被动回复还受事件的回复截止时间限制
+        """
+        priority = self.scheduler.classify(route, kwargs.get("json"), priority)
+        deadline = _deadline.earliest(deadline, _deadline.current(passive=priority == Priority.PASSIVE))
+        if (
+            self.coalesce_get
+            and route.method == "GET"
+            and retry_policy is None
+            and timeout is None
+            and kwargs.keys() <= {"params"}
+        ):
+            route.is_sandbox = self.is_sandbox
+            params = kwargs.get("params")
+            key = (route.url, tuple(sorted(params.items())) if params else None)
+            # 合并后的请求由各个调用方共享，不受发起方截止时间的影响，各调用方只按自己的截止时间等待
+            shared = self.coalescer.run(key, lambda: self._request(route, None, priority, **kwargs))
+            return await _wait_until(shared, deadline, route)
+        return await self._request(route, retry_policy, priority, timeout, deadline, **kwargs)
+
+    async def _request(
+        self,
+        route: Route,
+        retry_policy: RetryPolicy = None,
+        priority: Priority = Priority.PROACTIVE,
+        timeout: float = None,
+        deadline: float = None,
+        **kwargs: Any,
+    ):
+        policy = retry_policy or self.get_retry_policy(route)
+        idempotent = policy.is_idempotent(route.method, kwargs.get("json"))
         # some checking if it's a JSON request
         if "json" in kwargs:
             json_ = kwargs["json"]
             json__get = json_.get("file_image")
-            if json__get and isinstance(json__get, bytes):
+            if json__get and _is_file(json__get):
                 kwargs["data"] = _FormData()
                 for k, v in kwargs.pop("json").items():
                     if v:
-                        if isinstance(v, dict):
+                        if k == "file_image":
+                            await _add_file(kwargs["data"], k, v)
+                        elif isinstance(v, dict):
                             if k == "message_reference":
                                 _log.error(
-                                    f"[botpy] 接口参数传入异常, 请求连接: {route.url}, "
-                                    f"错误原因: file_image与message_reference不能同时传入，"
-                                    f"备注: sdk已按照优先级，去除message_reference参数"
+                                    "[botpy] 接口参数传入异常, 请求连接: %s, "
+                                    "错误原因: file_image与message_reference不能同时传入，"
+                                    "备注: sdk已按照优先级，去除message_reference参数",
+                                    route.url,
                                 )
                         else:
                             kwargs["data"].add_field(k, v)
 
+        form = kwargs.get("data") if isinstance(kwargs.get("data"), _FormData) else None
+        try:
+            return await self._request_with_retry(route, policy, idempotent, priority, timeout, deadline, **kwargs)
+        finally:
+            if form is not None:
+                form.close()
+
+    async def _request_with_retry(
+        self,
+        route: Route,
+        policy: RetryPolicy,
+        idempotent: bool,
+        priority: Priority,
+        timeout: Optional[float],
+        deadline: Optional[float],
+        **kwargs: Any,
+    ):
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_timeout = timeout or self.timeout
+            remaining = policy.remaining(time.monotonic() - started)
+            if remaining is not None:
+                attempt_timeout = min(attempt_timeout, remaining)
+            try:
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        raise DeadlineExceededError("[botpy] 请求超过截止时间, 请求连接: %s" % route.url)
+                    attempt_timeout = min(attempt_timeout, left)
+                return await self._request_once(route, attempt_timeout, priority, deadline, **kwargs)
+            except DeadlineExceededError:
+                self.metrics.get(route).deadline_exceeded += 1
+                raise
+            except Exception as e:
+                attempt += 1
+                delay = policy.next_delay(attempt, e, idempotent, time.monotonic() - started)
+                if (
+                    deadline is not None
+                    and (delay is not None or isinstance(e, asyncio.TimeoutError))
+                    and time.monotonic() + (delay or 0) >= deadline
+                ):
+                    # 剩余时间不足以再次发送
+                    self.metrics.get(route).deadline_exceeded += 1
+                    raise DeadlineExceededError(
+                        "[botpy] 请求超过截止时间, 请求连接: %s, 最后一次异常: %s(%s)" % (route.url, type(e).__name__, e)
+                    ) from e
+                if delay is None:
+                    if isinstance(e, asyncio.TimeoutError):
+                        _log.warning("请求超时，请求连接: %s", route.url)
+                    raise
+                _log.warning(
+                    "[botpy] 请求失败, 请求连接: %s, 异常: %s(%s), %.2fs 后第 %s 次重试",
+                    route.url,
+                    type(e).__name__,
+                    e,
+                    delay,
+                    attempt,
+                )
+                self.metrics.get(route).retries += 1
+                await asyncio.sleep(delay)
+
+    async def _request_once(
+        self, route: Route, timeout: float, priority: Priority, deadline: Optional[float] = None, **kwargs: Any
+    ):
         await self.check_session()
         route.is_sandbox = self.is_sandbox
-        _log.debug(f"[botpy] 请求头部: {self._headers}, 请求方式: {route.method}, 请求url: {route.url}")
-        _log.debug(self._session)
-        try:
-            async with self._session.request(
-                method=route.method,
-                url=route.url,
-                headers=self._headers,
-                timeout=(aiohttp.ClientTimeout(total=self.timeout)),
-                **kwargs,
-            ) as response:
-                _log.debug(response)
-                return await _handle_response(response)
-        except asyncio.TimeoutError:
-            _log.warning(f"请求超时，请求连接: {route.url}")
-        except ConnectionResetError:
-            _log.debug("session connection broken retry")
-            await self.request(route, retry_time + 1, **kwargs)
+        url = route.url
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug("[botpy] 请求方式: %s, 请求url: %s", route.method, url)
+            if logging.is_trace_enabled(_log):
+                _log.debug("[botpy] 请求头部: %s, 请求参数: %s", _redact_headers(self._headers), kwargs)
+        bucket = self.ratelimiter.get_bucket(route)
+        await bucket.acquire(deadline)
+        async with self.scheduler.slot(priority, self.scheduler.tenant(route), deadline):
+            metrics = self.metrics.get(route)
+            metrics.requests += 1
+            metrics.inflight += 1
+            started = time.monotonic()
+            try:
+                async with self._session.request(
+                    method=route.method,
+                    url=url,
+                    headers=self._headers,
+                    timeout=(aiohttp.ClientTimeout(total=timeout)),
+                    trace_request_ctx={"metrics": metrics},
+                    **kwargs,
+                ) as response:
+                    metrics.statuses[response.status] += 1
+                    bucket.update(response.status, response.headers)
+                    try:
+                        return await _handle_response(response)
+                    except RuntimeError as e:
+                        code = getattr(e, "code", None)
+                        if code is not None:
+                            metrics.codes[code] += 1
+                        if response.status != RATE_LIMIT_STATUS and code in RATE_LIMIT_CODES:
+                            bucket.on_limited()
+                        raise
+            except asyncio.TimeoutError:
+                metrics.timeouts += 1
+                raise
+            except aiohttp.ClientError as e:
+                metrics.exceptions[type(e).__name__] += 1
+                raise
+            finally:
+                metrics.inflight -= 1
+                metrics.latency.observe(time.monotonic() - started)
 
     async def login(self, token: Token) -> robot.Robot:
         """login后保存token和session"""
 
         self._token = token
         await self.check_session()
+        self._token.start_refresher()
         self._global_over = asyncio.Event()
         self._global_over.set()
 
@@ -3,11 +3,13 @@
 import os
 import sys
 import json
+import queue
+import atexit
 import yaml
 import logging
 import logging.config
-from typing import List, Dict, Union
-from logging.handlers import TimedRotatingFileHandler
+from typing import Any, List, Dict, Union
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
 LOG_COLORS_CONFIG = {
     "DEBUG": "cyan",
@@ -19,6 +21,11 @@ LOG_COLORS_CONFIG = {
 
 DEFAULT_LOGGER_NAME = "botpy"
 
+DEBUG = logging.DEBUG
+
+# 是否在debug日志中输出完整的请求头、返回内容和ws消息（可能包含token等敏感信息，且开销较大）
+TRACE_PAYLOADS = False
+
 DEFAULT_PRINT_FORMAT = "\033[1;33m[%(levelname)s]\t(%(filename)s:%(lineno)s)%(funcName)s\t\033[0m%(message)s"
 DEFAULT_FILE_FORMAT = "%(asctime)s\t[%(levelname)s]\t(%(filename)s:%(lineno)s)%(funcName)s\t%(message)s"
 logging.basicConfig(format=DEFAULT_PRINT_FORMAT)
@@ -44,6 +51,15 @@ logs: Dict[str, logging.Logger] = {}
 # 追加的handler
 _ext_handlers: List[dict] = []
 
+# 队列模式: 追加的handler在后台线程中执行，队列长度为0时直接在调用线程中执行
+_queue_size: int = 0
+# 队列已满时的处理策略: drop_new 丢弃新日志 / drop_old 丢弃最早的日志 / block 阻塞等待
+_queue_overflow: str = "drop_new"
+QUEUE_OVERFLOW_POLICIES = ("drop_new", "drop_old", "block")
+# 每个logger对应的队列handler和后台线程
+_queue_handlers: Dict[str, "BoundedQueueHandler"] = {}
+_queue_listeners: Dict[str, "QueueListener"] = {}
+
 # 解决Windows系统cmd运行日志输出不会显示颜色问题
 os.system("")
 
@@ -72,6 +88,93 @@ def get_handler(handler, name=DEFAULT_LOGGER_NAME):
     return handler
 
 
+class BoundedQueueHandler(QueueHandler):
+    """将日志放入有界队列，由后台线程写入实际的handler，避免在事件循环线程中进行文件IO"""
+
+    def __init__(self, _queue: queue.Queue, overflow: str = "drop_new"):
+        super().__init__(_queue)
+        if overflow not in QUEUE_OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of %s" % (QUEUE_OVERFLOW_POLICIES,))
+        self.overflow = overflow
+        self.enqueued = 0
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == "block":
+                self.queue.put(record)
+            elif self.overflow == "drop_old":
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self.dropped += 1
+                try:
+                    self.queue.put_nowait(record)
+                except queue.Full:
+                    self.dropped += 1
+                    return
+            else:
+                self.dropped += 1
+                return
+        self.enqueued += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+        }
+
+
+class _QueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # 队列已满时阻塞等待后台线程腾出空间，保证停止前的日志都被写入
+        self.queue.put(self._sentinel)
+
+
+def _add_ext_handlers(logger: logging.Logger, name: str, ext_handlers: List[dict]) -> None:
+    handlers = [get_handler(handler, name) for handler in ext_handlers]
+    if not _queue_size:
+        for handler in handlers:
+            logger.addHandler(handler)
+        return
+
+    if name in _queue_listeners:
+        # 已有后台线程时追加handler
+        listener = _queue_listeners[name]
+        listener.stop()
+        handlers = list(listener.handlers) + handlers
+    else:
+        _queue_handlers[name] = BoundedQueueHandler(queue.Queue(_queue_size), _queue_overflow)
+        logger.addHandler(_queue_handlers[name])
+    listener = _QueueListener(_queue_handlers[name].queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _queue_listeners[name] = listener
+
+
+def _stop_queue_listener(name: str) -> None:
+    listener = _queue_listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+    _queue_handlers.pop(name, None)
+
+
+@atexit.register
+def stop_queue_listeners() -> None:
+    """停止所有后台日志线程，并写入队列中剩余的日志"""
+    for name in list(_queue_listeners):
+        _stop_queue_listener(name)
+
+
+def get_queue_stats() -> Dict[str, Dict[str, Any]]:
+    """队列模式下各个logger的队列长度、写入数和丢弃数"""
+    return {name: handler.stats() for name, handler in _queue_handlers.items()}
+
+
 def get_logger(name=None):
     global logs
 
@@ -90,20 +193,27 @@ def get_logger(name=None):
 
     # 添加额外handler
     if _ext_handlers:
-        for handler in _ext_handlers:
-            logger.addHandler(get_handler(handler, name))
+        _add_ext_handlers(logger, name, _ext_handlers)
 
     logs[name] = logger
     return logger
 
 
+def is_trace_enabled(logger: logging.Logger) -> bool:
+    """是否需要输出完整的请求和消息内容，用于在热点路径上避免无用的格式化开销"""
+    return TRACE_PAYLOADS and logger.isEnabledFor(logging.DEBUG)
+
+
 def configure_logging(
         config: Union[str, dict] = None,
         _format: str = None,
         level: int = None,
         bot_log: Union[bool, None] = True,
         ext_handlers: Union[dict, List, bool] = None,
-        force: bool = False
+        force: bool = False,
+        trace_payloads: bool = None,
+        queue_size: int = None,
+        queue_overflow: str = None,
 ) -> None:
     """
     修改日志配置
@@ -113,8 +223,21 @@ def configure_logging(
     :param bot_log: 是否启用bot日志 True/启用 None/禁用拓展 False/禁用拓展+控制台输出
     :param ext_handlers: 额外的handler，格式参考 DEFAULT_FILE_HANDLER。Default to True(使用默认handler)
     :param force: 是否在已追加handler(_ext_handlers)不为空时继续追加(避免因多次实例化Client类导致重复添加)
+    :param trace_payloads: 是否在debug日志中输出完整的请求和消息内容，None 表示不做更改
+    :param queue_size: 大于0时启用队列模式，追加的handler在后台线程中写入，队列最多缓存queue_size条日志
+    :param queue_overflow: 队列已满时的处理策略 drop_new/drop_old/block，默认 drop_new
     """
-    global _ext_handlers
+    global _ext_handlers, TRACE_PAYLOADS, _queue_size, _queue_overflow
+
+    if queue_size is not None:
+        _queue_size = queue_size
+    if queue_overflow is not None:
+        if queue_overflow not in QUEUE_OVERFLOW_POLICIES:
+            raise ValueError("queue_overflow must be one of %s" % (QUEUE_OVERFLOW_POLICIES,))
+        _queue_overflow = queue_overflow
+
+    if trace_payloads is not None:
+        TRACE_PAYLOADS = trace_payloads
 
     if config is not None:
         if isinstance(config, dict):
@@ -149,6 +272,7 @@ def configure_logging(
             logs.pop(DEFAULT_LOGGER_NAME)
 
         logger.handlers = []
+        _stop_queue_listener(DEFAULT_LOGGER_NAME)
 
     if ext_handlers and (not _ext_handlers or force):
         if ext_handlers is True:
@@ -159,5 +283,4 @@ def configure_logging(
         _ext_handlers.extend(ext_handlers)
 
         for name, logger in logs.items():
-            for handler in ext_handlers:
-                logger.addHandler(get_handler(handler, name))
+            _add_ext_handlers(logger, name, ext_handlers)
@@ -21,7 +21,6 @@ class Message:
     )
 
     def __init__(self, api: BotAPI, event_id, data: gateway.MessagePayload):
-        # TODO 创建一些实体类的数据缓存 @veehou
         self._api = api
 
         self.author = self._User(data.get("author", {}))
@@ -258,6 +257,7 @@ class GroupMessage(BaseMessage):
             return str(self.__dict__)
 
     async def reply(self, **kwargs):
+        """回复该消息，未指定 msg_seq 时自动分配，可以并发回复多次"""
         return await self._api.post_group_message(group_openid=self.group_openid, msg_id=self.id, **kwargs)
     
 class C2CMessage(BaseMessage):
@@ -280,4 +280,5 @@ class C2CMessage(BaseMessage):
             return str(self.__dict__)
 
     async def reply(self, **kwargs):
+        """回复该消息，未指定 msg_seq 时自动分配，可以并发回复多次"""
         return await self._api.post_c2c_message(openid=self.author.user_openid, msg_id=self.id, **kwargs)
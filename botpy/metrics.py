@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 请求和 websocket 连接指标
+
+`HttpMetrics`按 Route 模板和请求方式统计耗时分布、返回状态、错误码、超时、重试、流量和进行中的请求数。
+`GatewayMetrics`按分片统计心跳的往返耗时、未收到 ACK 的心跳和因此触发的重连，以及事件队列的长度和背压。
+可以通过`to_dict()`读取，或通过`to_prometheus()`导出为 Prometheus 文本格式。
+"""
+import bisect
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+# 耗时分桶的上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """固定分桶的分布统计，分位数按桶内线性插值估算"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets: Tuple[float, ...] = tuple(sorted(set(buckets) | {math.inf}))
+        self.counts: List[int] = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        估算分位数
+
+        Args:
+          q (float): 0 ~ 1 之间的分位，例如 0.99
+
+        Returns:
+          分位数的估算值，不超出已记录数据的最小值和最大值
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = max(self.buckets[i - 1] if i else 0.0, self.min)
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.max
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """返回 (上界, 小于等于该上界的数量) 列表"""
+        result, total = [], 0
+        for upper, n in zip(self.buckets, self.counts):
+            total += n
+            result.append((upper, total))
+        return result
+
+
+class RouteMetrics:
+    """单个 Route 模板的请求指标"""
+
+    def __init__(self, method: str, path: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.method = method
+        self.path = path
+        # 每次请求（包括重试）从发出到读取完返回数据的耗时，不包括限频排队的时间
+        self.latency = Histogram(buckets)
+        self.requests = 0
+        self.statuses: Counter = Counter()
+        # 返回数据中的业务错误码
+        self.codes: Counter = Counter()
+        # 未收到返回的请求异常，按异常类型统计
+        self.exceptions: Counter = Counter()
+        self.timeouts = 0
+        self.retries = 0
+        # 因超过截止时间而放弃的调用
+        self.deadline_exceeded = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.inflight = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "inflight": self.inflight,
+            "statuses": dict(self.statuses),
+            "codes": dict(self.codes),
+            "exceptions": dict(self.exceptions),
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "latency": _summary(self.latency),
+        }
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels.items()) + "}"
+
+
+def _format_float(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+def _family(lines: List[str], name: str, kind: str, help_: str, samples: Iterable[Tuple[str, str, Any]]) -> None:
+    lines.append("# HELP {} {}".format(name, help_))
+    lines.append("# TYPE {} {}".format(name, kind))
+    for suffix, labels, value in samples:
+        lines.append("{}{}{} {}".format(name, suffix, labels, value))
+
+
+def _summary(histogram: Histogram) -> Dict[str, float]:
+    return {
+        "count": histogram.count,
+        "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+        "p50": histogram.quantile(0.5),
+        "p95": histogram.quantile(0.95),
+        "p99": histogram.quantile(0.99),
+    }
+
+
+class HttpMetrics:
+    """BotHttp 的请求指标，key 为 "METHOD path模板" """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+          buckets: 耗时分桶的上界（秒）。. Defaults to DEFAULT_BUCKETS
+        """
+        self.buckets = tuple(buckets)
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+
+    def get(self, route: Any) -> RouteMetrics:
+        key = (route.method, route.path)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics(route.method, route.path, self.buckets)
+        return metrics
+
+    def reset(self) -> None:
+        self.routes.clear()
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """统计请求和返回的数据量，需要在发送请求时通过`trace_request_ctx={"metrics": RouteMetrics}`传入"""
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_chunk_sent.append(self._on_request_chunk_sent)
+        trace_config.on_response_chunk_received.append(self._on_response_chunk_received)
+        return trace_config
+
+    @staticmethod
+    def _route_metrics(ctx) -> RouteMetrics:
+        trace_request_ctx = ctx.trace_request_ctx
+        return trace_request_ctx.get("metrics") if isinstance(trace_request_ctx, dict) else None
+
+    async def _on_request_chunk_sent(self, session, ctx, params) -> None:
+        metrics = self._route_metrics(ctx)
+        if metrics is not None:
+            metrics.bytes_out += len(params.chunk)
+
+    async def _on_response_chunk_received(self, session, ctx, params) -> None:
+        metrics = self._route_metrics(ctx)
+        if metrics is not None:
+            metrics.bytes_in += len(params.chunk)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {"{} {}".format(m.method, m.path): m.to_dict() for m in self.routes.values()}
+
+    def to_prometheus(self, prefix: str = "botpy_http") -> str:
+        """
+        导出为 Prometheus 文本格式
+
+        Args:
+          prefix (str): 指标名称的前缀。. Defaults to "botpy_http"
+
+        Returns:
+          Prometheus text exposition format 的字符串
+        """
+        lines = []
+
+        def family(name: str, kind: str, help_: str, samples: Iterable[Tuple[str, str, Any]]) -> None:
+            _family(lines, prefix + name, kind, help_, samples)
+
+        routes = list(self.routes.values())
+        histogram = []
+        for m in routes:
+            for upper, count in m.latency.cumulative():
+                histogram.append(("_bucket", _labels(method=m.method, route=m.path, le=_format_float(upper)), count))
+            histogram.append(("_sum", _labels(method=m.method, route=m.path), repr(m.latency.sum)))
+            histogram.append(("_count", _labels(method=m.method, route=m.path), m.latency.count))
+        family("_request_duration_seconds", "histogram", "HTTP request latency by route.", histogram)
+        family(
+            "_responses_total",
+            "counter",
+            "HTTP responses by route and status.",
+            [
+                ("", _labels(method=m.method, route=m.path, status=status), n)
+                for m in routes
+                for status, n in sorted(m.statuses.items())
+            ],
+        )
+        family(
+            "_error_codes_total",
+            "counter",
+            "API error codes by route.",
+            [
+                ("", _labels(method=m.method, route=m.path, code=code), n)
+                for m in routes
+                for code, n in sorted(m.codes.items(), key=lambda item: str(item[0]))
+            ],
+        )
+        family(
+            "_exceptions_total",
+            "counter",
+            "Requests that failed without a response, by exception type.",
+            [
+                ("", _labels(method=m.method, route=m.path, type=name), n)
+                for m in routes
+                for name, n in sorted(m.exceptions.items())
+            ],
+        )
+        for name, attr, kind, help_ in (
+            ("_requests_total", "requests", "counter", "HTTP requests sent by route, including retries."),
+            ("_timeouts_total", "timeouts", "counter", "HTTP requests that timed out by route."),
+            ("_retries_total", "retries", "counter", "HTTP request retries by route."),
+            ("_deadline_exceeded_total", "deadline_exceeded", "counter", "HTTP calls abandoned at their deadline."),
+            ("_request_bytes_total", "bytes_out", "counter", "HTTP request body bytes sent by route."),
+            ("_response_bytes_total", "bytes_in", "counter", "HTTP response body bytes received by route."),
+            ("_inflight_requests", "inflight", "gauge", "HTTP requests currently in flight by route."),
+        ):
+            family(name, kind, help_, [("", _labels(method=m.method, route=m.path), getattr(m, attr)) for m in routes])
+        return "\n".join(lines) + "\n"
+
+
+class ShardMetrics:
+    """单个分片的 websocket 指标"""
+
+    def __init__(self, shard_id: int, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.shard_id = shard_id
+        # 心跳从发出到收到 ACK 的耗时
+        self.latency = Histogram(buckets)
+        self.last_latency: Optional[float] = None
+        # Hello 中下发的心跳间隔（秒）
+        self.heartbeat_interval = 0.0
+        self.heartbeats = 0
+        self.acks = 0
+        # 到下一次心跳时仍未收到 ACK 的心跳
+        self.missed_acks = 0
+        # 连续未收到 ACK 而主动断开重连的次数
+        self.zombie_reconnects = 0
+        # 待解析的事件队列的当前长度和最大长度
+        self.queue_depth = 0
+        self.queue_peak = 0
+        # 队列已满时丢弃的事件和暂停读取的次数
+        self.shed_events = 0
+        self.backpressure_pauses = 0
+
+    def observe_queue(self, depth: int) -> None:
+        self.queue_depth = depth
+        if depth > self.queue_peak:
+            self.queue_peak = depth
+
+    def observe_ack(self, rtt: float) -> None:
+        self.acks += 1
+        self.last_latency = rtt
+        self.latency.observe(rtt)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "heartbeat_interval": self.heartbeat_interval,
+            "heartbeats": self.heartbeats,
+            "acks": self.acks,
+            "missed_acks": self.missed_acks,
+            "zombie_reconnects": self.zombie_reconnects,
+            "last_latency": self.last_latency,
+            "latency": _summary(self.latency),
+            "queue_depth": self.queue_depth,
+            "queue_peak": self.queue_peak,
+            "shed_events": self.shed_events,
+            "backpressure_pauses": self.backpressure_pauses,
+        }
+
+
+class GatewayMetrics:
+    """websocket 连接的指标，key 为分片 id"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+          buckets: 心跳耗时分桶的上界（秒）。. Defaults to DEFAULT_BUCKETS
+        """
+        self.buckets = tuple(buckets)
+        self.shards: Dict[int, ShardMetrics] = {}
+
+    def get(self, shard_id: int) -> ShardMetrics:
+        metrics = self.shards.get(shard_id)
+        if metrics is None:
+            metrics = self.shards[shard_id] = ShardMetrics(shard_id, self.buckets)
+        return metrics
+
+    @property
+    def latency(self) -> Optional[float]:
+        """各分片最近一次心跳耗时的平均值，还没有收到 ACK 时为 None"""
+        values = [m.last_latency for m in self.shards.values() if m.last_latency is not None]
+        return sum(values) / len(values) if values else None
+
+    def reset(self) -> None:
+        self.shards.clear()
+
+    def to_dict(self) -> Dict[int, Dict[str, Any]]:
+        return {shard_id: m.to_dict() for shard_id, m in sorted(self.shards.items())}
+
+    def to_prometheus(self, prefix: str = "botpy_gateway") -> str:
+        """
+        导出为 Prometheus 文本格式
+
+        Args:
+          prefix (str): 指标名称的前缀。. Defaults to "botpy_gateway"
+
+        Returns:
+          Prometheus text exposition format 的字符串
+        """
+        lines = []
+        shards = [m for _, m in sorted(self.shards.items())]
+        histogram = []
+        for m in shards:
+            for upper, count in m.latency.cumulative():
+                histogram.append(("_bucket", _labels(shard=m.shard_id, le=_format_float(upper)), count))
+            histogram.append(("_sum", _labels(shard=m.shard_id), repr(m.latency.sum)))
+            histogram.append(("_count", _labels(shard=m.shard_id), m.latency.count))
+        _family(lines, prefix + "_heartbeat_rtt_seconds", "histogram", "Heartbeat round trip by shard.", histogram)
+        for name, attr, kind, help_ in (
+            ("_heartbeat_interval_seconds", "heartbeat_interval", "gauge", "Heartbeat interval sent in Hello."),
+            ("_heartbeats_total", "heartbeats", "counter", "Heartbeats sent by shard."),
+            ("_heartbeat_acks_total", "acks", "counter", "Heartbeat ACKs received by shard."),
+            ("_missed_heartbeat_acks_total", "missed_acks", "counter", "Heartbeats not ACKed before the next one."),
+            ("_zombie_reconnects_total", "zombie_reconnects", "counter", "Reconnects forced by missed ACKs."),
+            ("_event_queue_depth", "queue_depth", "gauge", "Events received but not yet dispatched."),
+            ("_event_queue_peak", "queue_peak", "gauge", "Highest event queue depth seen."),
+            ("_shed_events_total", "shed_events", "counter", "Events dropped because the queue was full."),
+            ("_backpressure_pauses_total", "backpressure_pauses", "counter", "Reads paused on a full event queue."),
+        ):
+            samples = [("", _labels(shard=m.shard_id), getattr(m, attr)) for m in shards]
+            _family(lines, prefix + name, kind, help_, samples)
+        return "\n".join(lines) + "\n"
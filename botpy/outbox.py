@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+持久化的主动消息发送队列
+
+消息先写入本地 SQLite 数据库再由后台 worker 发送，进程重启后从未完成的消息继续发送（至少发送一次）。
+使用方式:
+
+    outbox = Outbox(client.api, "outbox.db", workers=4, rate=20)
+    await outbox.start()
+    await outbox.enqueue("post_group_message", {"group_openid": openid, "content": "hello"}, batch="notice")
+    print(await outbox.progress("notice"))
+
+注意:
+- 进程在消息发出后、记录发送结果前退出时，重启后该消息会被再次发送。
+- 消息参数需要可以 JSON 序列化，不支持 file_image 等二进制数据。
+- worker 以`Priority.BULK`发送，不会挤占被动回复等请求的发送能力。
+"""
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import codec, logging
+from .retry import RetryPolicy
+from .scheduler import Priority, use_priority
+
+_log = logging.get_logger()
+
+PENDING = 0
+SENDING = 1
+SENT = 2
+FAILED = 3
+STATUS_NAMES = {PENDING: "pending", SENDING: "sending", SENT: "sent", FAILED: "failed"}
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        batch TEXT,
+        status INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL DEFAULT 0,
+        lease_until REAL NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        error TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS outbox_ready ON outbox (status, not_before, id)",
+    "CREATE INDEX IF NOT EXISTS outbox_batch ON outbox (batch, status)",
+)
+
+_INSERT = (
+    "INSERT INTO outbox (method, payload, batch, not_before, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+_Row = Tuple[int, str, str, int]
+
+
+class Outbox:
+    """持久化的主动消息发送队列，参考模块说明"""
+
+    def __init__(
+        self,
+        api: Any,
+        path: str = "botpy_outbox.db",
+        workers: int = 4,
+        rate: Optional[float] = None,
+        max_attempts: int = 5,
+        retry_delay: float = 5.0,
+        lease: float = 300.0,
+        poll_interval: float = 1.0,
+        retention: float = 86400.0,
+    ):
+        """
+        Args:
+          api (BotAPI): 用于发送消息的 BotAPI
+          path (str): SQLite 数据库文件路径。. Defaults to botpy_outbox.db
+          workers (int): 并发发送的 worker 数量。. Defaults to 4
+          rate (float): 每秒最多发送的消息数，None 表示不限制
+          max_attempts (int): 每条消息最多发送的次数，超过后标记为失败。. Defaults to 5
+          retry_delay (float): 第一次重新发送前的等待时间（秒），之后每次翻倍。. Defaults to 5.0
+          lease (float): 取出的消息在多少秒内未记录结果时视为发送中断，可以被重新发送。. Defaults to 300.0
+          poll_interval (float): 没有待发送消息时检查延迟消息的间隔（秒）。. Defaults to 1.0
+          retention (float): 已发送的消息保留的时间（秒），启动时清理。. Defaults to 86400.0
+        """
+        self.api = api
+        self.path = path
+        self.workers = workers
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.retry_policy = RetryPolicy()
+
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes: List[Tuple[str, tuple, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Future] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._next_send = 0.0
+        self._closing = False
+
+    async def __aenter__(self) -> "Outbox":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    # 数据库操作都在同一个后台线程中执行，避免阻塞事件循环
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="botpy-outbox")
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> None:
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path)
+        # WAL 模式下写入不阻塞读取，NORMAL 同步级别在进程崩溃时不会丢失已提交的数据
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        self._conn = conn
+
+    def _execute_writes(self, writes: List[Tuple[str, tuple]]) -> List[int]:
+        self._connect()
+        with self._conn:
+            return [self._conn.execute(sql, params).lastrowid for sql, params in writes]
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        self._connect()
+        return self._conn.execute(sql, params).fetchall()
+
+    async def _write(self, sql: str, params: tuple) -> int:
+        """写入操作合并到同一个事务中提交，返回 lastrowid"""
+        future = asyncio.get_event_loop().create_future()
+        self._writes.append((sql, params, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        while self._writes:
+            writes, self._writes = self._writes, []
+            try:
+                ids = await self._run(self._execute_writes, [(sql, params) for sql, params, _ in writes])
+            except Exception as e:
+                for _, _, future in writes:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), id_ in zip(writes, ids):
+                if not future.done():
+                    future.set_result(id_)
+
+    # 入队
+    def _check_method(self, method: str) -> None:
+        if method.startswith("_") or not asyncio.iscoroutinefunction(getattr(self.api, method, None)):
+            raise ValueError("[botpy] Outbox 不支持的发送方法: %s" % method)
+
+    def _insert_params(self, method: str, kwargs: Optional[Dict[str, Any]], batch: Optional[str], delay: float):
+        now = time.time()
+        return method, codec.dumps(kwargs or {}), batch, now + delay, now, now
+
+    async def enqueue(self, method: str, kwargs: Dict[str, Any] = None, batch: str = None, delay: float = 0) -> int:
+        """
+        写入一条待发送的消息，写入数据库后立即返回
+
+        Args:
+          method (str): BotAPI 的方法名，如 post_message、post_group_message
+          kwargs (dict): 调用方法的参数
+          batch (str): 批次名称，用于通过`progress`查看一批消息的发送进度
+          delay (float): 延迟发送的秒数。. Defaults to 0
+
+        Returns:
+          消息在队列中的 ID
+        """
+        self._check_method(method)
+        id_ = await self._write(_INSERT, self._insert_params(method, kwargs, batch, delay))
+        self.enqueued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return id_
+
+    async def enqueue_many(self, method: str, items: Iterable[Dict[str, Any]], batch: str = None) -> List[int]:
+        """在同一个事务中写入多条消息，适合广播"""
+        self._check_method(method)
+        writes = [(_INSERT, self._insert_params(method, kwargs, batch, 0)) for kwargs in items]
+        ids = await self._run(self._execute_writes, writes)
+        self.enqueued += len(ids)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return ids
+
+    # 发送
+    async def start(self) -> None:
+        """启动 worker，从数据库中未完成的消息开始发送"""
+        if self._tasks:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        await self.purge()
+        self._tasks.append(asyncio.ensure_future(self._feed()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.ensure_future(self._work()))
+
+    def _claim(self, limit: int) -> List[_Row]:
+        """取出待发送和租期已过的消息，标记为发送中"""
+        self._connect()
+        now = time.time()
+        with self._conn:
+            rows = self._conn.execute(
+                "SELECT id, method, payload, attempts FROM outbox"
+                " WHERE (status = ? AND not_before <= ?) OR (status = ? AND lease_until <= ?)"
+                " ORDER BY id LIMIT ?",
+                (PENDING, now, SENDING, now, limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                [(SENDING, now + self.lease, now, row[0]) for row in rows],
+            )
+        return rows
+
+    async def _feed(self) -> None:
+        # 本地最多缓存 workers 条已取出的消息，worker 取走消息或有新消息入队时唤醒
+        while not self._closing:
+            self._wakeup.clear()
+            free = self.workers - self._queue.qsize()
+            rows = []
+            if free > 0:
+                try:
+                    rows = await self._run(self._claim, free)
+                except Exception as e:
+                    _log.error("[botpy] Outbox 读取待发送消息失败: %s", e)
+            for row in rows:
+                self._queue.put_nowait(row)
+            if not rows or self._queue.qsize() >= self.workers:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _pace(self) -> None:
+        if not self.rate:
+            return
+        now = time.monotonic()
+        send_at = max(now, self._next_send)
+        self._next_send = send_at + 1.0 / self.rate
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    async def _work(self) -> None:
+        # 主动消息以批量优先级发送，被动回复优先
+        with use_priority(Priority.BULK):
+            while True:
+                row = await self._queue.get()
+                if row is None:
+                    return
+                self._wakeup.set()
+                try:
+                    await self._send(row)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # 结果没有写入数据库时消息保持发送中，租期过后重新发送
+                    _log.error("[botpy] Outbox 记录消息 %s 的发送结果失败: %s", row[0], e)
+
+    async def _send(self, row: _Row) -> None:
+        id_, method, payload, attempts = row
+        await self._pace()
+        try:
+            await getattr(self.api, method)(**codec.loads(payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            attempts += 1
+            now = time.time()
+            error = "%s(%s)" % (type(e).__name__, e)
+            if attempts < self.max_attempts and self.retry_policy.is_retryable(e, idempotent=True):
+                self.retried += 1
+                delay = self.retry_delay * (2 ** (attempts - 1))
+                _log.warning("[botpy] Outbox 消息 %s 发送失败: %s, %.1fs 后重新发送", id_, error, delay)
+                await self._write(
+                    "UPDATE outbox SET status = ?, attempts = ?, not_before = ?, updated_at = ?, error = ?"
+                    " WHERE id = ?",
+                    (PENDING, attempts, now + delay, now, error, id_),
+                )
+            else:
+                self.failed += 1
+                _log.error("[botpy] Outbox 消息 %s 发送失败: %s, 不再重新发送", id_, error)
+                await self._write(
+                    "UPDATE outbox SET status = ?, attempts = ?, updated_at = ?, error = ? WHERE id = ?",
+                    (FAILED, attempts, now, error, id_),
+                )
+        else:
+            self.sent += 1
+            await self._write(
+                "UPDATE outbox SET status = ?, attempts = ?, updated_at = ?, error = NULL WHERE id = ?",
+                (SENT, attempts + 1, time.time(), id_),
+            )
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        停止发送，等待发送中的消息完成后关闭数据库
+
+        Args:
+          timeout (float): 等待发送中的消息的最长时间（秒）。. Defaults to 10.0
+        """
+        if self._tasks:
+            self._closing = True
+            self._wakeup.set()
+            feeder, workers = self._tasks[0], self._tasks[1:]
+            await feeder
+            # 已取出但未发送的消息放回队列
+            while not self._queue.empty():
+                id_ = self._queue.get_nowait()[0]
+                await self._write("UPDATE outbox SET status = ?, lease_until = 0 WHERE id = ?", (PENDING, id_))
+            for _ in workers:
+                self._queue.put_nowait(None)
+            _, pending = await asyncio.wait(workers, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._tasks = []
+        if self._flusher is not None:
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        if self._executor is not None:
+            if self._conn is not None:
+                await self._run(self._conn.close)
+                self._conn = None
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # 进度
+    async def progress(self, batch: str = None) -> Dict[str, int]:
+        """各状态的消息数量，指定 batch 时只统计该批次"""
+        if batch is None:
+            rows = await self._run(self._query, "SELECT status, COUNT(*) FROM outbox GROUP BY status")
+        else:
+            rows = await self._run(
+                self._query, "SELECT status, COUNT(*) FROM outbox WHERE batch = ? GROUP BY status", (batch,)
+            )
+        result = {name: 0 for name in STATUS_NAMES.values()}
+        for status, count in rows:
+            result[STATUS_NAMES[status]] = count
+        return result
+
+    async def failures(self, batch: str = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """发送失败的消息，可以修正后重新入队"""
+        sql = "SELECT id, method, payload, batch, attempts, error FROM outbox WHERE status = ?"
+        params: tuple = (FAILED,)
+        if batch is not None:
+            sql += " AND batch = ?"
+            params += (batch,)
+        rows = await self._run(self._query, sql + " ORDER BY id LIMIT ?", params + (limit,))
+        return [
+            {"id": id_, "method": method, "kwargs": codec.loads(payload), "batch": b, "attempts": n, "error": error}
+            for id_, method, payload, b, n, error in rows
+        ]
+
+    async def join(self, batch: str = None) -> Dict[str, int]:
+        """等待队列（或指定批次）中的消息全部发送完成或失败，返回各状态的消息数量"""
+        while True:
+            progress = await self.progress(batch)
+            if not progress["pending"] and not progress["sending"]:
+                return progress
+            await asyncio.sleep(min(self.poll_interval, 0.1))
+
+    async def purge(self, older_than: float = None) -> int:
+        """删除超过保留时间的已发送消息，返回删除的数量"""
+        older_than = self.retention if older_than is None else older_than
+        return await self._run(self._delete_sent, time.time() - older_than)
+
+    def _delete_sent(self, before: float) -> int:
+        self._connect()
+        with self._conn:
+            return self._conn.execute("DELETE FROM outbox WHERE status = ? AND updated_at < ?", (SENT, before)).rowcount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": len(self._tasks) - 1 if self._tasks else 0,
+        }
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+# fetch(cursor) 返回 (当前页数据, 下一页的cursor)，下一页cursor为 None 表示没有更多数据
+PageFetcher = Callable[[Any], Awaitable[Tuple[List[Any], Any]]]
+
+
+class Paginator:
+    """异步分页迭代器
+
+    按页拉取数据并逐条返回，消费当前页时预取下一页，内存中最多只保留两页数据。
+    `cursor` 为恢复迭代所需的分页标识，中断后可以将其传给对应的 iter_xxx 方法继续遍历。
+
+    使用示例:
+    ```
+    async for member in api.iter_guild_members(guild_id):
+        ...
+    ```
+    """
+
+    def __init__(
+        self,
+        fetch: PageFetcher,
+        cursor: Any = None,
+        item_cursor: Callable[[Any], Any] = None,
+        prefetch: bool = True,
+    ):
+        """
+        Args:
+          fetch: 拉取一页数据的协程函数
+          cursor: 第一页的分页标识
+          item_cursor: 从单条数据中获取分页标识，设置后 cursor 会精确到已返回的最后一条数据
+          prefetch (bool): 是否在消费当前页时预取下一页。. Defaults to True
+        """
+        self.cursor = cursor
+        self.done = False
+        self.pages = 0
+        self.items = 0
+        self._fetch = fetch
+        self._item_cursor = item_cursor
+        self._prefetch = prefetch
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iter()
+
+    async def _iter(self) -> AsyncIterator[Any]:
+        pending: Optional[asyncio.Future] = asyncio.ensure_future(self._fetch(self.cursor))
+        try:
+            while pending is not None:
+                items, next_cursor = await pending
+                self.pages += 1
+                pending = None
+                if next_cursor is not None and self._prefetch:
+                    pending = asyncio.ensure_future(self._fetch(next_cursor))
+                for item in items:
+                    self.items += 1
+                    if self._item_cursor is not None:
+                        self.cursor = self._item_cursor(item)
+                    yield item
+                if next_cursor is None:
+                    self.done = True
+                    return
+                self.cursor = next_cursor
+                if pending is None:
+                    pending = asyncio.ensure_future(self._fetch(next_cursor))
+        finally:
+            # 提前结束迭代时取消预取的请求
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    async def flatten(self) -> List[Any]:
+        """拉取全部数据并以列表返回"""
+        return [item async for item in self]
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from . import logging
+from .errors import DeadlineExceededError
+
+_log = logging.get_logger()
+
+# 触发频率限制的 HTTP 状态码
+RATE_LIMIT_STATUS = 429
+# 触发频率限制的业务错误码: 22009 消息发送超频, 20028 子频道消息触发限频
+RATE_LIMIT_CODES = (22009, 20028)
+# 无法从响应中获知冷却时间时，默认的等待时间（秒）
+DEFAULT_RETRY_AFTER = 1.0
+
+X_RATELIMIT_LIMIT = "X-RateLimit-Limit"
+X_RATELIMIT_REMAINING = "X-RateLimit-Remaining"
+X_RATELIMIT_RESET_AFTER = "X-RateLimit-Reset-After"
+RETRY_AFTER = "Retry-After"
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Bucket:
+    """限频桶
+
+    同一个桶内的请求按到达顺序排队，在离开进程前根据已知的限额进行限速。
+    限额可以预先配置，也可以从响应头或限频错误中学习得到。
+    """
+
+    def __init__(self, key: str, limit: Optional[int] = None, period: float = 1.0):
+        """
+        Args:
+          key (str): 桶的标识，由 Route 模板和主要参数组成
+          limit (int): 每个周期内允许发出的请求数，None 表示未知（不限速）
+          period (float): 限额周期（秒）. Defaults to 1.0
+        """
+        self.key = key
+        self.limit = limit
+        self.period = period
+        self.remaining: Optional[int] = None
+        self.blocked_until = 0.0
+        self.pending = 0
+        self.sent_count = 0
+        self.limited_count = 0
+        self.last_used = time.monotonic()
+        self._sent: Deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    def _delay(self, now: float) -> float:
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.limit:
+            window_start = now - self.period
+            while self._sent and self._sent[0] <= window_start:
+                self._sent.popleft()
+            if len(self._sent) >= self.limit:
+                return self._sent[0] + self.period - now
+        return 0.0
+
+    async def acquire(self, deadline: Optional[float] = None) -> None:
+        """
+        排队等待直到桶内允许发出下一个请求
+
+        Args:
+          deadline (float): 截止时间（time.monotonic()），排队时间会超过截止时间时抛出 DeadlineExceededError
+        """
+        self.pending += 1
+        try:
+            if deadline is None or not self._lock.locked():
+                await self._lock.acquire()
+            else:
+                try:
+                    await asyncio.wait_for(self._lock.acquire(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    raise DeadlineExceededError("[botpy] 限频桶 %s 排队超过截止时间" % self.key) from None
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(now)
+                    if delay <= 0:
+                        break
+                    if deadline is not None and now + delay > deadline:
+                        raise DeadlineExceededError("[botpy] 限频桶 %s 需要等待 %.3fs, 超过截止时间" % (self.key, delay))
+                    _log.debug("[botpy] 限频桶 %s 排队等待 %.3fs", self.key, delay)
+                    await asyncio.sleep(delay)
+                now = time.monotonic()
+                self._sent.append(now)
+                self.last_used = now
+                self.sent_count += 1
+                if self.remaining:
+                    self.remaining -= 1
+            finally:
+                self._lock.release()
+        finally:
+            self.pending -= 1
+
+    def update(self, status: int, headers: Any) -> None:
+        """根据响应状态码和响应头更新桶的限额"""
+        limit = _to_float(headers.get(X_RATELIMIT_LIMIT))
+        if limit:
+            self.limit = int(limit)
+        remaining = _to_float(headers.get(X_RATELIMIT_REMAINING))
+        reset_after = _to_float(headers.get(X_RATELIMIT_RESET_AFTER) or headers.get(RETRY_AFTER))
+        if remaining is not None:
+            self.remaining = int(remaining)
+            if self.remaining <= 0 and reset_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset_after)
+        if status == RATE_LIMIT_STATUS:
+            self.on_limited(reset_after)
+
+    def on_limited(self, retry_after: Optional[float] = None) -> None:
+        """请求触发了频率限制，暂停该桶并在限额未知时从本周期的发送量中推断限额"""
+        now = time.monotonic()
+        self.limited_count += 1
+        self.blocked_until = max(self.blocked_until, now + (retry_after or DEFAULT_RETRY_AFTER))
+        if not self.limit:
+            # 触发限频的这一次不计入推断的限额
+            window_start = now - self.period
+            sent = len([t for t in self._sent if t > window_start])
+            self.limit = max(1, sent - 1)
+        _log.warning("[botpy] 触发频率限制, 限频桶: %s, 推断限额: %s/%ss", self.key, self.limit, self.period)
+
+    @property
+    def idle(self) -> bool:
+        now = time.monotonic()
+        return self.pending == 0 and self.blocked_until <= now and now - self.last_used > self.period
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "limit": self.limit,
+            "period": self.period,
+            "remaining": self.remaining,
+            "pending": self.pending,
+            "blocked_for": max(0.0, self.blocked_until - now),
+            "sent": self.sent_count,
+            "limited": self.limited_count,
+        }
+
+
+class RateLimiter:
+    """按 Route 模板和主要参数划分限频桶的调度器"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]] = None, max_buckets: int = 10000):
+        """
+        Args:
+          limits (dict): 预设限额，key 为 "METHOD path模板"，value 为 (请求数, 周期秒数)，
+            如 {"POST /v2/groups/{group_openid}/messages": (5, 1.0)}
+          max_buckets (int): 最多保留的桶数量，超出后回收空闲的桶。. Defaults to 10000
+        """
+        self.limits = limits or {}
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, Bucket] = {}
+
+    def get_bucket(self, route) -> Bucket:
+        key = route.bucket
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune()
+            limit, period = self.limits.get("{} {}".format(route.method, route.path), (None, 1.0))
+            bucket = self._buckets[key] = Bucket(key, limit, period)
+        return bucket
+
+    def _prune(self) -> None:
+        for key in [k for k, b in self._buckets.items() if b.idle]:
+            del self._buckets[key]
+
+    def state(self) -> Dict[str, Dict[str, Any]]:
+        """返回当前所有限频桶的状态，用于查看排队和限频情况"""
+        return {key: bucket.to_dict() for key, bucket in self._buckets.items()}
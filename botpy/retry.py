@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import random
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from .ratelimit import RATE_LIMIT_CODES, RATE_LIMIT_STATUS
+
+# 幂等的请求方式，重复发送不会产生副作用
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# 默认重试的 HTTP 状态码
+RETRY_STATUSES = (RATE_LIMIT_STATUS, 500, 502, 503, 504)
+# 服务端明确拒绝（未处理）请求的状态码，非幂等请求也可以安全重试
+REJECTED_STATUSES = (RATE_LIMIT_STATUS,)
+
+# 请求未发出即失败，任何请求都可以安全重试
+_NOT_SENT_ERRORS = (aiohttp.ClientConnectorError,)
+# 请求可能已经被服务端处理，只有幂等请求才能重试
+_UNCERTAIN_ERRORS = (
+    asyncio.TimeoutError,
+    aiohttp.ServerDisconnectedError,
+    aiohttp.ClientOSError,
+    ConnectionResetError,
+)
+
+
+class RetryPolicy:
+    """请求重试策略
+
+    使用指数退避加随机抖动计算重试间隔，并通过总时长预算限制一次调用的最长耗时。
+    非幂等请求（如 POST 发消息）只在确认服务端没有处理时重试，避免重复发送；
+    携带 msg_id + msg_seq 的消息由服务端去重，视为幂等请求。
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        jitter: float = 0.5,
+        deadline: Optional[float] = None,
+        retry_statuses: tuple = RETRY_STATUSES,
+        retry_codes: tuple = RATE_LIMIT_CODES,
+        retry_non_idempotent: bool = False,
+    ):
+        """
+        Args:
+          max_retries (int): 最大重试次数，0 表示不重试。. Defaults to 2
+          backoff_base (float): 第一次重试的退避时间（秒），之后每次翻倍。. Defaults to 0.5
+          backoff_max (float): 单次退避时间上限（秒）。. Defaults to 8.0
+          jitter (float): 随机抖动比例 0-1，1 表示在 [0, 退避时间] 内完全随机。. Defaults to 0.5
+          deadline (float): 一次调用（包含所有重试）的总时长预算（秒），None 表示不限制
+          retry_statuses (tuple): 需要重试的 HTTP 状态码
+          retry_codes (tuple): 需要重试的业务错误码
+          retry_non_idempotent (bool): 结果不确定时是否也重试非幂等请求（可能导致重复发送）。. Defaults to False
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_statuses = retry_statuses
+        self.retry_codes = retry_codes
+        self.retry_non_idempotent = retry_non_idempotent
+
+    @staticmethod
+    def is_idempotent(method: str, json_: Optional[Dict[str, Any]] = None) -> bool:
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        # 相同的 msg_id + msg_seq 重复发送会被服务端拒绝，因此可以安全重试
+        return bool(json_ and json_.get("msg_id") and json_.get("msg_seq"))
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+    def is_retryable(self, exception: BaseException, idempotent: bool) -> bool:
+        if isinstance(exception, _NOT_SENT_ERRORS):
+            return True
+        if isinstance(exception, _UNCERTAIN_ERRORS):
+            return idempotent or self.retry_non_idempotent
+        status = getattr(exception, "status", None)
+        code = getattr(exception, "code", None)
+        if status in REJECTED_STATUSES or (code is not None and code in self.retry_codes):
+            return True
+        if status in self.retry_statuses:
+            return idempotent or self.retry_non_idempotent
+        return False
+
+    def next_delay(self, attempt: int, exception: BaseException, idempotent: bool, elapsed: float) -> Optional[float]:
+        """
+        计算下一次重试前的等待时间
+
+        Args:
+          attempt (int): 即将进行的重试次数，从 1 开始
+          exception (BaseException): 上一次请求的异常
+          idempotent (bool): 请求是否幂等
+          elapsed (float): 本次调用已经消耗的时间（秒）
+
+        Returns:
+          等待的秒数，返回 None 表示不再重试
+        """
+        if attempt > self.max_retries or not self.is_retryable(exception, idempotent):
+            return None
+        delay = self.backoff(attempt)
+        if self.deadline is not None and elapsed + delay >= self.deadline:
+            return None
+        return delay
+
+    def remaining(self, elapsed: float) -> Optional[float]:
+        """总时长预算中剩余的时间，未设置预算时返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - elapsed)
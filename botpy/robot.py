@@ -1,5 +1,6 @@
 import asyncio
 import time
+from typing import ClassVar, Dict, Optional
 
 import aiohttp
 
@@ -22,31 +23,59 @@ class Robot:
 class Token:
     TYPE_BOT = "QQBot"
     TYPE_NORMAL = "Bearer"
+    # 获取 access_token 的接口地址
+    TOKEN_URL: ClassVar[str] = "https://bots.qq.com/app/getAppAccessToken"
+    # 后台刷新失败后的重试间隔（秒）
+    REFRESH_RETRY_INTERVAL = 5
 
-    def __init__(self, app_id: str, secret: str):
+    def __init__(self, app_id: str, secret: str, skew: int = 30, refresh_ahead: int = 60):
         """
         :param app_id:
             机器人appid
         :param secret:
             机器人密钥
+        :param skew:
+            时钟偏差容忍（秒），token 会提前 skew 秒视为过期
+        :param refresh_ahead:
+            后台刷新提前量（秒），在 token 过期前 refresh_ahead 秒刷新
         """
         self.app_id = app_id
         self.secret = secret
         self.access_token = None
         self.expires_in = 0
         self.Type = self.TYPE_BOT
+        self.skew = skew
+        self.refresh_ahead = refresh_ahead
+
+        # BotHttp 登录时设置，获取 token 时使用共享的连接器
+        self.session_registry = None
+        self._updating: Optional[asyncio.Future] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._headers: Optional[Dict[str, str]] = None
+        self._headers_token = None
+
+    def is_expired(self) -> bool:
+        return self.access_token is None or time.time() >= self.expires_in - self.skew
 
     async def check_token(self):
-        if self.access_token is None or int(time.time()) >= self.expires_in:
+        if self.is_expired():
             await self.update_access_token()
 
     async def update_access_token(self):
-        session = aiohttp.ClientSession()
+        """刷新 access_token，并发调用时只会发起一次请求，其他调用方等待同一个结果"""
+        if self._updating is None or self._updating.done():
+            self._updating = asyncio.ensure_future(self._fetch_access_token())
+        # shield 避免某个调用方被取消时中断其他调用方等待的请求
+        await asyncio.shield(self._updating)
+
+    async def _fetch_access_token(self):
+        registry = self.session_registry
+        session = aiohttp.ClientSession() if registry is None else registry.get("token")
         data = None
         # TODO 增加超时重试
         try:
             async with session.post(
-                url="https://bots.qq.com/app/getAppAccessToken",
+                url=self.TOKEN_URL,
                 timeout=(aiohttp.ClientTimeout(total=20)),
                 json={
                     "appId": self.app_id,
@@ -58,14 +87,47 @@ class Token:
             _log.info("[botpy] access_token TimeoutError:" + str(e))
             raise
         finally:
-            await session.close()
+            if registry is None:
+                await session.close()
         if "access_token" not in data or "expires_in" not in data:
             _log.error("[botpy] 获取token失败，请检查appid和secret填写是否正确！")
             raise RuntimeError(str(data))
-        _log.info("[botpy] access_token expires_in " + data["expires_in"])
+        _log.info("[botpy] access_token expires_in " + str(data["expires_in"]))
         self.access_token = data["access_token"]
         self.expires_in = int(data["expires_in"]) + int(time.time())
 
+    def start_refresher(self) -> None:
+        """启动后台任务，在 token 过期前自动刷新"""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.ensure_future(self._refresh_loop())
+
+    def stop_refresher(self) -> None:
+        if self._refresher is not None and not self._refresher.done():
+            self._refresher.cancel()
+        self._refresher = None
+
+    async def _refresh_loop(self):
+        while True:
+            # 至少间隔 REFRESH_RETRY_INTERVAL，避免有效期短于提前量时连续刷新
+            await asyncio.sleep(max(self.expires_in - self.refresh_ahead - time.time(), self.REFRESH_RETRY_INTERVAL))
+            try:
+                await self.update_access_token()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 刷新失败时稍后重试，token 过期前请求仍会通过 check_token 再次刷新
+                _log.warning("[botpy] 后台刷新access_token失败: %s", e)
+
+    def get_headers(self) -> Dict[str, str]:
+        """鉴权请求头，token 变化时才重新生成"""
+        if self._headers is None or self._headers_token != self.access_token:
+            self._headers = {
+                "Authorization": self.get_string(),
+                "X-Union-Appid": self.app_id,
+            }
+            self._headers_token = self.access_token
+        return self._headers
+
     # BotToken 机器人身份的 token
     def bot_token(self):
         return self
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+出站请求调度
+
+BotHttp 发出的请求按优先级分类，同时进行中的请求数达到上限后进入队列等待：
+- 不同优先级之间严格按优先级出队：被动回复 > 互动回调 > 主动消息 > 批量操作
+- 同一优先级内按频道/群（tenant）加权公平排队，避免单个频道的大量请求占满发送能力
+
+可以通过`use_priority`为一段代码中发出的请求指定优先级:
+```
+with use_priority(Priority.BULK):
+    await api.mute_multi_member(...)
+```
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .errors import DeadlineExceededError
+from .metrics import Histogram
+
+# 等待时间分桶的上界（秒）
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0)
+
+# 用于公平排队的 Route 参数，按顺序取第一个存在的参数
+TENANT_PARAMETERS = ("guild_id", "group_openid", "channel_id", "openid")
+
+# 默认视为批量操作的 "METHOD path模板"
+BULK_ROUTES = frozenset(
+    {
+        "PATCH /guilds/{guild_id}/mute",
+        "POST /guilds/{guild_id}/announces",
+    }
+)
+
+INTERACTION_ROUTES = frozenset({"PUT /interactions/{id}"})
+
+
+class Priority(IntEnum):
+    """出站请求的优先级，数值越小越优先"""
+
+    PASSIVE = 0  # 被动回复，带 msg_id 或 event_id，有效期 5 分钟
+    INTERACTION = 1  # 互动回调
+    PROACTIVE = 2  # 主动消息及其他请求
+    BULK = 3  # 批量操作
+
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("botpy_priority", default=None)
+
+
+@contextmanager
+def use_priority(priority: Priority) -> Iterator[None]:
+    """在 with 代码块中发出的请求使用指定的优先级"""
+    token = _priority.set(Priority(priority))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Slot:
+    def __init__(self, scheduler: "OutboundScheduler", priority: Priority, tenant: Any, deadline: Optional[float]):
+        self._scheduler = scheduler
+        self._priority = priority
+        self._tenant = tenant
+        self._deadline = deadline
+
+    async def __aenter__(self) -> None:
+        await self._scheduler.acquire(self._priority, self._tenant, self._deadline)
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._scheduler.release()
+
+
+class OutboundScheduler:
+    """出站请求调度器
+
+    同时进行中的请求数小于`concurrency`时请求直接发出，只有在发送能力饱和时才会排队。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 100,
+        weights: Dict[Any, float] = None,
+        bulk_routes: Iterable[str] = BULK_ROUTES,
+    ):
+        """
+        Args:
+          concurrency (int): 同时进行中的请求数上限。. Defaults to 100
+          weights (dict): 各个 tenant（guild_id、group_openid 等）的权重，未配置的为 1
+          bulk_routes: 视为批量操作的 "METHOD path模板"
+        """
+        self.concurrency = concurrency
+        self.weights = weights or {}
+        self.bulk_routes = frozenset(bulk_routes)
+        self.active = 0
+        self._counter = itertools.count()
+        self._queues: List[list] = [[] for _ in Priority]
+        self._depth: List[int] = [0] * len(Priority)
+        # 每个优先级的虚拟时间和各 tenant 最后一个请求的结束标记
+        self._virtual: List[float] = [0.0] * len(Priority)
+        self._finish: List[Dict[Any, float]] = [{} for _ in Priority]
+        self._served: List[int] = [0] * len(Priority)
+        self._wait: List[Histogram] = [Histogram(WAIT_BUCKETS) for _ in Priority]
+
+    def classify(self, route: Any, json_: Optional[dict] = None, priority: Priority = None) -> Priority:
+        """
+        判断请求的优先级
+
+        优先使用传入的 priority，其次是`use_priority`指定的优先级，最后根据 Route 和请求参数推断。
+        """
+        if priority is None:
+            priority = _priority.get()
+        if priority is not None:
+            return Priority(priority)
+        key = "{} {}".format(route.method, route.path)
+        if key in INTERACTION_ROUTES:
+            return Priority.INTERACTION
+        if json_ and (json_.get("msg_id") or json_.get("event_id")):
+            return Priority.PASSIVE
+        if key in self.bulk_routes:
+            return Priority.BULK
+        return Priority.PROACTIVE
+
+    @staticmethod
+    def tenant(route: Any) -> Any:
+        for name in TENANT_PARAMETERS:
+            if name in route.parameters:
+                return route.parameters[name]
+        return None
+
+    def slot(self, priority: Priority, tenant: Any = None, deadline: Optional[float] = None) -> _Slot:
+        """`async with scheduler.slot(priority, tenant):` 在代码块中占用一个发送名额"""
+        return _Slot(self, priority, tenant, deadline)
+
+    async def acquire(self, priority: Priority, tenant: Any = None, deadline: Optional[float] = None) -> None:
+        """
+        占用一个发送名额，饱和时排队等待
+
+        Args:
+          priority (Priority): 请求的优先级
+          tenant: 请求所属的 guild_id、group_openid 等，同一优先级内按 tenant 公平排队
+          deadline (float): 截止时间（time.monotonic()），排队超过截止时间时抛出 DeadlineExceededError
+        """
+        if self.active < self.concurrency and not any(self._depth):
+            self.active += 1
+            self._served[priority] += 1
+            self._wait[priority].observe(0.0)
+            return
+
+        # 按 start-time fair queuing 计算排队标记，权重越大的 tenant 标记增长越慢
+        start = max(self._virtual[priority], self._finish[priority].get(tenant, 0.0))
+        self._finish[priority][tenant] = start + 1.0 / self.weights.get(tenant, 1.0)
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._queues[priority], (start, next(self._counter), future, time.monotonic()))
+        self._depth[priority] += 1
+        try:
+            if deadline is None:
+                await future
+            else:
+                await asyncio.wait_for(future, deadline - time.monotonic())
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if future.cancelled():
+                self._depth[priority] -= 1
+            else:
+                # 已经分配到名额后被取消
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise DeadlineExceededError("[botpy] 发送排队超过截止时间, 优先级: %s" % priority.name) from None
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        while self.active < self.concurrency:
+            if not self._wake_next():
+                return
+
+    def _wake_next(self) -> bool:
+        for priority, queue in enumerate(self._queues):
+            while queue:
+                start, _, future, enqueued = heapq.heappop(queue)
+                if future.cancelled():
+                    continue
+                self._depth[priority] -= 1
+                self._virtual[priority] = start
+                if not queue:
+                    self._virtual[priority] = 0.0
+                    self._finish[priority].clear()
+                self.active += 1
+                self._served[priority] += 1
+                self._wait[priority].observe(time.monotonic() - enqueued)
+                future.set_result(None)
+                return True
+        return False
+
+    @property
+    def depth(self) -> int:
+        return sum(self._depth)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "depth": self.depth,
+            "classes": {
+                priority.name.lower(): {
+                    "depth": self._depth[priority],
+                    "served": self._served[priority],
+                    "wait_p50": self._wait[priority].quantile(0.5),
+                    "wait_p95": self._wait[priority].quantile(0.95),
+                    "wait_p99": self._wait[priority].quantile(0.99),
+                }
+                for priority in Priority
+            },
+        }
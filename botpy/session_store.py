@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+websocket 会话状态的持久化
+
+Client 按分片保存 session_id 和最后处理的事件 seq，进程重启后先用保存的状态 resume，
+服务端不接受时（Invalid Session）再重新鉴权。这样重启不会消耗 session_start_limit，并且能补收停机期间的事件。
+
+默认使用`FileSessionStore`保存到 JSON 文件，继承`SessionStore`实现 load / save / clear / flush 即可接入其他存储。
+"""
+import contextlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from . import codec, logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_log = logging.get_logger()
+
+
+class SessionStore:
+    """
+    会话状态的存储接口，key 为 (app_id, shard_id, shard_count)
+
+    save / clear 在事件循环中随每个事件调用，只能更新内存，不能阻塞；
+    load 和 flush 可能读写存储，gateway 在线程池中调用，需要是线程安全的。
+    """
+
+    # seq 变化时 gateway 调用 flush 的最小间隔（秒），session_id 变化、心跳和 Client 关闭时总是调用
+    flush_interval: float = 1.0
+
+    def load(self, app_id: str, shard_id: int, shard_count: int) -> Optional[Dict[str, Any]]:
+        """
+        读取保存的会话状态
+
+        Returns:
+          包含 session_id 和 last_seq 的 dict，没有可用的状态时返回 None
+        """
+        raise NotImplementedError
+
+    def save(self, app_id: str, shard_id: int, shard_count: int, session_id: str, last_seq: int) -> None:
+        """在内存中记录会话状态，在`flush`时写入"""
+        raise NotImplementedError
+
+    def clear(self, app_id: str, shard_id: int, shard_count: int) -> None:
+        """会话已失效，在内存中删除保存的状态，在`flush`时写入"""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """将内存中的变化写入存储"""
+
+
+class FileSessionStore(SessionStore):
+    """
+    将会话状态保存在 JSON 文件中
+
+    写入时先读取文件中其他 key 的最新内容再合并，读取、合并和替换文件期间持有 <path>.lock 的文件锁（fcntl.flock），
+    多个进程可以共用一个文件（分片不重叠时）。没有 fcntl 的平台（Windows）上不加文件锁，每个进程需要使用单独的文件。
+    """
+
+    def __init__(self, path: str = "botpy_sessions.json", flush_interval: float = 1.0, max_age: float = None):
+        """
+        Args:
+          path (str): 文件路径。. Defaults to "botpy_sessions.json"
+          flush_interval (float): seq 变化时写入文件的最小间隔（秒）。. Defaults to 1.0
+          max_age (float): 超过该时间（秒）未更新的状态不再用于 resume。. Defaults to None（不限制）
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self._sessions: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty: Set[str] = set()
+        # _lock 只保护内存中的状态，事件循环不会等待文件读写；_flush_lock 保证进程内的写入按顺序进行
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @staticmethod
+    def _key(app_id: str, shard_id: int, shard_count: int) -> str:
+        return "{}:{}/{}".format(app_id, shard_id, shard_count)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "rb") as f:
+                data = codec.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            _log.warning("[botpy] 读取会话状态文件 %s 失败: %s", self.path, e)
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @property
+    def sessions(self) -> Dict[str, Dict[str, Any]]:
+        if self._sessions is None:
+            self._sessions = self._read()
+        return self._sessions
+
+    def load(self, app_id: str, shard_id: int, shard_count: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self.sessions.get(self._key(app_id, shard_id, shard_count))
+        if not state or not state.get("session_id"):
+            return None
+        if self.max_age is not None and time.time() - state.get("updated_at", 0) > self.max_age:
+            return None
+        return state
+
+    def save(self, app_id: str, shard_id: int, shard_count: int, session_id: str, last_seq: int) -> None:
+        key = self._key(app_id, shard_id, shard_count)
+        with self._lock:
+            self.sessions[key] = {"session_id": session_id, "last_seq": last_seq, "updated_at": time.time()}
+            self._dirty.add(key)
+
+    def clear(self, app_id: str, shard_id: int, shard_count: int) -> None:
+        key = self._key(app_id, shard_id, shard_count)
+        with self._lock:
+            if self.sessions.pop(key, None) is not None:
+                self._dirty.add(key)
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                dirty, self._dirty = self._dirty, set()
+                changes = {key: self.sessions.get(key) for key in dirty}
+            try:
+                with self._file_lock():
+                    data = self._read()
+                    for key, state in changes.items():
+                        if state is None:
+                            data.pop(key, None)
+                        else:
+                            data[key] = state
+                    tmp = "{}.{}.tmp".format(self.path, os.getpid())
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        f.write(codec.dumps(data))
+                    os.replace(tmp, self.path)
+            except OSError as e:
+                _log.warning("[botpy] 写入会话状态文件 %s 失败: %s", self.path, e)
+                # 下次 flush 时重试
+                with self._lock:
+                    self._dirty |= dirty
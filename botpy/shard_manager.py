@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+多进程运行分片
+
+`Client`在一个事件循环中运行 /gateway/bot 返回的所有分片，事件的解析和处理只能用到一个 CPU 核心。
+`ShardManager`将分片分配到多个子进程，每个子进程运行自己的 Client 和 ConnectionSession：
+
+- 主进程获取一次 access_token 和分片信息，传给所有子进程，子进程启动时不再各自获取。
+  主进程不会把之后刷新的 token 发给子进程，token 到期前每个子进程各自刷新，N 个子进程会请求 N 次。
+- 所有子进程共用`IdentifyLimiter`，每 5 秒最多发起 max_concurrency 次鉴权（identify），resume 不受限制。
+- 子进程退出后按指数退避重新启动，Client 设置了 session_store 时重启后通过其中保存的状态 resume。
+  子进程共用 Client 的会话状态文件，FileSessionStore 写入时加文件锁；没有 fcntl 的平台上每个子进程改用单独的文件。
+
+使用方式（子进程以 spawn 方式启动，client_factory 需要是可以 pickle 的模块级函数）:
+
+    def create_client():
+        return MyClient(intents=botpy.Intents(public_guild_messages=True), session_store="botpy_sessions.json")
+
+    if __name__ == "__main__":
+        ShardManager(create_client, appid="...", secret="...", processes=4).run()
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable, Dict, List, Optional
+
+from . import logging, session_store
+from .api import BotAPI
+from .client import Client
+from .http import BotHttp
+from .robot import Token
+from .session_store import FileSessionStore
+
+_log = logging.get_logger()
+
+# 每 IDENTIFY_WINDOW 秒内最多发起 max_concurrency 次鉴权
+IDENTIFY_WINDOW = 5.0
+
+
+class IdentifyLimiter:
+    """跨进程的鉴权限频，记录最近 max_concurrency 次鉴权的时间，每个名额间隔 interval 秒才能再次使用"""
+
+    def __init__(self, max_concurrency: int, interval: float = IDENTIFY_WINDOW, context=None):
+        """
+        Args:
+          max_concurrency (int): interval 内最多的鉴权次数
+          interval (float): 限频的时间窗口（秒）。. Defaults to IDENTIFY_WINDOW
+          context: multiprocessing 的 context，需要与启动子进程的 context 一致。. Defaults to spawn
+        """
+        context = context or multiprocessing.get_context("spawn")
+        self.interval = interval
+        self._lock = context.Lock()
+        self._slots = context.Array("d", max(1, max_concurrency), lock=False)
+
+    def reserve(self) -> float:
+        """占用一个名额，返回需要等待的时间（秒）"""
+        with self._lock:
+            now = time.time()
+            index = min(range(len(self._slots)), key=self._slots.__getitem__)
+            start = max(now, self._slots[index] + self.interval)
+            self._slots[index] = start
+        return start - now
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            _log.info("[botpy] 等待鉴权限频 %.1fs", delay)
+            await asyncio.sleep(delay)
+
+
+def split_shards(shard_ids: List[int], processes: int) -> List[List[int]]:
+    """将分片按连续区间分配到 processes 个进程，返回每个进程的分片列表（不包括空列表）"""
+    processes = max(1, min(processes, len(shard_ids)))
+    size, extra = divmod(len(shard_ids), processes)
+    groups, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(shard_ids[start:end])
+        start = end
+    return [group for group in groups if group]
+
+
+def _run_worker(client_factory, appid, secret, token, shard_ids, shard_count, identify_limiter):
+    """子进程入口，token 为启动时主进程的 token，到期前由子进程的 Client 自行刷新"""
+    client = client_factory()
+    client.identify_limiter = identify_limiter
+    store = client.session_store
+    if isinstance(store, FileSessionStore) and session_store.fcntl is None:
+        # 不能加文件锁时按分片区间使用单独的文件，重启后的子进程仍然使用同一个文件
+        root, ext = os.path.splitext(store.path)
+        path = "{}.{}-{}{}".format(root, shard_ids[0], shard_ids[-1], ext)
+        client.session_store = FileSessionStore(path, flush_interval=store.flush_interval, max_age=store.max_age)
+    client.run(appid=appid, secret=secret, shard_ids=shard_ids, shard_count=shard_count, token=token)
+
+
+class _Worker:
+    def __init__(self, index: int, shard_ids: List[int]):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.restart_at: Optional[float] = None
+        self.backoff = 0.0
+
+
+class ShardManager:
+    """在多个子进程中运行分片，并在子进程退出后重新启动"""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Client],
+        appid: str,
+        secret: str,
+        processes: int = None,
+        shard_count: int = None,
+        restart_delay: float = 1.0,
+        max_restart_delay: float = 60.0,
+        stable_after: float = 60.0,
+        poll_interval: float = 0.5,
+    ):
+        """
+        Args:
+          client_factory: 在子进程中创建 Client 的函数，需要可以 pickle
+          appid (str): 机器人 appid
+          secret (str): 机器人密钥
+          processes (int): 子进程数，不超过分片数。. Defaults to None（CPU 核心数）
+          shard_count (int): 分片总数。. Defaults to None（使用 /gateway/bot 返回的分片数）
+          restart_delay (float): 子进程退出后重新启动的初始等待时间（秒），连续退出时加倍。. Defaults to 1.0
+          max_restart_delay (float): 重新启动的最大等待时间（秒）。. Defaults to 60.0
+          stable_after (float): 子进程运行超过该时间（秒）后退出时，等待时间重置为 restart_delay。. Defaults to 60.0
+          poll_interval (float): 检查子进程状态的间隔（秒）。. Defaults to 0.5
+        """
+        self.client_factory = client_factory
+        self.appid = appid
+        self.secret = secret
+        self.processes = processes or os.cpu_count() or 1
+        self.shard_count = shard_count
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.poll_interval = poll_interval
+
+        self.token: Optional[Token] = None
+        self.identify_limiter: Optional[IdentifyLimiter] = None
+        self.workers: List[_Worker] = []
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = False
+
+    async def prepare(self) -> None:
+        """获取 access_token 和分片信息，并分配各子进程运行的分片"""
+        http = BotHttp(timeout=20, app_id=self.appid, secret=self.secret)
+        token = Token(self.appid, self.secret)
+        try:
+            await http.login(token)
+            gateway = await BotAPI(http).get_ws_url()
+        finally:
+            await http.close()
+        if self.shard_count is None:
+            self.shard_count = gateway["shards"]
+        max_concurrency = gateway["session_start_limit"]["max_concurrency"]
+        self.identify_limiter = IdentifyLimiter(max_concurrency, context=self._context)
+        # 只传递 token 的值，Token 中的 task 和 future 不能跨进程
+        self.token = Token(self.appid, self.secret)
+        self.token.access_token, self.token.expires_in = token.access_token, token.expires_in
+        groups = split_shards(list(range(self.shard_count)), self.processes)
+        self.workers = [_Worker(i, group) for i, group in enumerate(groups)]
+        _log.info("[botpy] 分片数: %s, 进程数: %s, 最大并发鉴权数: %s", self.shard_count, len(groups), max_concurrency)
+
+    def start(self) -> None:
+        """启动所有子进程，需要先调用`prepare`"""
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def _spawn(self, worker: _Worker) -> None:
+        worker.process = self._context.Process(
+            target=_run_worker,
+            args=(
+                self.client_factory,
+                self.appid,
+                self.secret,
+                self.token,
+                worker.shard_ids,
+                self.shard_count,
+                self.identify_limiter,
+            ),
+            name="botpy-shard-{}".format(worker.index),
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        _log.info("[botpy] 子进程 %s(pid %s) 启动, 分片: %s", worker.index, worker.process.pid, worker.shard_ids)
+
+    def check(self) -> None:
+        """检查子进程状态，重新启动已退出的子进程"""
+        now = time.monotonic()
+        for worker in self.workers:
+            if self._stopping or worker.process is None or worker.process.is_alive():
+                continue
+            if worker.restart_at is None:
+                if now - worker.started_at >= self.stable_after:
+                    worker.backoff = self.restart_delay
+                else:
+                    worker.backoff = min(max(worker.backoff * 2, self.restart_delay), self.max_restart_delay)
+                worker.restart_at = now + worker.backoff
+                _log.warning(
+                    "[botpy] 子进程 %s 退出, 返回码: %s, %.1fs 后重新启动",
+                    worker.index,
+                    worker.process.exitcode,
+                    worker.backoff,
+                )
+            elif now >= worker.restart_at:
+                worker.restarts += 1
+                self._spawn(worker)
+
+    def stop(self, timeout: float = 10) -> None:
+        """停止所有子进程"""
+        self._stopping = True
+        processes = [w.process for w in self.workers if w.process is not None and w.process.is_alive()]
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def status(self) -> List[Dict]:
+        return [
+            {
+                "index": w.index,
+                "shard_ids": w.shard_ids,
+                "pid": w.process.pid if w.process is not None else None,
+                "alive": w.process is not None and w.process.is_alive(),
+                "restarts": w.restarts,
+            }
+            for w in self.workers
+        ]
+
+    def run(self) -> None:
+        """
+        启动子进程并持续检查，收到 SIGINT / SIGTERM 后停止所有子进程
+
+        注意:
+          这个函数是阻塞的，需要在主线程中调用
+        """
+
+        def _stop(signum, frame):
+            self._stopping = True
+
+        asyncio.run(self.prepare())
+        previous = {sig: signal.signal(sig, _stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.start()
+            while not self._stopping:
+                self.check()
+                time.sleep(self.poll_interval)
+        finally:
+            _log.info("[botpy] 停止所有子进程...")
+            self.stop()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
@@ -13,7 +13,7 @@ setup(
     # 项目主页
     url="https://github.com/tencent-connect/botpy",
     # 你要安装的包，通过 setuptools.find_packages 找到当前目录下有哪些包
-    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
+    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests", "benchmarks", "benchmarks.*"]),
     # 执照
     license="Tencent",
     # 安装依赖
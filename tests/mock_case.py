@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from typing import Any, Callable, Dict
+
+from botpy.ext.mock_server import MockServer
+
+
+class MockServerCase(unittest.TestCase):
+    """
+    启动 MockServer 的测试基类
+
+    每个用例使用新的事件循环，结束时停止 MockServer 并取消残留的 task。
+    子类通过 server_options 设置 MockServer 的参数（如 shards、max_concurrency）。
+    """
+
+    server_options: Dict[str, Any] = {}
+
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = MockServer(app_id="1000", secret="secret", **self.server_options)
+        self.loop.run_until_complete(self.server.start())
+
+    def tearDown(self) -> None:
+        self.loop.run_until_complete(self.server.stop())
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    async def wait_for(self, predicate: Callable[[], Any], timeout: float = 10) -> None:
+        """每 10ms 检查一次，timeout 秒内 predicate 没有返回真值时用例失败"""
+        for _ in range(int(timeout * 100)):
+            if predicate():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("condition not met")
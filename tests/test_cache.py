@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from botpy.api import BotAPI
+from botpy.cache import MediaCache, MsgSeqAllocator, ResponseCache, TTLCache
+from botpy.connection import ConnectionState
+
+
+class _FakeHttp:
+    def __init__(self):
+        self.calls = 0
+
+    async def request(self, route, **kwargs):
+        self.calls += 1
+        return {"id": route.parameters.get("guild_id") or route.parameters.get("channel_id"), "calls": self.calls}
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.http = _FakeHttp()
+        self.api = BotAPI(self.http)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def test_lru(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1, 10)
+        cache.set("b", 2, 10)
+        cache.get("a")
+        cache.set("c", 3, 10)
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+
+    def test_ttl(self):
+        cache = TTLCache()
+        cache.set("a", 1, -1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_cached_read(self):
+        self.loop.run_until_complete(self.api.get_guild("1"))
+        self.loop.run_until_complete(self.api.get_guild("1"))
+        self.assertEqual(1, self.http.calls)
+        self.assertEqual(1, self.api.cache.hits)
+
+    def test_invalidate_on_event(self):
+        state = ConnectionState(lambda *args: None, self.api)
+        self.loop.run_until_complete(self.api.get_channel("10"))
+        state.parsers["channel_update"]({"id": "event", "d": {"id": "10", "guild_id": "1"}})
+        result = self.loop.run_until_complete(self.api.get_channel("10"))
+        self.assertEqual(2, result["calls"])
+
+        self.loop.run_until_complete(self.api.get_guild_member("1", "2"))
+        state.parsers["guild_member_remove"]({"id": "event", "d": {"guild_id": "1", "user": {"id": "2"}}})
+        self.loop.run_until_complete(self.api.get_guild_member("1", "2"))
+        self.assertEqual(4, self.http.calls)
+
+    def test_invalidate_after_write(self):
+        class _Http(_FakeHttp):
+            async def request(self, route, **kwargs):
+                if route.method != "GET":
+                    await asyncio.sleep(0.01)
+                return await super().request(route, **kwargs)
+
+        api = BotAPI(_Http())
+
+        async def run():
+            # 写入过程中的读取结果是修改前的数据，写入完成后不能继续使用
+            write = asyncio.ensure_future(api.update_guild_role("1", "2", name="role"))
+            await asyncio.sleep(0)
+            await api.get_guild_roles("1")
+            await write
+            return await api.get_guild_roles("1")
+
+        self.assertEqual(3, self.loop.run_until_complete(run())["calls"])
+
+    def test_unrelated_invalidation(self):
+        cache = ResponseCache()
+        generation = cache.generation
+        # 请求期间其他 key 失效不影响结果的缓存，自己的 key 失效时丢弃
+        cache.invalidate_member("1", "2")
+        cache.set("guild", {"id": "1"}, "1", generation=generation)
+        cache.invalidate_guild("2")
+        cache.set("guild", {"id": "2"}, "2", generation=generation)
+        self.assertEqual({"id": "1"}, cache.get("guild", "1"))
+        self.assertIsNone(cache.get("guild", "2"))
+
+        generation = cache.generation
+        cache.clear()
+        cache.set("guild", {"id": "1"}, "1", generation=generation)
+        self.assertIsNone(cache.get("guild", "1"))
+
+    def test_events_without_api(self):
+        state = ConnectionState(lambda *args: None, None)
+        state.parsers["guild_member_update"]({"id": "event", "d": {"guild_id": "1", "user": {"id": "2"}}})
+        state.parsers["channel_delete"]({"id": "event", "d": {"id": "10", "guild_id": "1"}})
+
+    def test_disabled(self):
+        api = BotAPI(self.http, cache=ResponseCache(maxsize=0))
+        self.loop.run_until_complete(api.get_guild("1"))
+        self.loop.run_until_complete(api.get_guild("1"))
+        self.assertEqual(2, self.http.calls)
+
+
+class MsgSeqAllocatorTestCase(unittest.TestCase):
+    def test_allocate(self):
+        allocator = MsgSeqAllocator()
+        self.assertEqual([1, 2, 3], [allocator.allocate("a") for _ in range(3)])
+        self.assertEqual(1, allocator.allocate("b"))
+        allocator.reserve("a", 10)
+        allocator.reserve("a", 5)
+        self.assertEqual(11, allocator.allocate("a"))
+
+    def test_injected(self):
+        allocator = MsgSeqAllocator(maxsize=10)
+        self.assertIs(allocator, BotAPI(None, msg_seq_allocator=allocator).msg_seq_allocator)
+
+    def test_expire(self):
+        allocator = MsgSeqAllocator(ttl=-1)
+        allocator.allocate("a")
+        self.assertEqual(1, allocator.allocate("a"))
+        self.assertEqual(0, len(allocator))
+
+    def test_concurrent_replies(self):
+        sent = []
+
+        class _Http(_FakeHttp):
+            async def request(self, route, **kwargs):
+                await asyncio.sleep(0)
+                sent.append(kwargs["json"]["msg_seq"])
+
+        api = BotAPI(_Http())
+
+        async def run():
+            replies = [api.post_group_message("group", content=str(i), msg_id="m1") for i in range(5)]
+            await asyncio.gather(*replies, api.post_c2c_message("user", content="proactive"))
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+        loop.close()
+        self.assertEqual([1, 1, 2, 3, 4, 5], sorted(sent))
+
+
+class MediaCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.uploads = []
+
+        uploads = self.uploads
+
+        class _Http(_FakeHttp):
+            async def request(self, route, **kwargs):
+                await asyncio.sleep(0)
+                uploads.append(kwargs["json"]["url"])
+                return {"file_uuid": str(len(uploads)), "file_info": "info-%s" % len(uploads), "ttl": 3600}
+
+        self.api = BotAPI(_Http())
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def test_single_flight(self):
+        async def run():
+            uploads = [self.api.post_group_file("group", 1, "http://a.png") for _ in range(5)]
+            return await asyncio.gather(*uploads)
+
+        results = self.loop.run_until_complete(run())
+        self.assertEqual(["http://a.png"], self.uploads)
+        self.assertEqual({"info-1"}, {r["file_info"] for r in results})
+        self.assertEqual({"size": 1, "inflight": 0, "hits": 0, "misses": 1, "collapsed": 4, "hit_ratio": 0.8},
+                         self.api.media_cache.to_dict())
+
+    def test_scope(self):
+        run = self.loop.run_until_complete
+        run(self.api.post_group_file("group", 1, "http://a.png"))
+        cached = run(self.api.post_group_file("group", 1, "http://a.png"))
+        self.assertEqual("info-1", cached["file_info"])
+        self.assertLessEqual(cached["ttl"], 3600)
+        run(self.api.post_group_file("other", 1, "http://a.png"))
+        run(self.api.post_c2c_file("group", 1, "http://a.png"))
+        run(self.api.post_group_file("group", 1, "http://a.png", srv_send_msg=True))
+        self.assertEqual(4, len(self.uploads))
+        self.assertEqual(1, self.api.media_cache.hits)
+
+    def test_injected_disabled(self):
+        media_cache = MediaCache(maxsize=0)
+        api = BotAPI(self.api._http, media_cache=media_cache)
+        self.assertIs(media_cache, api.media_cache)
+        self.loop.run_until_complete(api.post_group_file("group", 1, "http://a.png"))
+        self.loop.run_until_complete(api.post_group_file("group", 1, "http://a.png"))
+        self.assertEqual(2, len(self.uploads))
+
+    def test_shared_between_targets(self):
+        self.api.media_cache = MediaCache(per_target=False)
+        self.loop.run_until_complete(self.api.post_group_file("group", 1, "http://a.png"))
+        self.loop.run_until_complete(self.api.post_group_file("other", 1, "http://a.png"))
+        self.assertEqual(1, len(self.uploads))
+
+
+if __name__ == "__main__":
+    unittest.main()
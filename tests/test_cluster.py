@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import botpy
+from botpy.cluster import ClusterNode, SQLiteShardRegistry
+
+from .mock_case import MockServerCase
+
+
+class SQLiteShardRegistryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cluster.db")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_leases(self):
+        a, b = SQLiteShardRegistry(self.path), SQLiteShardRegistry(self.path)
+        self.assertTrue(a.claim("a", 0, ttl=0.2))
+        self.assertFalse(b.claim("b", 0, ttl=0.2))
+        self.assertTrue(a.claim("a", 0, ttl=0.2))
+        self.assertEqual([0], a.renew("a", [0, 1], ttl=0.2))
+        self.assertEqual([], b.renew("b", [0], ttl=0.2))
+
+        # 租约过期后其他节点可以取得
+        time.sleep(0.3)
+        self.assertTrue(b.claim("b", 0, ttl=10))
+        self.assertEqual([], a.renew("a", [0], ttl=10))
+        a.release("a", 0)
+        self.assertEqual("b", a.leases()[0]["owner"])
+        b.release("b", 0)
+        self.assertEqual({}, a.leases())
+
+    def test_nodes_and_sessions(self):
+        registry = SQLiteShardRegistry(self.path, flush_interval=60)
+        self.assertEqual(["a"], registry.heartbeat("a", ttl=0.2))
+        self.assertEqual(["a", "b"], registry.heartbeat("b", ttl=10))
+        time.sleep(0.3)
+        self.assertEqual(["b"], registry.heartbeat("b", ttl=10))
+
+        # save 只记录在内存中，不等待数据库
+        registry.save("1000", 0, 2, "session", 1)
+        registry.save("1000", 0, 2, "session", 7)
+        self.assertEqual(7, registry.load("1000", 0, 2)["last_seq"])
+        self.assertIsNone(SQLiteShardRegistry(self.path).load("1000", 0, 2))
+        registry.flush()
+        self.assertEqual(7, SQLiteShardRegistry(self.path).load("1000", 0, 2)["last_seq"])
+        registry.clear("1000", 0, 2)
+        registry.flush()
+        self.assertIsNone(SQLiteShardRegistry(self.path).load("1000", 0, 2))
+
+    def test_save_while_locked(self):
+        registry = SQLiteShardRegistry(self.path)
+        registry.leases()
+        started = time.monotonic()
+        # 数据库操作进行中时（如后台线程正在续约）保存会话状态不会阻塞
+        with registry._lock:
+            thread = threading.Thread(target=registry.save, args=("1000", 0, 1, "session", 3))
+            thread.start()
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+        self.assertLess(time.monotonic() - started, 1)
+        registry.flush()
+        self.assertEqual(3, SQLiteShardRegistry(self.path).load("1000", 0, 1)["last_seq"])
+
+
+class ClusterNodeTestCase(MockServerCase):
+    server_options = {"shards": 2, "max_concurrency": 10}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cluster.db")
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.tmp.cleanup()
+
+    def _node(self, node_id: str) -> ClusterNode:
+        client = botpy.Client(intents=botpy.Intents(guilds=True), bot_log=None, ext_handlers=False)
+        registry = SQLiteShardRegistry(self.path)
+        return ClusterNode(client, registry, node_id=node_id, lease_ttl=0.6, renew_interval=0.1, reconnect_delay=0)
+
+    def _owners(self):
+        return {shard_id: lease["owner"] for shard_id, lease in SQLiteShardRegistry(self.path).leases().items()}
+
+    def test_rebalance_and_takeover(self):
+        async def run():
+            a, b = self._node("a"), self._node("b")
+            task_a = asyncio.ensure_future(a.start("1000", "secret"))
+            await self.wait_for(lambda: len(self.server.connected_sessions) == 2)
+            self.assertEqual({0, 1}, a.shards)
+
+            # 新节点加入后分片 1 交给 b，b 使用 a 保存的会话状态 resume
+            asyncio.ensure_future(b.start("1000", "secret"))
+            await self.wait_for(lambda: b.shards == {1} and a.shards == {0})
+            await self.wait_for(lambda: len(self.server.connected_sessions) == 2)
+            self.assertEqual({0: "a", 1: "b"}, self._owners())
+
+            # a 故障：不释放租约，过期后由 b 接管
+            task_a.cancel()
+            await self.wait_for(lambda: b.shards == {0, 1})
+            await self.wait_for(lambda: len(self.server.connected_sessions) == 2)
+            self.assertEqual({0: "b", 1: "b"}, self._owners())
+            await a.client.close()
+
+            await b.close()
+            self.assertEqual({}, self._owners())
+
+        self.loop.run_until_complete(run())
+        # 只有最初的两次鉴权，之后的分片转移都通过 resume 完成
+        self.assertEqual(2, len(self.server.sessions))
+        self.assertEqual([1, 1], sorted(s.resumed for s in self.server.sessions.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
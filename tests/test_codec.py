@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+
+from botpy import codec
+
+
+class CodecTestCase(unittest.TestCase):
+    def tearDown(self) -> None:
+        codec.set_backend()
+
+    def test_backends(self):
+        frame = '{"op":0,"s":1,"t":"AT_MESSAGE_CREATE","d":{"content":"你好"}}'
+        for name in codec.BACKENDS:
+            try:
+                codec.set_backend(name)
+            except ImportError:
+                continue
+            self.assertEqual(name, codec.backend)
+            self.assertEqual("你好", codec.loads(frame)["d"]["content"])
+            self.assertEqual("你好", codec.loads(frame.encode("utf-8"))["d"]["content"])
+            self.assertEqual({"op": 1, "d": None}, codec.loads(codec.dumps({"op": 1, "d": None})))
+
+    def test_decode_error(self):
+        with self.assertRaises(ValueError):
+            codec.loads(b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
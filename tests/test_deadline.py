@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import botpy
+from botpy import deadline
+from botpy.errors import DeadlineExceededError
+from botpy.retry import RetryPolicy
+
+from .mock_case import MockServerCase
+
+
+class FromTimestampTestCase(unittest.TestCase):
+    def test_from_timestamp(self):
+        now = datetime.now(timezone(timedelta(hours=8)))
+        fresh = deadline.from_timestamp(now.isoformat())
+        self.assertAlmostEqual(time.monotonic() + 300, fresh, delta=2)
+        older = deadline.from_timestamp((now - timedelta(minutes=4)).isoformat())
+        self.assertAlmostEqual(time.monotonic() + 60, older, delta=2)
+        # 超过有效时间时视为本地时钟偏快，不设置截止时间
+        with self.assertLogs("botpy", "WARNING"):
+            self.assertIsNone(deadline.from_timestamp((now - timedelta(minutes=6)).isoformat()))
+        self.assertAlmostEqual(time.monotonic() + 10, deadline.from_timestamp(str(int(time.time())), 10), delta=2)
+        self.assertIsNone(deadline.from_timestamp("not a time"))
+        self.assertIsNone(deadline.from_timestamp(None))
+
+    def test_nested_keeps_earliest(self):
+        with deadline.use_deadline(timeout=1) as outer:
+            with deadline.use_deadline(timeout=60) as inner:
+                self.assertEqual(outer, inner)
+            with deadline.use_reply_deadline(outer - 0.5):
+                self.assertEqual(outer, deadline.current())
+                self.assertEqual(outer - 0.5, deadline.current(passive=True))
+        self.assertIsNone(deadline.current())
+
+
+class RequestDeadlineTestCase(MockServerCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.guild_id = self.server.add_guild()["id"]
+
+    def _run(self, func, **kwargs):
+        async def run():
+            http = botpy.BotHttp(timeout=5, app_id="1000", secret="secret", **kwargs)
+            try:
+                await http.login(http._token)
+                return await func(botpy.BotAPI(http)), http
+            finally:
+                await http.close()
+
+        return self.loop.run_until_complete(run())
+
+    def _requests(self, path):
+        return [r for r in self.server.requests if r["path"] == path]
+
+    def test_no_retry_past_deadline(self):
+        self.server.inject_error("GET", "/guilds/{guild_id}/members", status=503, times=5)
+
+        async def call(api):
+            with deadline.use_deadline(timeout=0.2):
+                with self.assertRaises(DeadlineExceededError):
+                    await api.get_guild_members(self.guild_id)
+
+        started = time.monotonic()
+        policy = RetryPolicy(max_retries=5, backoff_base=0.5, jitter=0)
+        _, http = self._run(call, retry_policy=policy, coalesce_get=False)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(1, len(self._requests("/guilds/{guild_id}/members")))
+        self.assertEqual(1, http.metrics.to_dict()["GET /guilds/{guild_id}/members"]["deadline_exceeded"])
+
+    def test_reply_deadline_only_for_passive(self):
+        async def call(api):
+            with deadline.use_reply_deadline(time.monotonic() - 1):
+                with self.assertRaises(DeadlineExceededError):
+                    await api.post_group_message("group", content="late", msg_id="1")
+                return await api.post_group_message("group", content="proactive")
+
+        self._run(call)
+        self.assertEqual(["proactive"], [m["content"] for m in self.server.messages])
+
+    def test_per_call_timeout(self):
+        self.server.latency = 0.3
+
+        async def call(api):
+            with self.assertRaises(asyncio.TimeoutError):
+                await api.get_guild_members(self.guild_id, timeout=0.05)
+            return await api.get_guild_members(self.guild_id, timeout=2)
+
+        members, _ = self._run(call, retry_policy=RetryPolicy(max_retries=0))
+        self.assertEqual([], members)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import unittest
+
+from botpy.api import BotAPI
+from botpy.connection import BACKPRESSURE_SHED, ConnectionSession
+from botpy.gateway import BotWebSocket
+from botpy.robot import Token
+
+from .mock_case import MockServerCase
+
+
+def _frame(seq):
+    return json.dumps({"op": 0, "s": seq, "t": "GUILD_UPDATE", "d": {"id": str(seq), "padding": "x" * 300}})
+
+
+def _ws(loop, **kwargs) -> BotWebSocket:
+    connection = ConnectionSession(1, None, lambda *args: None, loop=loop, **kwargs)
+    ws = BotWebSocket({"session_id": "", "last_seq": 0, "shards": {"shard_id": 0, "shard_count": 1}}, connection)
+    ws._queue = asyncio.Queue(connection.event_queue_size)
+    return ws
+
+
+class EventQueueTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _ws(self, **kwargs) -> BotWebSocket:
+        return _ws(self.loop, **kwargs)
+
+    def test_shed_oldest(self):
+        ws = self._ws(event_queue_size=2, backpressure=BACKPRESSURE_SHED)
+
+        async def run():
+            for seq in range(1, 4):
+                await ws._on_frame(None, _frame(seq))
+
+        self.loop.run_until_complete(run())
+        self.assertEqual([_frame(2), _frame(3)], [ws._queue.get_nowait() for _ in range(2)])
+        self.assertEqual(1, ws._metrics.shed_events)
+        self.assertEqual(2, ws._metrics.queue_peak)
+
+    def test_invalid_backpressure(self):
+        with self.assertRaises(ValueError):
+            self._ws(backpressure="drop")
+
+
+class ReceiveLoopTestCase(MockServerCase):
+    server_options = {"heartbeat_interval": 50, "max_concurrency": 10}
+
+    def test_pause_stops_reading(self):
+        server = self.server
+        ws = _ws(self.loop, event_queue_size=1, api=BotAPI(None))
+        ws._session.update({"intent": 1, "token": Token("1000", "secret"), "url": None})
+        handled, release = [], asyncio.Event()
+        handle_message = ws._handle_message
+
+        async def blocking_handle_message(conn, msg):
+            # 第一个 GUILD_UPDATE 处理完之前阻塞消费者
+            if msg.get("t") == "GUILD_UPDATE" and not release.is_set():
+                await release.wait()
+            handled.append(msg.get("t"))
+            await handle_message(conn, msg)
+
+        ws._handle_message = blocking_handle_message
+
+        async def run():
+            ws._session["url"] = server.gateway_url
+            receiver = asyncio.ensure_future(ws.ws_connect())
+            try:
+                session = (await server.wait_ready())[0]
+                await self.wait_for(lambda: ws._metrics.acks >= 1)
+                for seq in range(3):
+                    await session.send("GUILD_UPDATE", {"id": str(seq)})
+                await self.wait_for(lambda: ws._receive_paused)
+
+                # 暂停期间接收循环不读取任何消息，ACK 留在连接中，也不计为未收到
+                acks, heartbeats = ws._metrics.acks, session.heartbeats
+                await asyncio.sleep(0.3)
+                self.assertTrue(ws._receive_paused)
+                self.assertEqual(acks, ws._metrics.acks)
+                self.assertGreater(session.heartbeats, heartbeats)
+                self.assertEqual(0, ws._metrics.missed_acks)
+                self.assertTrue(session.connected)
+
+                release.set()
+                await self.wait_for(lambda: ws._session["last_seq"] == 4 and ws._metrics.acks > acks)
+                self.assertFalse(ws._receive_paused)
+            finally:
+                receiver.cancel()
+                await asyncio.gather(receiver, return_exceptions=True)
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(["READY", "GUILD_UPDATE", "GUILD_UPDATE", "GUILD_UPDATE"], handled)
+        self.assertGreaterEqual(ws._metrics.backpressure_pauses, 1)
+        self.assertEqual(0, ws._metrics.zombie_reconnects)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+import unittest
+
+from botpy.http import RequestCoalescer, _add_file, _FormData
+
+
+class _BodyWriter:
+    def __init__(self):
+        self.chunks = []
+
+    async def write(self, chunk):
+        self.chunks.append(bytes(chunk))
+
+    def body(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+class RequestCoalescerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def test_collapse(self):
+        coalescer = RequestCoalescer()
+        calls = []
+
+        async def fetch(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return {"id": key}
+
+        async def run():
+            return await asyncio.gather(
+                *[coalescer.run(key, lambda key=key: fetch(key)) for key in ("1", "1", "1", "2")]
+            )
+
+        result = self.loop.run_until_complete(run())
+        self.assertEqual(["1", "2"], calls)
+        self.assertEqual([{"id": "1"}, {"id": "1"}, {"id": "1"}, {"id": "2"}], result)
+        self.assertEqual({"requests": 4, "collapsed": 2, "inflight": 0}, coalescer.to_dict())
+
+    def test_error_shared(self):
+        coalescer = RequestCoalescer()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("failed")
+
+        async def run():
+            return await asyncio.gather(*[coalescer.run("1", fetch) for _ in range(3)], return_exceptions=True)
+
+        result = self.loop.run_until_complete(run())
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in result))
+
+
+class FormDataTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        fd, self.path = tempfile.mkstemp(suffix=".png")
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(300 * 1024))
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        os.remove(self.path)
+
+    async def _render(self, form: _FormData) -> bytes:
+        writer = _BodyWriter()
+        await form().write(writer)
+        return writer.body()
+
+    def test_stream_path(self):
+        async def run():
+            form = _FormData()
+            form.add_field("content", "hello")
+            await _add_file(form, "file_image", self.path)
+            first = await self._render(form)
+            second = await self._render(form)
+            stream = form._opened[0]
+            form.close()
+            return first, second, stream
+
+        first, second, stream = self.loop.run_until_complete(run())
+        with open(self.path, "rb") as f:
+            self.assertIn(f.read(), first)
+        self.assertIn(os.path.basename(self.path).encode(), first)
+        self.assertEqual(first, second)
+        self.assertTrue(stream.closed)
+
+    def test_keep_user_stream_open(self):
+        async def run():
+            with open(self.path, "rb") as f:
+                form = _FormData()
+                await _add_file(form, "file_image", f)
+                await self._render(form)
+                form.close()
+                return f.closed
+
+        self.assertFalse(self.loop.run_until_complete(run()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import logging.handlers
+import queue
+import unittest
+
+from botpy.logging import BoundedQueueHandler
+
+
+class _SlowHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+
+class QueueHandlerTestCase(unittest.TestCase):
+    def _record(self, msg):
+        return logging.LogRecord("botpy", logging.INFO, __file__, 1, msg, None, None)
+
+    def test_drop_new(self):
+        handler = BoundedQueueHandler(queue.Queue(2))
+        for i in range(5):
+            handler.handle(self._record(str(i)))
+        self.assertEqual({"queued": 2, "maxsize": 2, "enqueued": 2, "dropped": 3}, handler.stats())
+        self.assertEqual("0", handler.queue.get_nowait().getMessage())
+
+    def test_drop_old(self):
+        handler = BoundedQueueHandler(queue.Queue(2), overflow="drop_old")
+        for i in range(5):
+            handler.handle(self._record(str(i)))
+        self.assertEqual(3, handler.stats()["dropped"])
+        self.assertEqual(["3", "4"], [handler.queue.get_nowait().getMessage() for _ in range(2)])
+
+    def test_listener(self):
+        target = _SlowHandler()
+        handler = BoundedQueueHandler(queue.Queue(100))
+        listener = logging.handlers.QueueListener(handler.queue, target)
+        listener.start()
+        for i in range(10):
+            handler.handle(self._record(str(i)))
+        listener.stop()
+        self.assertEqual([str(i) for i in range(10)], target.records)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            BoundedQueueHandler(queue.Queue(1), overflow="unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+
+from botpy.http import Route
+from botpy.metrics import GatewayMetrics, Histogram, HttpMetrics
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_quantile(self):
+        histogram = Histogram(buckets=(0.1, 0.2, 0.5, 1.0))
+        for value in [0.05] * 50 + [0.15] * 45 + [0.8] * 5:
+            histogram.observe(value)
+        self.assertEqual(100, histogram.count)
+        self.assertAlmostEqual(0.1, histogram.quantile(0.5))
+        self.assertAlmostEqual(0.2, histogram.quantile(0.95))
+        self.assertTrue(0.5 < histogram.quantile(0.99) <= 1.0)
+        self.assertEqual(0.0, Histogram().quantile(0.5))
+
+    def test_clamped_to_observed(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for _ in range(10):
+            histogram.observe(0.0)
+        self.assertEqual(0.0, histogram.quantile(0.99))
+
+    def test_overflow(self):
+        histogram = Histogram(buckets=(0.1,))
+        histogram.observe(30)
+        self.assertEqual(30, histogram.quantile(0.99))
+        self.assertEqual([(0.1, 0), (float("inf"), 1)], histogram.cumulative())
+
+
+class HttpMetricsTestCase(unittest.TestCase):
+    def test_keyed_by_template(self):
+        metrics = HttpMetrics()
+        for channel_id in ("1", "2"):
+            route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
+            m = metrics.get(route)
+            m.requests += 1
+            m.statuses[200] += 1
+            m.latency.observe(0.03)
+        m.codes[22009] += 1
+
+        result = metrics.to_dict()
+        self.assertEqual(["POST /channels/{channel_id}/messages"], list(result))
+        stats = result["POST /channels/{channel_id}/messages"]
+        self.assertEqual(2, stats["requests"])
+        self.assertEqual({200: 2}, stats["statuses"])
+        self.assertEqual({22009: 1}, stats["codes"])
+        self.assertEqual(2, stats["latency"]["count"])
+
+    def test_prometheus(self):
+        metrics = HttpMetrics(buckets=(0.1, 1.0))
+        m = metrics.get(Route("GET", "/guilds/{guild_id}", guild_id="1"))
+        m.requests += 1
+        m.statuses[404] += 1
+        m.latency.observe(0.5)
+
+        text = metrics.to_prometheus()
+        self.assertIn("# TYPE botpy_http_request_duration_seconds histogram", text)
+        labels = 'method="GET",route="/guilds/{guild_id}"'
+        self.assertIn("botpy_http_request_duration_seconds_bucket{%s,le=\"1.0\"} 1" % labels, text)
+        self.assertIn("botpy_http_request_duration_seconds_bucket{%s,le=\"+Inf\"} 1" % labels, text)
+        self.assertIn('botpy_http_responses_total{method="GET",route="/guilds/{guild_id}",status="404"} 1', text)
+        self.assertIn('botpy_http_inflight_requests{method="GET",route="/guilds/{guild_id}"} 0', text)
+        self.assertTrue(text.endswith("\n"))
+
+
+class GatewayMetricsTestCase(unittest.TestCase):
+    def test_latency(self):
+        metrics = GatewayMetrics(buckets=(0.1, 1.0))
+        self.assertIsNone(metrics.latency)
+        metrics.get(0).observe_ack(0.05)
+        metrics.get(1).observe_ack(0.15)
+        metrics.get(1).missed_acks += 1
+        self.assertAlmostEqual(0.1, metrics.latency)
+        self.assertEqual(1, metrics.to_dict()[1]["acks"])
+
+        text = metrics.to_prometheus()
+        self.assertIn('botpy_gateway_heartbeat_rtt_seconds_bucket{shard="1",le="1.0"} 1', text)
+        self.assertIn('botpy_gateway_missed_heartbeat_acks_total{shard="1"} 1', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
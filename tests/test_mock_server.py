@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import unittest
+
+import aiohttp
+
+import botpy
+from botpy.errors import NotFoundError
+from botpy.ext.mock_server import OP_HEARTBEAT, OP_HELLO, OP_IDENTIFY, OP_RESUME
+from botpy.http import ConnectorConfig, Route
+from botpy.message import Message
+from botpy.retry import RetryPolicy
+
+from .mock_case import MockServerCase
+
+
+class MockServerTestCase(MockServerCase):
+    def setUp(self) -> None:
+        super().setUp()
+        guild = self.server.add_guild(name="test guild")
+        self.guild_id = guild["id"]
+        self.channel_id = self.server.add_channel(self.guild_id)["id"]
+        for _ in range(5):
+            self.server.add_member(self.guild_id)
+
+    def _http(self, **kwargs) -> botpy.BotHttp:
+        return botpy.BotHttp(timeout=5, app_id="1000", secret="secret", **kwargs)
+
+    @staticmethod
+    def _client(cls=botpy.Client, **kwargs) -> botpy.Client:
+        intents = botpy.Intents(public_guild_messages=True)
+        return cls(intents=intents, bot_log=None, ext_handlers=False, session_store=None, **kwargs)
+
+    def test_route_patched(self):
+        self.assertEqual("http", Route.SCHEME)
+        self.assertEqual(self.server.address, Route.DOMAIN)
+        self.assertTrue(botpy.Token.TOKEN_URL.startswith(self.server.url))
+
+    def test_api(self):
+        async def run():
+            http = self._http()
+            api = botpy.BotAPI(http)
+            try:
+                self.assertEqual("mock-bot", (await http.login(http._token))["username"])
+                self.assertEqual("test guild", (await api.get_guild(self.guild_id))["name"])
+                self.assertEqual(1, len(await api.get_channels(self.guild_id)))
+                members = await api.iter_guild_members(self.guild_id, limit=2).flatten()
+                self.assertEqual(5, len(members))
+                await api.post_group_message("group", content="hello", msg_id="1")
+                await api.post_message(self.channel_id, content="image", file_image=b"\x89PNG", msg_id="2")
+                with self.assertRaises(NotFoundError):
+                    await api.get_guild("404")
+            finally:
+                await http.close()
+
+        self.loop.run_until_complete(run())
+        message = self.server.messages[0]
+        self.assertEqual(("group", "hello", "1"), (message["group_openid"], message["content"], message["msg_id"]))
+        self.assertEqual(4, self.server.messages[1]["file_image"])
+
+    def test_injected_error_retry(self):
+        self.server.inject_error("GET", "/guilds/{guild_id}", status=503, times=1)
+
+        async def run():
+            http = self._http(retry_policy=RetryPolicy(backoff_base=0.01))
+            try:
+                await http.login(http._token)
+                return await botpy.BotAPI(http).get_guild(self.guild_id)
+            finally:
+                await http.close()
+
+        self.assertEqual(self.guild_id, self.loop.run_until_complete(run())["id"])
+        requests = [r for r in self.server.requests if r["path"] == "/guilds/{guild_id}"]
+        self.assertEqual(2, len(requests))
+
+    def test_connection_reuse(self):
+        async def run(connector_config):
+            http = self._http(connector_config=connector_config)
+            try:
+                await http.login(http._token)
+                for _ in range(4):
+                    await http.request(Route("GET", "/guilds/{guild_id}", guild_id=self.guild_id))
+                return http.connection_stats.to_dict(), http.session_registry.connectors_created
+            finally:
+                await http.close()
+
+        # 获取 token 时建立的连接由之后的 API 请求复用，不计入 handshakes
+        stats, connectors = self.loop.run_until_complete(run(None))
+        self.assertEqual({"requests": 5, "handshakes": 0, "reused": 5, "reuse_ratio": 1.0}, stats)
+        self.assertEqual(1, connectors)
+
+        stats, _ = self.loop.run_until_complete(run(ConnectorConfig(keep_alive=False)))
+        self.assertEqual({"requests": 5, "handshakes": 5, "reused": 0, "reuse_ratio": 0.0}, stats)
+
+    def test_client_reply(self):
+        received = []
+
+        class MyClient(botpy.Client):
+            async def on_at_message_create(self, message: Message):
+                received.append(message.content)
+                await message.reply(content="pong")
+
+        async def run():
+            client = self._client(MyClient)
+            async with client:
+                asyncio.ensure_future(client.start(appid="1000", secret="secret"))
+                sessions = await self.server.wait_ready()
+                self.assertEqual((0, 1), sessions[0].shard)
+                data = self.server.message_data(self.channel_id, "ping")
+                await self.server.dispatch("AT_MESSAGE_CREATE", data)
+                return (await self.server.wait_messages())[0], data
+
+        reply, data = self.loop.run_until_complete(run())
+        self.assertEqual(["ping"], received)
+        self.assertEqual("pong", reply["content"])
+        self.assertEqual(data["id"], reply["msg_id"])
+
+    def test_client_heartbeat(self):
+        server = self.server
+        # 心跳间隔 50ms，max_concurrency 足够大使断线后立即重连
+        server.heartbeat_interval, server.max_concurrency = 50, 10
+
+        async def run():
+            client = self._client()
+            async with client:
+                asyncio.ensure_future(client.start(appid="1000", secret="secret"))
+                session = (await server.wait_ready())[0]
+                await self.wait_for(lambda: client.gateway_metrics.get(0).acks >= 2)
+                self.assertIsNotNone(client.latency)
+                server.ack_heartbeats = False
+                await self.wait_for(lambda: session.resumed >= 1 and session.connected)
+                return client.gateway_metrics.to_dict()[0]
+
+        metrics = self.loop.run_until_complete(run())
+        self.assertEqual(0.05, metrics["heartbeat_interval"])
+        self.assertEqual(1, metrics["zombie_reconnects"])
+        self.assertGreaterEqual(metrics["missed_acks"], 2)
+
+    def test_client_shared_connector(self):
+        self.server.max_concurrency = 10
+
+        async def run():
+            client = self._client()
+            async with client:
+                asyncio.ensure_future(client.start(appid="1000", secret="secret"))
+                session = (await self.server.wait_ready())[0]
+                await client.api.get_guild(self.guild_id)
+                # 断线重连后仍使用同一个连接器
+                await self.server.disconnect()
+                await self.wait_for(lambda: session.resumed and session.connected)
+                await client.api.get_guild(self.guild_id)
+                registry = client.session_registry
+                self.assertEqual({"api", "gateway", "token"}, set(registry._sessions))
+                return registry, session
+
+        registry, session = self.loop.run_until_complete(run())
+        self.assertEqual(1, session.resumed)
+        self.assertEqual(1, registry.connectors_created)
+        self.assertTrue(registry.closed)
+
+    def test_gateway_resume(self):
+        async def run():
+            async with aiohttp.ClientSession() as session:
+                token = await self._token(session)
+                async with session.ws_connect(self.server.gateway_url) as ws:
+                    self.assertEqual(OP_HELLO, (await ws.receive_json())["op"])
+                    await ws.send_json({"op": OP_IDENTIFY, "d": {"token": token, "intents": 1, "shard": [0, 1]}})
+                    ready = await ws.receive_json()
+                    self.assertEqual("READY", ready["t"])
+                    await self.server.dispatch("GUILD_UPDATE", {"id": self.guild_id})
+                    self.assertEqual(2, (await ws.receive_json())["s"])
+                    await ws.send_json({"op": OP_HEARTBEAT, "d": 2})
+                    self.assertEqual(11, (await ws.receive_json())["op"])
+                    await self.server.disconnect()
+
+                # 断线期间的事件在 resume 后补发
+                server_session = self.server.sessions[ready["d"]["session_id"]]
+                await server_session.send("GUILD_UPDATE", {"id": self.guild_id})
+                async with session.ws_connect(self.server.gateway_url) as ws:
+                    await ws.receive_json()
+                    resume = {"token": token, "session_id": ready["d"]["session_id"], "seq": 2}
+                    await ws.send_json({"op": OP_RESUME, "d": resume})
+                    return [await ws.receive_json(), await ws.receive_json()]
+
+        replayed, resumed = self.loop.run_until_complete(run())
+        self.assertEqual((3, "GUILD_UPDATE"), (replayed["s"], replayed["t"]))
+        self.assertEqual("RESUMED", resumed["t"])
+
+    async def _token(self, session: aiohttp.ClientSession) -> str:
+        async with session.post(
+            self.server.url + "/app/getAppAccessToken", json={"appId": "1000", "clientSecret": "secret"}
+        ) as response:
+            return "QQBot " + json.loads(await response.text())["access_token"]
+
+
+if __name__ == "__main__":
+    unittest.main()
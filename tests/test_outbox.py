@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from botpy.errors import ForbiddenError, ServerError
+from botpy.outbox import SENT, Outbox
+from botpy.scheduler import Priority, _priority
+
+
+def _error(cls, status):
+    error = cls("error")
+    error.status = status
+    error.code = status
+    return error
+
+
+class _FakeApi:
+    def __init__(self):
+        self.sent = []
+        self.priorities = []
+        self.errors = {}
+
+    async def post_group_message(self, group_openid: str, content: str = None):
+        await asyncio.sleep(0)
+        self.priorities.append(_priority.get())
+        errors = self.errors.get(content)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append(content)
+        return {"id": content}
+
+
+class OutboxTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "outbox.db")
+        self.api = _FakeApi()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        self.dir.cleanup()
+
+    def _outbox(self, **kwargs) -> Outbox:
+        kwargs.setdefault("retry_delay", 0.01)
+        kwargs.setdefault("poll_interval", 0.01)
+        return Outbox(self.api, self.path, **kwargs)
+
+    def test_send(self):
+        async def run():
+            async with self._outbox(workers=3) as outbox:
+                items = [{"group_openid": "g", "content": str(i)} for i in range(20)]
+                await outbox.enqueue_many("post_group_message", items, batch="b1")
+                await outbox.enqueue("post_group_message", {"group_openid": "g", "content": "single"})
+                progress = await outbox.join("b1")
+                await outbox.join()
+                return progress, outbox.to_dict()
+
+        progress, stats = self.loop.run_until_complete(run())
+        self.assertEqual({"pending": 0, "sending": 0, "sent": 20, "failed": 0}, progress)
+        self.assertEqual(21, len(self.api.sent))
+        self.assertEqual(21, stats["sent"])
+        self.assertEqual({Priority.BULK}, set(self.api.priorities))
+
+    def test_resume_after_restart(self):
+        async def enqueue():
+            outbox = self._outbox()
+            for i in range(3):
+                await outbox.enqueue("post_group_message", {"group_openid": "g", "content": str(i)})
+            await outbox.close()
+
+        async def resume():
+            async with self._outbox() as outbox:
+                return await outbox.join()
+
+        self.loop.run_until_complete(enqueue())
+        self.assertEqual([], self.api.sent)
+        self.assertEqual(3, self.loop.run_until_complete(resume())["sent"])
+        self.assertEqual(["0", "1", "2"], self.api.sent)
+
+    def test_retry_and_fail(self):
+        self.api.errors = {"retry": [_error(ServerError, 503)], "forbidden": [_error(ForbiddenError, 403)]}
+
+        async def run():
+            async with self._outbox() as outbox:
+                for content in ("retry", "forbidden"):
+                    await outbox.enqueue("post_group_message", {"group_openid": "g", "content": content})
+                return await outbox.join(), await outbox.failures()
+
+        progress, failures = self.loop.run_until_complete(run())
+        self.assertEqual(1, progress["sent"])
+        self.assertEqual(["retry"], self.api.sent)
+        self.assertEqual(1, len(failures))
+        self.assertEqual("forbidden", failures[0]["kwargs"]["content"])
+        self.assertIn("ForbiddenError", failures[0]["error"])
+
+    def test_write_error(self):
+        class _Outbox(Outbox):
+            failures = 1
+
+            async def _write(self, sql, params):
+                if params[0] == SENT and self.failures:
+                    self.failures -= 1
+                    raise sqlite3.OperationalError("database is locked")
+                return await super()._write(sql, params)
+
+        async def run():
+            outbox = _Outbox(self.api, self.path, workers=1, lease=0.05, poll_interval=0.01)
+            async with outbox:
+                for content in ("lost", "next"):
+                    await outbox.enqueue("post_group_message", {"group_openid": "g", "content": content})
+                return await asyncio.wait_for(outbox.join(), 5)
+
+        # 记录结果失败后 worker 继续发送，租期过后重新发送该消息
+        with self.assertLogs("botpy", "ERROR"):
+            progress = self.loop.run_until_complete(run())
+        self.assertEqual(2, progress["sent"])
+        self.assertEqual(["lost", "lost", "next"], sorted(self.api.sent))
+
+    def test_rate(self):
+        async def run():
+            async with self._outbox(workers=4, rate=50) as outbox:
+                items = [{"group_openid": "g", "content": str(i)} for i in range(6)]
+                await outbox.enqueue_many("post_group_message", items)
+                started = time.monotonic()
+                await outbox.join()
+                return time.monotonic() - started
+
+        self.assertGreaterEqual(self.loop.run_until_complete(run()), 0.09)
+
+    def test_unknown_method(self):
+        outbox = self._outbox()
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(outbox.enqueue("_request", {}))
+        self.loop.run_until_complete(outbox.close())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from botpy.api import BotAPI
+
+
+class _FakeHttp:
+    """按 after 参数返回成员分页，每页重复上一页的最后一个成员"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.requests = []
+
+    async def request(self, route, params=None, **kwargs):
+        self.requests.append(dict(params))
+        after, limit = int(params["after"]), params["limit"]
+        start = max(after, 1)
+        return [{"user": {"id": str(i)}} for i in range(start, min(start + limit, self.total + 1))]
+
+
+class PaginatorTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def test_iter_guild_members(self):
+        http = _FakeHttp(total=10)
+        api = BotAPI(http)
+        paginator = api.iter_guild_members("1", limit=4)
+        members = self.loop.run_until_complete(paginator.flatten())
+        self.assertEqual([str(i) for i in range(1, 11)], [m["user"]["id"] for m in members])
+        self.assertTrue(paginator.done)
+
+    def test_resume(self):
+        http = _FakeHttp(total=10)
+        api = BotAPI(http)
+        paginator = api.iter_guild_members("1", limit=4)
+
+        async def take(n):
+            result = []
+            async for member in paginator:
+                result.append(member["user"]["id"])
+                if len(result) == n:
+                    break
+            return result
+
+        self.assertEqual(["1", "2", "3", "4", "5"], self.loop.run_until_complete(take(5)))
+        self.assertEqual("5", paginator.cursor)
+
+        rest = self.loop.run_until_complete(api.iter_guild_members("1", after=paginator.cursor, limit=4).flatten())
+        self.assertEqual([str(i) for i in range(6, 11)], [m["user"]["id"] for m in rest])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+import unittest
+
+from botpy.http import Route
+from botpy.ratelimit import Bucket, RateLimiter
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def test_bucket_key(self):
+        route = Route("POST", "/v2/groups/{group_openid}/messages", group_openid="g1")
+        self.assertEqual("POST /v2/groups/{group_openid}/messages:g1", route.bucket)
+
+        other = Route("POST", "/v2/groups/{group_openid}/messages", group_openid="g2")
+        limiter = RateLimiter()
+        self.assertIsNot(limiter.get_bucket(route), limiter.get_bucket(other))
+        self.assertIs(limiter.get_bucket(route), limiter.get_bucket(route))
+
+    def test_pacing(self):
+        limiter = RateLimiter(limits={"GET /guilds/{guild_id}": (2, 0.2)})
+        bucket = limiter.get_bucket(Route("GET", "/guilds/{guild_id}", guild_id="1"))
+
+        async def run():
+            start = time.monotonic()
+            for _ in range(3):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(self.loop.run_until_complete(run()), 0.15)
+        self.assertEqual(3, limiter.state()["GET /guilds/{guild_id}:1"]["sent"])
+
+    def test_learn_from_headers(self):
+        bucket = Bucket("test")
+        bucket.update(200, {"X-RateLimit-Limit": "5", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "2"})
+        self.assertEqual(5, bucket.limit)
+        self.assertGreater(bucket.to_dict()["blocked_for"], 1)
+
+    def test_learn_from_limited(self):
+        bucket = Bucket("test")
+
+        async def run():
+            for _ in range(4):
+                await bucket.acquire()
+
+        self.loop.run_until_complete(run())
+        bucket.update(429, {})
+        self.assertEqual(3, bucket.limit)
+        self.assertEqual(1, bucket.limited_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
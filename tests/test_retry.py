@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from botpy.errors import SequenceNumberError, ServerError
+from botpy.retry import RetryPolicy
+
+
+def _error(cls, status, code=None):
+    error = cls(msg="test")
+    error.status = status
+    error.code = code
+    return error
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    def test_idempotent(self):
+        self.assertTrue(RetryPolicy.is_idempotent("GET"))
+        self.assertFalse(RetryPolicy.is_idempotent("POST", {"content": "test"}))
+        self.assertTrue(RetryPolicy.is_idempotent("POST", {"msg_id": "1", "msg_seq": 2}))
+
+    def test_non_idempotent_post(self):
+        policy = RetryPolicy(jitter=0)
+        # 结果不确定的请求不重试，避免重复发送
+        self.assertIsNone(policy.next_delay(1, asyncio.TimeoutError(), False, 0))
+        self.assertIsNone(policy.next_delay(1, _error(ServerError, 500), False, 0))
+        # 被限频拒绝的请求可以安全重试
+        self.assertEqual(0.5, policy.next_delay(1, _error(SequenceNumberError, 429), False, 0))
+        self.assertEqual(0.5, policy.next_delay(1, _error(ServerError, 400, 22009), False, 0))
+
+    def test_backoff_and_budget(self):
+        policy = RetryPolicy(max_retries=3, backoff_base=1, jitter=0, deadline=3.5)
+        error = _error(ServerError, 503)
+        self.assertEqual(1, policy.next_delay(1, error, True, 0))
+        self.assertEqual(2, policy.next_delay(2, error, True, 1))
+        # 超出总时长预算
+        self.assertIsNone(policy.next_delay(3, error, True, 3))
+        # 超出最大重试次数
+        self.assertIsNone(policy.next_delay(4, error, True, 0))
+
+    def test_jitter(self):
+        policy = RetryPolicy(backoff_base=1, jitter=1)
+        for _ in range(20):
+            self.assertTrue(0 <= policy.backoff(1) <= 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+import unittest
+
+from botpy.errors import DeadlineExceededError
+from botpy.http import Route
+from botpy.scheduler import OutboundScheduler, Priority, use_priority
+
+
+class OutboundSchedulerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def _run_order(self, scheduler: OutboundScheduler, requests):
+        """占满名额后按顺序提交 requests，返回获得名额的顺序"""
+        order = []
+
+        async def send(name, priority, tenant):
+            async with scheduler.slot(priority, tenant):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        async def run():
+            await scheduler.acquire(Priority.PROACTIVE)
+            tasks = [asyncio.ensure_future(send(*request)) for request in requests]
+            await asyncio.sleep(0)
+            scheduler.release()
+            await asyncio.gather(*tasks)
+
+        self.loop.run_until_complete(run())
+        return order
+
+    def test_priority(self):
+        scheduler = OutboundScheduler(concurrency=1)
+        order = self._run_order(
+            scheduler,
+            [
+                ("bulk", Priority.BULK, "1"),
+                ("proactive", Priority.PROACTIVE, "1"),
+                ("passive", Priority.PASSIVE, "1"),
+                ("interaction", Priority.INTERACTION, "1"),
+            ],
+        )
+        self.assertEqual(["passive", "interaction", "proactive", "bulk"], order)
+        self.assertEqual(0, scheduler.active)
+        self.assertEqual(0, scheduler.depth)
+
+    def test_fair_between_tenants(self):
+        scheduler = OutboundScheduler(concurrency=1)
+        requests = [("a%s" % i, Priority.BULK, "a") for i in range(4)]
+        requests += [("b%s" % i, Priority.BULK, "b") for i in range(2)]
+        order = self._run_order(scheduler, requests)
+        self.assertEqual(["a0", "b0", "a1", "b1", "a2", "a3"], order)
+
+    def test_weights(self):
+        scheduler = OutboundScheduler(concurrency=1, weights={"a": 2})
+        requests = [("a%s" % i, Priority.BULK, "a") for i in range(4)]
+        requests += [("b%s" % i, Priority.BULK, "b") for i in range(2)]
+        order = self._run_order(scheduler, requests)
+        self.assertEqual(["a0", "b0", "a1", "a2", "b1", "a3"], order)
+
+    def test_cancel_waiting(self):
+        scheduler = OutboundScheduler(concurrency=1)
+
+        async def run():
+            await scheduler.acquire(Priority.PROACTIVE)
+            waiter = asyncio.ensure_future(scheduler.acquire(Priority.BULK))
+            await asyncio.sleep(0)
+            self.assertEqual(1, scheduler.depth)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            scheduler.release()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(0, scheduler.active)
+        self.assertEqual(0, scheduler.depth)
+
+    def test_deadline(self):
+        scheduler = OutboundScheduler(concurrency=1)
+
+        async def run():
+            await scheduler.acquire(Priority.PROACTIVE)
+            with self.assertRaises(DeadlineExceededError):
+                await scheduler.acquire(Priority.BULK, deadline=time.monotonic() + 0.01)
+            self.assertEqual(0, scheduler.depth)
+            scheduler.release()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(0, scheduler.active)
+
+    def test_classify(self):
+        scheduler = OutboundScheduler()
+        route = Route("POST", "/v2/groups/{group_openid}/messages", group_openid="g")
+        self.assertEqual(Priority.PASSIVE, scheduler.classify(route, {"msg_id": "1", "content": "hi"}))
+        self.assertEqual(Priority.PROACTIVE, scheduler.classify(route, {"content": "hi"}))
+        self.assertEqual(Priority.BULK, scheduler.classify(Route("PATCH", "/guilds/{guild_id}/mute", guild_id="1")))
+        self.assertEqual(Priority.INTERACTION, scheduler.classify(Route("PUT", "/interactions/{id}", id="1")))
+        with use_priority(Priority.BULK):
+            self.assertEqual(Priority.BULK, scheduler.classify(route, {"msg_id": "1"}))
+        self.assertEqual(Priority.PASSIVE, scheduler.classify(route, {"content": "hi"}, Priority.PASSIVE))
+        self.assertEqual("g", scheduler.tenant(route))
+
+
+if __name__ == "__main__":
+    unittest.main()
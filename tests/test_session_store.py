@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import botpy
+from botpy import session_store
+from botpy.ext.mock_server import OP_IDENTIFY, OP_RESUME
+from botpy.session_store import FileSessionStore
+
+from .mock_case import MockServerCase
+
+
+class FileSessionStoreTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sessions.json")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_save_load_clear(self):
+        store = FileSessionStore(self.path)
+        # save 和 clear 只更新内存，flush 时才写入文件
+        store.save("1000", 0, 2, "session", 1)
+        self.assertEqual(1, store.load("1000", 0, 2)["last_seq"])
+        self.assertFalse(os.path.exists(self.path))
+        store.save("1000", 0, 2, "session", 5)
+        store.flush()
+        self.assertEqual(5, FileSessionStore(self.path).load("1000", 0, 2)["last_seq"])
+        self.assertIsNone(FileSessionStore(self.path).load("1000", 1, 2))
+
+        store.clear("1000", 0, 2)
+        self.assertIsNotNone(FileSessionStore(self.path).load("1000", 0, 2))
+        store.flush()
+        self.assertIsNone(FileSessionStore(self.path).load("1000", 0, 2))
+
+    def test_merge_and_max_age(self):
+        for shard_id, session_id in ((0, "a"), (1, "b")):
+            store = FileSessionStore(self.path)
+            store.save("1000", shard_id, 2, session_id, 1)
+            store.flush()
+        with open(self.path) as f:
+            self.assertEqual(["1000:0/2", "1000:1/2"], sorted(json.load(f)))
+
+        store = FileSessionStore(self.path, max_age=60)
+        store.sessions["1000:0/2"]["updated_at"] = time.time() - 61
+        self.assertIsNone(store.load("1000", 0, 2))
+        self.assertEqual("b", store.load("1000", 1, 2)["session_id"])
+
+    @unittest.skipIf(session_store.fcntl is None, "需要 fcntl 文件锁")
+    def test_concurrent_flush(self):
+        # 多个进程各自保存不同的分片，同时写入同一个文件时不会覆盖其他分片的状态
+        stores = [FileSessionStore(self.path) for _ in range(8)]
+
+        def run(shard_id):
+            for seq in range(20):
+                stores[shard_id].save("1000", shard_id, 8, str(shard_id), seq)
+                stores[shard_id].flush()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        store = FileSessionStore(self.path)
+        self.assertEqual([19] * 8, [store.load("1000", i, 8)["last_seq"] for i in range(8)])
+
+    def test_corrupt_file(self):
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        store = FileSessionStore(self.path)
+        self.assertIsNone(store.load("1000", 0, 1))
+        store.save("1000", 0, 1, "session", 1)
+        store.flush()
+        self.assertEqual("session", FileSessionStore(self.path).load("1000", 0, 1)["session_id"])
+
+
+class ClientResumeTestCase(MockServerCase):
+    server_options = {"max_concurrency": 10}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.guild_id = self.server.add_guild()["id"]
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sessions.json")
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.tmp.cleanup()
+
+    def _client(self) -> botpy.Client:
+        intents = botpy.Intents(guilds=True)
+        return botpy.Client(intents=intents, bot_log=None, ext_handlers=False, session_store=self.path)
+
+    def test_resume_after_restart(self):
+        async def run():
+            first = self._client()
+            async with first:
+                asyncio.ensure_future(first.start(appid="1000", secret="secret"))
+                session = (await self.server.wait_ready())[0]
+                await self.server.dispatch("GUILD_UPDATE", {"id": self.guild_id})
+                await self.wait_for(lambda: first.session_store.load("1000", 0, 1)["last_seq"] == 2)
+
+            # 模拟进程重启：Client 关闭时断开连接，断开后的事件在 resume 时补发
+            await self.wait_for(lambda: not session.connected)
+            await session.send("GUILD_UPDATE", {"id": self.guild_id})
+            second = self._client()
+            async with second:
+                asyncio.ensure_future(second.start(appid="1000", secret="secret"))
+                await self.wait_for(lambda: session.resumed and session.connected)
+                await self.wait_for(lambda: second.session_store.load("1000", 0, 1)["last_seq"] == 3)
+            return session
+
+        session = self.loop.run_until_complete(run())
+        self.assertEqual(1, len(self.server.sessions))
+        self.assertEqual(1, session.resumed)
+
+    def test_identify_when_session_invalid(self):
+        store = FileSessionStore(self.path)
+        store.save("1000", 0, 1, "expired", 10)
+        store.flush()
+
+        async def run():
+            client = self._client()
+            async with client:
+                asyncio.ensure_future(client.start(appid="1000", secret="secret"))
+                session = (await self.server.wait_ready())[0]
+                await self.wait_for(lambda: client.session_store.load("1000", 0, 1) is not None)
+                return session, client.session_store.load("1000", 0, 1)
+
+        session, state = self.loop.run_until_complete(run())
+        self.assertEqual(session.session_id, state["session_id"])
+        # 先用保存的会话 resume，失败后重新鉴权
+        ops = [(payload["op"], payload["d"].get("session_id")) for payload in self.server.gateway_requests]
+        self.assertEqual([(OP_RESUME, "expired"), (OP_IDENTIFY, None)], ops)
+
+
+if __name__ == "__main__":
+    unittest.main()
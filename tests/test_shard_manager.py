@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import functools
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import botpy
+from botpy.http import Route
+from botpy.robot import Token
+from botpy.shard_manager import IdentifyLimiter, ShardManager, split_shards
+
+from .mock_case import MockServerCase
+
+
+def _crashing_client():
+    raise SystemExit(3)
+
+
+def _mock_client(url: str, address: str, session_path: str) -> botpy.Client:
+    # 子进程以 spawn 方式启动，需要重新将请求指向 MockServer
+    Route.SCHEME = "http"
+    Route.DOMAIN = Route.SANDBOX_DOMAIN = address
+    Token.TOKEN_URL = url + "/app/getAppAccessToken"
+    intents = botpy.Intents(guilds=True)
+    return botpy.Client(intents=intents, bot_log=None, ext_handlers=False, session_store=session_path)
+
+
+class SplitShardsTestCase(unittest.TestCase):
+    def test_split(self):
+        self.assertEqual([[0, 1], [2, 3], [4]], split_shards(list(range(5)), 3))
+        self.assertEqual([[0], [1]], split_shards([0, 1], 8))
+        self.assertEqual([[0, 1, 2]], split_shards([0, 1, 2], 0))
+
+
+class IdentifyLimiterTestCase(unittest.TestCase):
+    def test_reserve(self):
+        limiter = IdentifyLimiter(2, interval=0.5)
+        delays = [limiter.reserve() for _ in range(5)]
+        self.assertEqual([0, 0], [round(d, 1) for d in delays[:2]])
+        self.assertAlmostEqual(0.5, delays[2], delta=0.05)
+        self.assertAlmostEqual(0.5, delays[3], delta=0.05)
+        self.assertAlmostEqual(1.0, delays[4], delta=0.05)
+
+
+class ShardManagerTestCase(MockServerCase):
+    server_options = {"shards": 3, "max_concurrency": 2}
+
+    def test_restart_crashed_workers(self):
+        manager = ShardManager(_crashing_client, "1000", "secret", processes=2, restart_delay=0.1)
+        self.loop.run_until_complete(manager.prepare())
+        self.assertEqual(3, manager.shard_count)
+        self.assertEqual([[0, 1], [2]], [w.shard_ids for w in manager.workers])
+        self.assertTrue(manager.token.access_token)
+
+        manager.start()
+        try:
+            deadline = time.monotonic() + 30
+            while min(w.restarts for w in manager.workers) < 2 and time.monotonic() < deadline:
+                manager.check()
+                time.sleep(0.05)
+        finally:
+            manager.stop()
+        self.assertTrue(all(w.restarts >= 2 for w in manager.workers))
+        self.assertFalse(any(s["alive"] for s in manager.status()))
+
+    def test_restart_resumes_worker(self):
+        self.server.shards = 2
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.json")
+            factory = functools.partial(_mock_client, self.server.url, self.server.address, path)
+            manager = ShardManager(factory, "1000", "secret", processes=2, restart_delay=0.1)
+
+            def saved_shards():
+                try:
+                    with open(path) as f:
+                        return sorted(json.load(f))
+                except (OSError, ValueError):
+                    return []
+
+            async def wait_for(predicate):
+                # 等待期间检查并重新启动退出的子进程
+                await self.wait_for(lambda: manager.check() or predicate(), timeout=30)
+
+            async def run():
+                await manager.prepare()
+                manager.start()
+                try:
+                    await wait_for(lambda: len(self.server.connected_sessions) == 2)
+                    # 两个子进程共用一个会话状态文件
+                    await wait_for(lambda: saved_shards() == ["1000:0/2", "1000:1/2"])
+                    worker = manager.workers[1]
+                    session = next(s for s in self.server.sessions.values() if s.shard == (1, 2))
+                    worker.process.kill()
+                    await wait_for(lambda: worker.restarts == 1 and session.resumed == 1 and session.connected)
+                finally:
+                    manager.stop()
+
+            self.loop.run_until_complete(run())
+        # 重启的子进程通过 resume 恢复，没有重新鉴权
+        self.assertEqual(2, len(self.server.sessions))
+        self.assertEqual([(0, 2), (1, 2)], sorted(s.shard for s in self.server.sessions.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
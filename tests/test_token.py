@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+import time
 import unittest
 
 from botpy.robot import Token
@@ -12,6 +14,35 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(token.app_id, "123")
         self.assertEqual(token.secret, "123")
 
+    def test_single_flight(self):
+        token = Token("123", "123")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            token.access_token = "token%s" % len(calls)
+            token.expires_in = int(time.time()) + 7200
+
+        token._fetch_access_token = fetch
+
+        async def run():
+            await asyncio.gather(*[token.check_token() for _ in range(10)])
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+        loop.close()
+        self.assertEqual(1, len(calls))
+        self.assertEqual("QQBot token1", token.get_headers()["Authorization"])
+
+    def test_cached_headers(self):
+        token = Token("123", "123")
+        token.access_token = "a"
+        headers = token.get_headers()
+        self.assertIs(headers, token.get_headers())
+        token.access_token = "b"
+        self.assertEqual("QQBot b", token.get_headers()["Authorization"])
+
 
 if __name__ == "__main__":
     unittest.main()